@@ -0,0 +1,248 @@
+"""
+End-to-end deploy benchmarks, run against the local mock CDF server (see mock_cdf.py). Measures zip
+throughput, upload time, polling overhead (time from 'Ready' until noticed), schedule operations and
+full deployments through 'index.main' and 'index.main_batch'.
+
+Results are printed and can be saved as JSON; given a baseline (an earlier saved result), the run fails
+if any benchmark got slower than the tolerance allows, so regressions are caught.
+
+Usage (from repository root):
+    PYTHONPATH=src python benchmarks/deploy.py [--quick] [--save results.json] [--baseline results.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from mock_cdf import MockCDFServer, MockSettings
+
+SIZE_SCALE = {"quick": [1, 8], "full": [1, 16, 64]}  # Folder sizes in MB
+N_FUNCTIONS = {"quick": 4, "full": 16}
+N_SCHEDULES = {"quick": 10, "full": 50}
+MODULE_SIZE = 32 * 1024
+FUNCTION_TEMPLATE = """
+
+def compute_{i}_{j}(values, scale=1.0):
+    \"\"\"Scales and sums the values\"\"\"
+    total = 0.0
+    for value in values:
+        total += math.sqrt(abs(value)) * scale
+    return total
+"""
+
+
+def make_folder(root: Path, name: str, size_mb: int) -> Path:
+    """Realistic mix: compressible source code and (incompressible) binary model files"""
+    folder = root / name
+    (folder / "src").mkdir(parents=True)
+    (folder / "handler.py").write_text("from src import model\n\n\ndef handle(data):\n    return model.predict(data)\n")
+    (folder / "src" / "__init__.py").write_text("")
+    (folder / "src" / "model.py").write_text("def predict(data):\n    return data\n")
+    n_bytes = size_mb * 1024**2
+    for i in range(max(1, n_bytes // 2 // MODULE_SIZE)):
+        source = "".join(FUNCTION_TEMPLATE.format(i=i, j=j) for j in range(MODULE_SIZE // len(FUNCTION_TEMPLATE)))
+        (folder / "src" / f"module_{i}.py").write_text("import math\n" + source)
+    (folder / "model.bin").write_bytes(os.urandom(n_bytes // 2))
+    return folder
+
+
+def make_schedule_file(folder: Path, n_schedules: int) -> str:
+    lines = [f'- name: schedule-{i}\n  cron: "{i % 60} * * * *"\n  data:\n    index: {i}\n' for i in range(n_schedules)]
+    (folder / "schedules.yaml").write_text("".join(lines))
+    return "schedules.yaml"
+
+
+def make_config(server: MockSettings, folder: Path, name: str, **kwargs):
+    from config import FunctionConfig
+
+    return FunctionConfig(
+        function_name=name,
+        function_folder=folder,
+        function_file="handler.py",
+        tenant={
+            "cdf_deployment_credentials": "mock-deploy-key",
+            "cdf_runtime_credentials": "mock-runtime-key",
+            "cdf_base_url": server.base_url,
+        },
+        **kwargs,
+    )
+
+
+def timed(fn: Callable, *args, **kwargs) -> float:
+    t0 = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+def bench_zip(tmp: Path, sizes_mb: List[int], server) -> Dict[str, float]:
+    from function import zip_folder
+
+    def zip_only():
+        with zip_folder(config):
+            pass
+
+    results = {}
+    for size_mb in sizes_mb:
+        config = make_config(server, make_folder(tmp, f"zip-{size_mb}", size_mb), f"zip-{size_mb}")
+        elapsed = min(timed(zip_only) for _ in range(3))
+        results[f"zip_{size_mb}mb_sec"] = elapsed
+        results[f"zip_{size_mb}mb_mb_per_sec"] = size_mb / elapsed
+
+        # One file changed since the previous (cached) build, and all are touched, as in a fresh checkout:
+        config = config.copy(update={"cache_dir": tmp / f"cache-{size_mb}"})
+        zip_only()
+        (config.function_folder / "src" / "model.py").write_text("def predict(data):\n    return data * 2\n")
+        for path in config.function_folder.rglob("*"):
+            os.utime(path)
+        results[f"zip_{size_mb}mb_incremental_sec"] = timed(zip_only)
+    return results
+
+
+def bench_upload(tmp: Path, sizes_mb: List[int], server) -> Dict[str, float]:
+    from archive import hash_archive
+    from config import create_experimental_cognite_client
+    from function import upload_folder_archive, zip_folder
+
+    results = {}
+    for size_mb in sizes_mb:
+        config = make_config(server, make_folder(tmp, f"upload-{size_mb}", size_mb), f"upload-{size_mb}")
+        client = create_experimental_cognite_client(config.tenant)
+        with zip_folder(config) as archive:
+            digest = hash_archive(archive)
+            results[f"upload_{size_mb}mb_sec"] = timed(
+                upload_folder_archive, client, config, f"upload-{size_mb}.zip", archive, digest
+            )
+            chunked_config = config.copy(update={"upload_chunk_size_mb": 1})
+            results[f"upload_{size_mb}mb_chunked_sec"] = timed(
+                upload_folder_archive, client, chunked_config, f"upload-{size_mb}.zip", archive, digest
+            )
+    return results
+
+
+def bench_polling(tmp: Path, server) -> Dict[str, float]:
+    from archive import hash_archive
+    from config import DEPLOY_WAIT_TIME_SEC, create_experimental_cognite_client
+    from function import create_function_and_wait, upload_folder_archive, zip_folder
+
+    config = make_config(server, make_folder(tmp, "polling", 1), "polling")
+    client = create_experimental_cognite_client(config.tenant)
+    with zip_folder(config) as archive:
+        file_id = upload_folder_archive(client, config, "polling.zip", archive, hash_archive(archive))
+
+    elapsed = timed(create_function_and_wait, client, file_id, config)
+    assert DEPLOY_WAIT_TIME_SEC > elapsed
+    # Time spent waiting after the (mocked) build finished:
+    return {"await_deployment_sec": elapsed, "polling_overhead_sec": elapsed - server.cdf.settings.build_sec}
+
+
+def bench_schedules(tmp: Path, n_schedules: int, server) -> Dict[str, float]:
+    from cognite.experimental.data_classes import Function
+
+    from config import create_experimental_cognite_client
+    from schedule import reconcile_schedules
+
+    folder = make_folder(tmp, "schedules", 1)
+    config = make_config(server, folder, "schedules", schedule_file=make_schedule_file(folder, n_schedules))
+    client = create_experimental_cognite_client(config.tenant)
+    function = Function(external_id=config.external_id)
+    schedules = config.schedules
+
+    results = {"schedules_create_sec": timed(reconcile_schedules, client, function, schedules)}
+    results["schedules_unchanged_sec"] = timed(reconcile_schedules, client, function, schedules)
+    half_changed = [s.copy(update={"cron": "30 * * * *"}) if i % 2 else s for i, s in enumerate(schedules)]
+    results["schedules_half_changed_sec"] = timed(reconcile_schedules, client, function, half_changed)
+    return results
+
+
+def bench_main(tmp: Path, server) -> Dict[str, float]:
+    import index
+
+    folder = make_folder(tmp, "main", 1)
+    config = make_config(server, folder, "main", schedule_file=make_schedule_file(folder, 5))
+    results = {"main_first_deploy_sec": timed(index.main, config)}
+    results["main_unchanged_sec"] = timed(index.main, config)
+    results["main_forced_redeploy_sec"] = timed(index.main, config.copy(update={"force_redeploy": True}))
+    return results
+
+
+def bench_batch(tmp: Path, n_functions: int, server) -> Dict[str, float]:
+    import index
+
+    common = make_folder(tmp, "common", 8)
+    configs = [
+        make_config(server, make_folder(tmp, f"batch-{i}", 1), f"batch-{i}", common_folder=common)
+        for i in range(n_functions)
+    ]
+    return {f"batch_{n_functions}_functions_sec": timed(index.main_batch, configs, max_workers=4)}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    regressions = []
+    for key, value in results.items():
+        if key.endswith("_sec") and key in baseline and value > baseline[key] * (1 + tolerance) + 0.05:
+            regressions.append(f"{key}: {value:.3f}s (baseline: {baseline[key]:.3f}s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Smaller folders and fewer functions")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--bandwidth-mbps", type=float, default=50, help="Upload bandwidth in MB/s")
+    parser.add_argument("--build-sec", type=float, default=3)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--only", nargs="+", choices=["zip", "upload", "polling", "schedules", "main", "batch"])
+    parser.add_argument("--save", type=Path, help="Save results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Fail on regressions compared to these saved results")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    scale = "quick" if args.quick else "full"
+    settings = MockSettings(
+        latency_sec=args.latency_ms / 1000,
+        bandwidth_bytes_per_sec=args.bandwidth_mbps * 1024**2,
+        build_sec=args.build_sec,
+        failure_rate=args.failure_rate,
+    )
+    benchmarks = {
+        "zip": lambda tmp, server: bench_zip(tmp, SIZE_SCALE[scale], server),
+        "upload": lambda tmp, server: bench_upload(tmp, SIZE_SCALE[scale], server),
+        "polling": bench_polling,
+        "schedules": lambda tmp, server: bench_schedules(tmp, N_SCHEDULES[scale], server),
+        "main": bench_main,
+        "batch": lambda tmp, server: bench_batch(tmp, N_FUNCTIONS[scale], server),
+    }
+    logging.disable(logging.INFO)  # The deploy logs are not of interest here (warnings and errors are)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, MockCDFServer(settings) as server:
+        for name, bench in benchmarks.items():
+            if args.only and name not in args.only:
+                continue
+            # Silence the action outputs (::set-output) printed by index:
+            with contextlib.redirect_stdout(io.StringIO()):
+                bench_results = bench(Path(tmp), server)
+            for key, value in bench_results.items():
+                print(f"{key:>40}: {value:10.3f}")
+            results.update(bench_results)
+        results["mock_requests"] = sum(server.cdf.stats.requests.values())
+        results["mock_injected_failures"] = server.cdf.stats.injected_failures
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        if regressions := compare(results, json.loads(args.baseline.read_text()), args.tolerance):
+            print("Regressions found:\n- " + "\n- ".join(regressions))
+            sys.exit(1)
+        print("No regressions found compared to baseline!")
+
+
+if __name__ == "__main__":
+    main()
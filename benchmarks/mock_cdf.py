@@ -0,0 +1,352 @@
+"""
+Local stand-in for the CDF API endpoints used by the action (login, data sets, files, functions and
+schedules), for benchmarking the deploy path end to end without a real project. State is kept in memory.
+
+The server emulates:
+- latency: added to every request
+- bandwidth: request bodies (e.g. file uploads) are throttled to this many bytes per second
+- build duration: functions go from 'Queued' to 'Deploying' to 'Ready' (or 'Failed') over this time
+- failures: a fraction of requests fail with 503 (retryable by the SDK), and builds can be set to fail
+
+Usage (standalone, from repository root):
+    python benchmarks/mock_cdf.py --port 8000 --latency-ms 50 --build-sec 5
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+PROJECT = "mock-project"
+PROJECT_PATH_RE = re.compile(r"^/api/(?:v1|playground)/projects/(?P<project>[^/]+)(?P<path>/.*)$")
+
+
+@dataclass
+class MockSettings:
+    latency_sec: float = 0.0
+    bandwidth_bytes_per_sec: Optional[float] = None  # None: unlimited
+    build_sec: float = 1.0
+    failure_rate: float = 0.0  # Fraction of requests answered with 503
+    fail_builds: bool = False
+
+
+@dataclass
+class MockStats:
+    requests: Dict[str, int] = field(default_factory=dict)  # Per "METHOD /path"
+    bytes_received: int = 0
+    injected_failures: int = 0
+    first_request_at: Optional[float] = None  # time.monotonic() of the first request received
+
+    def count(self, route: str, n_bytes: int) -> None:
+        self.requests[route] = self.requests.get(route, 0) + 1
+        self.bytes_received += n_bytes
+
+
+class NotFound(Exception):
+    def __init__(self, missing: List[Dict]):
+        self.missing = missing
+
+
+class MockCDF:
+    """In-memory state of the mocked project. All access is guarded by a single lock"""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.stats = MockStats()
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.files: Dict[int, Dict] = {}
+        self.file_content: Dict[int, bytes] = {}
+        self.partial_uploads: Dict[int, bytearray] = {}
+        self.functions: Dict[int, Dict] = {}
+        self.schedules: Dict[int, Dict] = {}
+        self.data_sets: Dict[int, Dict] = {}
+
+    def add_data_set(self, external_id: str, write_protected: bool = False) -> Dict:
+        with self.lock:
+            data_set = {"id": next(self._ids), "externalId": external_id, "writeProtected": write_protected}
+            self.data_sets[data_set["id"]] = data_set
+            return data_set
+
+    @staticmethod
+    def _find(items: Dict[int, Dict], identifiers: List[Dict], ignore_unknown: bool = False) -> List[Dict]:
+        found, missing = [], []
+        for ident in identifiers:
+            key, value = ("id", ident["id"]) if "id" in ident else ("externalId", ident["externalId"])
+            match = next((item for item in items.values() if item.get(key) == value), None)
+            if match is None:
+                missing.append(ident)
+            else:
+                found.append(match)
+        if missing and not ignore_unknown:
+            raise NotFound(missing)
+        return found
+
+    def _function_status(self, function: Dict) -> Dict:
+        age = time.time() - function["createdTime"] / 1000
+        if age >= self.settings.build_sec:
+            status = "Failed" if self.settings.fail_builds else "Ready"
+        else:
+            status = "Queued" if age < self.settings.build_sec / 2 else "Deploying"
+        error = {"message": "Mock build failed", "trace": ""} if status == "Failed" else None
+        return {**function, "status": status, "error": error}
+
+    # Handlers, all called with the lock held, returning (status code, response body):
+
+    def login_status(self, headers, body, query) -> Tuple[int, Dict]:
+        return 200, {"data": {"user": "mock-user", "loggedIn": True, "project": PROJECT, "projectId": 1}}
+
+    def data_sets_by_ids(self, headers, body, query) -> Tuple[int, Dict]:
+        return 200, {"items": self._find(self.data_sets, body["items"], body.get("ignoreUnknownIds", False))}
+
+    def files_create(self, headers, body, query) -> Tuple[int, Dict]:
+        overwrite = query.get("overwrite", ["false"])[0].lower() == "true"
+        existing = self._find(self.files, [{"externalId": body["externalId"]}], ignore_unknown=True)
+        if existing and not overwrite:
+            return 409, {"error": {"code": 409, "message": "Duplicate externalId"}}
+        file_id = existing[0]["id"] if existing else next(self._ids)
+        now = int(time.time() * 1000)
+        self.files[file_id] = {**body, "id": file_id, "uploaded": False, "createdTime": now, "lastUpdatedTime": now}
+        upload_url = f"http://{headers['Host']}/upload/{file_id}"
+        return 201, {**self.files[file_id], "uploadUrl": upload_url}
+
+    def files_upload(self, headers, body, query, file_id: int) -> Tuple:
+        if file_id not in self.files:
+            return 404, {"error": {"code": 404, "message": "Unknown upload URL"}}
+        if content_range := headers.get("Content-Range"):
+            # Resumable upload: chunks are appended, and acknowledged with the range received so far:
+            received = self.partial_uploads.setdefault(file_id, bytearray())
+            if not content_range.startswith("bytes */"):
+                start = int(content_range.split()[1].split("-")[0])
+                if start != len(received):
+                    return 400, {"error": {"code": 400, "message": "Chunk does not continue the upload"}}
+                received += body
+            if len(received) < int(content_range.rsplit("/", 1)[1]):
+                return 308, {}, {"Range": f"bytes=0-{len(received) - 1}"} if received else {}
+            body = bytes(self.partial_uploads.pop(file_id))
+        self.file_content[file_id] = body
+        self.files[file_id]["uploaded"] = True
+        return 200, {}
+
+    def files_by_ids(self, headers, body, query) -> Tuple[int, Dict]:
+        return 200, {"items": self._find(self.files, body["items"], body.get("ignoreUnknownIds", False))}
+
+    def files_update(self, headers, body, query) -> Tuple[int, Dict]:
+        items = []
+        for item, file in zip(body["items"], self._find(self.files, body["items"])):
+            file["metadata"] = {**(file.get("metadata") or {}), **item["update"].get("metadata", {}).get("add", {})}
+            file["lastUpdatedTime"] = int(time.time() * 1000)
+            items.append(file)
+        return 200, {"items": items}
+
+    def files_delete(self, headers, body, query) -> Tuple[int, Dict]:
+        for file in self._find(self.files, body["items"], body.get("ignoreUnknownIds", False)):
+            del self.files[file["id"]]
+            self.file_content.pop(file["id"], None)
+        return 200, {}
+
+    def functions_create(self, headers, body, query) -> Tuple[int, Dict]:
+        (item,) = body["items"]
+        if self._find(self.functions, [{"externalId": item.get("externalId")}], ignore_unknown=True):
+            return 409, {"error": {"code": 409, "message": "Function externalId duplicated"}}
+        if not self.files.get(item["fileId"], {}).get("uploaded"):
+            return 400, {"error": {"code": 400, "message": f"File {item['fileId']} not uploaded"}}
+        function = {**item, "id": next(self._ids), "createdTime": int(time.time() * 1000)}
+        for secret_field in ("apiKey", "secrets"):
+            function.pop(secret_field, None)
+        self.functions[function["id"]] = function
+        return 201, {"items": [self._function_status(function)]}
+
+    def functions_by_ids(self, headers, body, query) -> Tuple[int, Dict]:
+        found = self._find(self.functions, body["items"], body.get("ignoreUnknownIds", False))
+        return 200, {"items": [self._function_status(fn) for fn in found]}
+
+    def functions_list(self, headers, body, query) -> Tuple[int, Dict]:
+        filter_, items = body.get("filter") or {}, [self._function_status(fn) for fn in self.functions.values()]
+        if prefix := filter_.get("externalIdPrefix"):
+            items = [fn for fn in items if (fn.get("externalId") or "").startswith(prefix)]
+        for key in ("name", "owner", "fileId", "status"):
+            if key in filter_:
+                items = [fn for fn in items if fn.get(key) == filter_[key]]
+        return 200, {"items": items[: body.get("limit") or 100]}
+
+    def functions_delete(self, headers, body, query) -> Tuple[int, Dict]:
+        for function in self._find(self.functions, body["items"]):
+            del self.functions[function["id"]]
+        return 200, {}
+
+    def schedules_create(self, headers, body, query) -> Tuple[int, Dict]:
+        (item,) = body["items"]
+        schedule = {**item, "id": next(self._ids), "createdTime": int(time.time() * 1000)}
+        self.schedules[schedule["id"]] = schedule
+        return 201, {"items": [{k: v for k, v in schedule.items() if k != "data"}]}
+
+    def schedules_list(self, headers, body, query) -> Tuple[int, Dict]:
+        filter_, items = body.get("filter") or {}, list(self.schedules.values())
+        for key in ("name", "functionExternalId", "cronExpression"):
+            if key in filter_:
+                items = [s for s in items if s.get(key) == filter_[key]]
+        return 200, {"items": [{k: v for k, v in s.items() if k != "data"} for s in items]}
+
+    def schedules_delete(self, headers, body, query) -> Tuple[int, Dict]:
+        for schedule in self._find(self.schedules, body["items"]):
+            del self.schedules[schedule["id"]]
+        return 200, {}
+
+    def schedules_input_data(self, headers, body, query, schedule_id: int) -> Tuple[int, Dict]:
+        if schedule_id not in self.schedules:
+            return 404, {"error": {"code": 404, "message": f"Schedule {schedule_id} not found"}}
+        return 200, {"id": schedule_id, "data": self.schedules[schedule_id].get("data")}
+
+
+ROUTES = [
+    ("GET", re.compile(r"^/login/status$"), "login_status"),
+    ("POST", re.compile(r"^/datasets/byids$"), "data_sets_by_ids"),
+    ("POST", re.compile(r"^/files$"), "files_create"),
+    ("PUT", re.compile(r"^/upload/(\d+)$"), "files_upload"),
+    ("POST", re.compile(r"^/files/byids$"), "files_by_ids"),
+    ("POST", re.compile(r"^/files/update$"), "files_update"),
+    ("POST", re.compile(r"^/files/delete$"), "files_delete"),
+    ("POST", re.compile(r"^/functions/schedules$"), "schedules_create"),
+    ("POST", re.compile(r"^/functions/schedules/list$"), "schedules_list"),
+    ("POST", re.compile(r"^/functions/schedules/delete$"), "schedules_delete"),
+    ("GET", re.compile(r"^/functions/schedules/(\d+)/input_data$"), "schedules_input_data"),
+    ("POST", re.compile(r"^/functions$"), "functions_create"),
+    ("POST", re.compile(r"^/functions/byids$"), "functions_by_ids"),
+    ("POST", re.compile(r"^/functions/list$"), "functions_list"),
+    ("POST", re.compile(r"^/functions/delete$"), "functions_delete"),
+]
+
+
+class MockCDFRequestHandler(BaseHTTPRequestHandler):
+    server: "MockCDFServer"
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass  # Silence per-request logging
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        settings, chunks, remaining = self.server.cdf.settings, [], length
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 64 * 1024))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            if settings.bandwidth_bytes_per_sec:
+                time.sleep(len(chunk) / settings.bandwidth_bytes_per_sec)
+        body = b"".join(chunks)
+        return gzip.decompress(body) if self.headers.get("Content-Encoding") == "gzip" else body
+
+    def _respond(self, status: int, payload: Dict, headers: Dict[str, str] = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Request-Id", "mock")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method: str) -> None:
+        cdf = self.server.cdf
+        with cdf.lock:
+            if cdf.stats.first_request_at is None:
+                cdf.stats.first_request_at = time.monotonic()
+        raw_body = self._read_body()
+        url = urlparse(self.path)
+        path = url.path
+        if match := PROJECT_PATH_RE.match(path):
+            path = match["path"]
+
+        time.sleep(cdf.settings.latency_sec)
+        for route_method, pattern, handler_name in ROUTES:
+            if route_method == method and (route_match := pattern.match(path)):
+                break
+        else:
+            return self._respond(404, {"error": {"code": 404, "message": f"No mock route for {method} {path}"}})
+
+        headers = []  # Optionally, extra response headers
+        with cdf.lock:
+            cdf.stats.count(f"{method} {pattern.pattern.strip('^$')}", len(raw_body))
+            if random.random() < cdf.settings.failure_rate:  # nosec
+                cdf.stats.injected_failures += 1
+                status, payload = 503, {"error": {"code": 503, "message": "Injected failure"}}
+            else:
+                handler = getattr(cdf, handler_name)
+                body = raw_body if handler_name == "files_upload" else json.loads(raw_body or b"{}")
+                args = [int(g) for g in route_match.groups()]
+                try:
+                    status, payload, *headers = handler(self.headers, body, parse_qs(url.query), *args)
+                except NotFound as e:
+                    status, payload = 400, {"error": {"code": 400, "message": "Not found", "missing": e.missing}}
+        self._respond(status, payload, *headers)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+
+class MockCDFServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, settings: MockSettings = None, host: str = "127.0.0.1", port: int = 0):
+        self.cdf = MockCDF(settings or MockSettings())
+        super().__init__((host, port), MockCDFRequestHandler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "MockCDFServer":
+        threading.Thread(target=self.serve_forever, name="mock-cdf", daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--bandwidth-mbps", type=float, default=None, help="Upload bandwidth in MB/s")
+    parser.add_argument("--build-sec", type=float, default=1)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--fail-builds", action="store_true")
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency_sec=args.latency_ms / 1000,
+        bandwidth_bytes_per_sec=args.bandwidth_mbps and args.bandwidth_mbps * 1024**2,
+        build_sec=args.build_sec,
+        failure_rate=args.failure_rate,
+        fail_builds=args.fail_builds,
+    )
+    with MockCDFServer(settings, port=args.port) as server:
+        print(f"Mock CDF (project '{PROJECT}') listening on {server.base_url}, press Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
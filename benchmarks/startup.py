@@ -0,0 +1,110 @@
+"""
+Startup benchmark: measures how long the action takes from process start until it is doing useful work,
+in the layout of the Docker image (the source files and 'action.yaml' in a single app directory):
+- import time of 'index', i.e. before any input is read
+- time from process start to the first API call (the credentials check), against the mock CDF server
+- total run time of a small run ('remove_only', so no build is awaited)
+
+Each is measured with the source files only (as every container starts without bytecode of its own) and
+precompiled (as done in the Docker image). Dependencies are used as installed, i.e. precompiled by pip.
+
+Usage (from repository root):
+    python benchmarks/startup.py [--runs 5] [--save results.json]
+"""
+
+import argparse
+import compileall
+import json
+import os
+import shutil
+import statistics
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+from pathlib import Path
+from py_compile import PycInvalidationMode
+from typing import Dict
+
+import yaml
+from mock_cdf import MockCDFServer
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+IMPORT_SCRIPT = "import time; t0 = time.perf_counter(); import index; print(time.perf_counter() - t0)"
+
+
+def make_app(root: Path, precompiled: bool) -> Path:
+    app = root / ("app-precompiled" if precompiled else "app-source")
+    shutil.copytree(REPO_ROOT / "src", app, ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copy(REPO_ROOT / "action.yaml", app)
+    if precompiled:
+        compileall.compile_dir(app, quiet=1, invalidation_mode=PycInvalidationMode.UNCHECKED_HASH)
+    return app
+
+
+def run_env(app: Path, precompiled: bool, **inputs) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("INPUT_")}
+    env["PYTHONPATH"] = str(app)
+    if not precompiled:
+        env["PYTHONDONTWRITEBYTECODE"] = "1"  # Every run starts cold, like a fresh container
+    # Like the runner, we pass the defaults of all inputs that are not given:
+    with (app / "action.yaml").open() as f:
+        defaults = {name: spec["default"] for name, spec in yaml.safe_load(f)["inputs"].items() if "default" in spec}
+    for name, value in {**defaults, **inputs}.items():
+        env[f"INPUT_{name.upper()}"] = str(value).lower() if isinstance(value, bool) else str(value)
+    return env
+
+
+def measure_import(app: Path, precompiled: bool) -> float:
+    cmd = [sys.executable, "-c", IMPORT_SCRIPT]
+    res = subprocess.run(cmd, cwd=app, env=run_env(app, precompiled), capture_output=True, check=True)  # nosec
+    return float(res.stdout)
+
+
+def measure_run(app: Path, precompiled: bool, server: MockCDFServer, function_folder: Path) -> Dict[str, float]:
+    server.cdf.stats.first_request_at = None
+    env = run_env(
+        app,
+        precompiled,
+        function_name="startup-benchmark",
+        function_folder=function_folder,
+        function_file="handler.py",
+        remove_only=True,
+        cdf_deployment_credentials="mock-deploy-key",
+        cdf_runtime_credentials="mock-runtime-key",
+        cdf_base_url=server.base_url,
+    )
+    cmd = [sys.executable, str(app / "index.py")]
+    t0 = time.monotonic()
+    subprocess.run(cmd, cwd=function_folder.parent, env=env, capture_output=True, check=True)  # nosec
+    total = time.monotonic() - t0
+    return {"first_api_call_sec": server.cdf.stats.first_request_at - t0, "remove_only_run_sec": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Results are the median of this many runs")
+    parser.add_argument("--save", type=Path, help="Save results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, MockCDFServer() as server:
+        function_folder = Path(tmp) / "function"
+        function_folder.mkdir()
+        (function_folder / "handler.py").write_text("def handle(data):\n    return data\n")
+        for precompiled in [False, True]:
+            app, label = make_app(Path(tmp), precompiled), "precompiled" if precompiled else "source"
+            imports = [measure_import(app, precompiled) for _ in range(args.runs)]
+            runs = [measure_run(app, precompiled, server, function_folder) for _ in range(args.runs)]
+            results[f"{label}_import_sec"] = statistics.median(imports)
+            for key in runs[0]:
+                results[f"{label}_{key}"] = statistics.median(run[key] for run in runs)
+
+    for key, value in results.items():
+        print(f"{key:>40}: {value:10.3f}")
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Memory benchmark for zipping function folders: builds folders of increasing size (incompressible
+data), zips each of them in a fresh subprocess and reports the peak RSS. With the archive spooled
+to disk, peak RSS should stay (roughly) flat as the folder size grows.
+
+Usage (from repository root):
+    PYTHONPATH=src python benchmarks/zip_memory.py [--sizes-mb 16 64 256] [--spool-mb 32]
+"""
+
+import argparse
+import os
+import resource
+import subprocess  # nosec
+import sys
+import tempfile
+from pathlib import Path
+
+FILE_SIZE_MB = 8
+
+
+def make_folder(root: Path, size_mb: int) -> Path:
+    folder = root / f"function-{size_mb}mb"
+    folder.mkdir()
+    (folder / "handler.py").write_text("def handle(data):\n    return data\n")
+    for i in range(max(1, size_mb // FILE_SIZE_MB)):
+        (folder / f"blob-{i}.bin").write_bytes(os.urandom(FILE_SIZE_MB * 1024**2))
+    return folder
+
+
+def measure(folder: str, spool_mb: int) -> None:
+    # Runs in the subprocess. Configs are constructed without validation (no credentials check):
+    from archive import hash_archive
+    from config import FunctionConfig, TenantConfig
+    from function import zip_folder
+
+    config = FunctionConfig.construct(
+        function_name="zip-memory",
+        function_folder=Path(folder),
+        function_file="handler.py",
+        tenant=TenantConfig.construct(cdf_runtime_credentials=""),
+    )
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with zip_folder(config, spool_max_size=spool_mb * 1024**2) as archive:
+        hash_archive(archive)
+        # Read through the full archive, like the upload does:
+        while archive.read(1024**2):
+            pass
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(rss_before, rss_after)  # KiB on Linux
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--spool-mb", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'folder size':>12} | {'baseline RSS':>12} | {'peak RSS':>10} | {'delta':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes_mb:
+            folder = make_folder(Path(tmp), size_mb)
+            out = subprocess.run(  # nosec
+                [sys.executable, __file__, "--child", str(folder), str(args.spool_mb)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            before, after = map(int, out.split())
+            print(f"{size_mb:>9} MB | {before/1024:>9.1f} MB | {after/1024:>7.1f} MB | {(after-before)/1024:>7.1f} MB")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        measure(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
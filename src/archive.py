@@ -0,0 +1,336 @@
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import struct
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Deque, Dict, List, Optional, Tuple
+from zipfile import ZIP64_LIMIT, ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from ignore import ExcludedStats, IgnoreMatcher, walk_included
+
+logger = logging.getLogger(__name__)
+
+# Already compressed (or not worth compressing) file types are stored as-is:
+STORED_SUFFIXES = {
+    ".whl", ".zip", ".egg", ".jar", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".pkl", ".pickle", ".joblib",
+    ".npz", ".parquet", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico",
+}  # fmt: skip
+# Larger files are compressed in a streaming fashion by ZipFile itself, to keep memory usage bounded:
+PARALLEL_MAX_FILE_SIZE = 16 * 1024**2
+COPY_CHUNK_SIZE = 1024**2
+# Files being compressed or waiting to be written (held in memory) are bounded by their total size:
+PENDING_MAX_SIZE = 64 * 1024**2
+# Compressed entries of shared folders (i.e. 'common_folder') are cached in-process, up to this total size:
+SHARED_CACHE_MAX_SIZE = 64 * 1024**2
+# Entries get fixed timestamps (earliest possible in the zip format), so that archives are reproducible:
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Local file header: fixed size part, and the offset of the file name and extra field lengths in it:
+LOCAL_HEADER_SIZE = 30
+LOCAL_HEADER_NAME_LENGTHS_OFFSET = 26
+
+
+class Compression:
+    STORED = "stored"
+    DEFLATE = "deflate"
+
+
+class ArchiveWriter:
+    """
+    Writes files to a zip archive, deflating them across a pool of worker threads (zlib releases the GIL),
+    while the entries are written to the archive in the same order as they are added.
+
+    Archives are deterministic: given the same files (in the same order), the bytes are identical, as entries
+    get fixed timestamps and normalized permissions, and directories get no entries of their own.
+
+    Given a 'previous' archive (built with the same settings), the compressed bytes of unchanged files are
+    copied from it as-is, so only changed files are read and compressed.
+    """
+
+    def __init__(
+        self,
+        zf: ZipFile,
+        compression: str = Compression.DEFLATE,
+        level: int = 6,
+        max_workers: int = None,
+        previous: "PreviousArchive" = None,
+    ):
+        self.zf = zf
+        self.compression = compression
+        self.level = level
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.previous = previous
+        self.reused = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Deque[Tuple[ZipInfo, Future, int]] = deque()
+        self._pending_size = 0
+
+    def __enter__(self) -> "ArchiveWriter":
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="zip")
+        return self
+
+    def __exit__(self, exc_type, *_) -> None:
+        try:
+            if exc_type is None:
+                self._flush()
+        finally:
+            self._executor.shutdown()
+
+    def compress_type(self, path: Path) -> int:
+        if self.compression == Compression.STORED or path.suffix.lower() in STORED_SUFFIXES:
+            return ZIP_STORED
+        return ZIP_DEFLATED
+
+    def write(self, path: Path, arcname: Path, shared: bool = False, sha256: Optional[str] = None) -> None:
+        """'sha256' is the digest of the file contents, if known, which allows reusing its previous entry"""
+        file_stat = path.stat()
+        zinfo = ZipInfo(arcname.as_posix(), date_time=FIXED_DATE_TIME)
+        zinfo.external_attr = (stat.S_IFREG | (0o755 if file_stat.st_mode & stat.S_IXUSR else 0o644)) << 16
+        zinfo.file_size = file_stat.st_size
+        zinfo.compress_type = self.compress_type(path)
+        if self.previous is not None and sha256 is not None:
+            if (previous := self.previous.find_unchanged(zinfo, sha256)) is not None:
+                self._copy_previous(zinfo, previous)
+                return
+
+        if zinfo.compress_type == ZIP_DEFLATED and zinfo.file_size <= PARALLEL_MAX_FILE_SIZE:
+            self._reserve(zinfo.file_size)
+            if shared:
+                key = (str(path.resolve()), file_stat.st_size, file_stat.st_mtime_ns, self.level)
+                future = self._executor.submit(_shared_cache.get_or_deflate, key, path, self.level)
+            else:
+                future = self._executor.submit(_deflate, path, self.level)
+            self._pending.append((zinfo, future, zinfo.file_size))
+        else:
+            self._flush()
+            zinfo._compresslevel = self.level  # Only settable through ZipFile.write, which would overwrite the rest
+            with path.open("rb") as src, self.zf.open(zinfo, mode="w") as dest:
+                shutil.copyfileobj(src, dest, COPY_CHUNK_SIZE)
+
+    def _copy_previous(self, zinfo: ZipInfo, previous: ZipInfo) -> None:
+        self.reused += 1
+        zinfo.CRC = previous.CRC
+        if previous.compress_size <= PARALLEL_MAX_FILE_SIZE:
+            # Queued like any other entry, so that the order of the entries is kept:
+            self._reserve(previous.compress_size)
+            future: Future = Future()
+            future.set_result((previous.CRC, previous.file_size, self.previous.read_compressed(previous)))
+            self._pending.append((zinfo, future, previous.compress_size))
+        else:
+            self._flush()
+            self.previous.copy_compressed(previous, self.zf, zinfo)
+
+    def _reserve(self, size: int) -> None:
+        """
+        Writes pending entries until one of 'size' (bytes) more fits in memory. An uncompressed file is read whole
+        and deflated to at most about its size, so its size bounds both the input and output held for it.
+        """
+        while self._pending and (
+            self._pending_size + size > PENDING_MAX_SIZE or len(self._pending) >= 4 * self.max_workers
+        ):
+            self._write_next_pending()
+        self._pending_size += size
+
+    def _flush(self) -> None:
+        while self._pending:
+            self._write_next_pending()
+
+    def _write_next_pending(self) -> None:
+        zinfo, future, size = self._pending.popleft()
+        zinfo.CRC, zinfo.file_size, compressed = future.result()
+        self._pending_size -= size
+        write_compressed_entry(self.zf, zinfo, compressed, zinfo.compress_type)
+
+
+class PreviousArchive:
+    """
+    An archive from an earlier build, with the manifest of its files (see 'build_manifest'), to copy the
+    compressed bytes of unchanged entries from.
+    """
+
+    def __init__(self, path: Path, manifest: Dict[str, Dict]):
+        self.manifest = manifest
+        self._file = path.open("rb")
+        try:
+            self._entries = {zinfo.filename: zinfo for zinfo in ZipFile(self._file).infolist()}
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __enter__(self) -> "PreviousArchive":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._file.close()
+
+    def find_unchanged(self, zinfo: ZipInfo, sha256: str) -> Optional[ZipInfo]:
+        """The previous entry, if it has the same contents, permissions and compression as 'zinfo'"""
+        if (self.manifest.get(zinfo.filename) or {}).get("sha256") != sha256:
+            return None
+        previous = self._entries.get(zinfo.filename)
+        if (
+            previous is None
+            or previous.external_attr != zinfo.external_attr
+            or previous.compress_type != zinfo.compress_type
+            or previous.file_size != zinfo.file_size
+            or max(previous.file_size, previous.compress_size) >= ZIP64_LIMIT  # Written without zip64 extra
+        ):
+            return None
+        return previous
+
+    def read_compressed(self, zinfo: ZipInfo) -> bytes:
+        self._seek_to_data(zinfo)
+        return self._file.read(zinfo.compress_size)
+
+    def copy_compressed(self, previous: ZipInfo, zf: ZipFile, zinfo: ZipInfo) -> None:
+        """Streams the compressed bytes of a (large) previous entry to 'zf', as the entry 'zinfo'"""
+        self._seek_to_data(previous)
+        zinfo.file_size = previous.file_size
+        remaining = previous.compress_size
+
+        def copy_data(dest: BinaryIO) -> None:
+            nonlocal remaining
+            while remaining and (chunk := self._file.read(min(remaining, COPY_CHUNK_SIZE))):
+                dest.write(chunk)
+                remaining -= len(chunk)
+            if remaining:
+                raise EOFError(f"Previous archive is truncated in entry '{previous.filename}'")
+
+        _write_entry(zf, zinfo, previous.compress_size, previous.compress_type, copy_data)
+
+    def _seek_to_data(self, zinfo: ZipInfo) -> None:
+        # The local header may differ from the central directory (e.g. in the extra field), so it is read:
+        self._file.seek(zinfo.header_offset + LOCAL_HEADER_NAME_LENGTHS_OFFSET)
+        name_length, extra_length = struct.unpack("<HH", self._file.read(4))
+        self._file.seek(zinfo.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length)
+
+
+def list_folder(directory: Path, root: Path) -> Tuple[List[Tuple[Path, Path]], ExcludedStats]:
+    """Files in 'directory' (not ignored) with their archive names, in archive order"""
+    excluded = ExcludedStats()
+    # Archive names are made relative to 'root' (instead of changing the working directory),
+    # so that several functions can be zipped concurrently:
+    files = [
+        (dirpath / f, (dirpath / f).relative_to(root))
+        for dirpath, filenames in walk_included(directory, IgnoreMatcher.from_folder(directory), excluded)
+        for f in filenames
+    ]
+    return files, excluded
+
+
+def hash_files(files: List[Tuple[Path, Path]], manifest: Optional[Dict[str, Dict]] = None) -> Dict[str, str]:
+    """
+    Digests of the file contents, by archive name. Files with the size and modification time recorded in
+    'manifest' (from an earlier build) are not read again.
+    """
+    hashes = {}
+    for path, arcname in files:
+        file_stat, name = path.stat(), arcname.as_posix()
+        known = (manifest or {}).get(name) or {}
+        if known.get("size") == file_stat.st_size and known.get("mtime_ns") == file_stat.st_mtime_ns:
+            hashes[name] = known["sha256"]
+            continue
+        file_digest = hashlib.sha256()
+        with path.open("rb") as f:
+            while chunk := f.read(COPY_CHUNK_SIZE):
+                file_digest.update(chunk)
+        hashes[name] = file_digest.hexdigest()
+    return hashes
+
+
+def build_manifest(files: List[Tuple[Path, Path]], file_hashes: Dict[str, str]) -> Dict[str, Dict]:
+    """Size, modification time and digest of each file, by archive name, to be compared against by the next build"""
+    manifest = {}
+    for path, arcname in files:
+        file_stat = path.stat()
+        name = arcname.as_posix()
+        manifest[name] = {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "sha256": file_hashes[name]}
+    return manifest
+
+
+def hash_archive_inputs(
+    files: List[Tuple[Path, Path]], compression: str, level: int, file_hashes: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Digest of everything that determines the (reproducible) archive: file contents, archive names and
+    permissions, and the compression settings. Modification times are not included, as e.g. a fresh
+    checkout in CI changes them all.
+    """
+    file_hashes = file_hashes if file_hashes is not None else hash_files(files)
+    digest = hashlib.sha256(f"{compression}:{level}".encode())
+    for path, arcname in files:
+        executable = path.stat().st_mode & stat.S_IXUSR
+        digest.update(f"{arcname.as_posix()}\0{bool(executable)}\0{file_hashes[arcname.as_posix()]}\n".encode())
+    return digest.hexdigest()
+
+
+def _deflate(path: Path, level: int) -> Tuple[int, int, bytes]:
+    data = path.read_bytes()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)  # Raw deflate stream, as used by zip
+    return zlib.crc32(data), len(data), compressor.compress(data) + compressor.flush()
+
+
+class _DeflateCache:
+    """Thread-safe LRU cache of deflated files, keyed by path, size, modification time and compression level"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._size = 0
+        self._entries: "OrderedDict[Tuple, Tuple[int, int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_deflate(self, key: Tuple, path: Path, level: int) -> Tuple[int, int, bytes]:
+        with self._lock:
+            if (entry := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                return entry
+        entry = _deflate(path, level)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._size += len(entry[2])
+            while self._size > self.max_size:
+                self._size -= len(self._entries.popitem(last=False)[1][2])
+        return entry
+
+
+_shared_cache = _DeflateCache(SHARED_CACHE_MAX_SIZE)
+
+
+def write_compressed_entry(zf: ZipFile, zinfo: ZipInfo, compressed: bytes, compress_type: int) -> None:
+    """
+    Writes an entry with already compressed data, which ZipFile has no public API for. This mirrors what
+    ZipFile does internally when writing directory entries. Note: 'CRC' and 'file_size' must be set on 'zinfo'.
+    """
+    _write_entry(zf, zinfo, len(compressed), compress_type, lambda dest: dest.write(compressed))
+
+
+def _write_entry(zf: ZipFile, zinfo: ZipInfo, compress_size: int, compress_type: int, write_data) -> None:
+    zinfo.compress_type = compress_type
+    zinfo.compress_size = compress_size
+    with zf._lock:
+        if zf._seekable:
+            zf.fp.seek(zf.start_dir)
+        zinfo.header_offset = zf.fp.tell()
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        zf.fp.write(zinfo.FileHeader(zip64=False))  # Only files below the zip64 limit are written this way
+        write_data(zf.fp)
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf.start_dir = zf.fp.tell()
+
+
+def hash_archive(archive: BinaryIO) -> str:
+    """Digest of the archive bytes, from the start. The position is reset to the start afterwards"""
+    archive.seek(0)
+    digest = hashlib.sha256()
+    while chunk := archive.read(COPY_CHUNK_SIZE):
+        digest.update(chunk)
+    archive.seek(0)
+    return digest.hexdigest()
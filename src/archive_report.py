@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Dict, List, Optional
+from zipfile import ZipFile, ZipInfo
+
+from humanize.filesize import naturalsize
+
+logger = logging.getLogger(__name__)
+
+LARGEST_FILES_TOP_N = 10
+DIRECTORY_DEPTH = 2  # Sizes are summed per directory down to this depth, e.g. 'common/utils'
+
+
+class ArchiveBudgetExceeded(Exception):
+    pass
+
+
+@dataclass
+class SizeTotals:
+    files: int = 0
+    size: int = 0  # Uncompressed
+    compressed_size: int = 0
+
+    def add(self, info: ZipInfo) -> None:
+        self.files += 1
+        self.size += info.file_size
+        self.compressed_size += info.compress_size
+
+
+@dataclass
+class FileSize:
+    name: str
+    source: str
+    size: int
+    compressed_size: int
+
+
+@dataclass
+class ArchiveReport:
+    """What went into the zipped code of a function, by source ('function', 'common' or 'vendored')"""
+
+    external_id: str
+    archive_size: int  # Including zip headers
+    total: SizeTotals = field(default_factory=SizeTotals)
+    sources: Dict[str, SizeTotals] = field(default_factory=dict)
+    directories: Dict[str, Dict[str, SizeTotals]] = field(default_factory=dict)  # By source, largest first
+    largest_files: List[FileSize] = field(default_factory=list)
+
+
+def analyze_archive(
+    archive: BinaryIO, sources: Dict[str, str], external_id: str, top_n: int = LARGEST_FILES_TOP_N
+) -> ArchiveReport:
+    """
+    Sizes of the files in the archive (by archive name, attributed to 'sources'), read from its central directory
+    only, so this is cheap even for large archives. The position of 'archive' is restored afterwards.
+    """
+    position = archive.tell()
+    report = ArchiveReport(external_id, archive_size=archive.seek(0, os.SEEK_END))
+    archive.seek(0)
+    with ZipFile(archive) as zf:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+    archive.seek(position)
+
+    directories: Dict[str, Dict[str, SizeTotals]] = {}
+    for info in infos:
+        source = sources.get(info.filename, "function")
+        directory = "/".join(PurePosixPath(info.filename).parts[:-1][:DIRECTORY_DEPTH]) or "."
+        report.total.add(info)
+        report.sources.setdefault(source, SizeTotals()).add(info)
+        directories.setdefault(source, {}).setdefault(directory, SizeTotals()).add(info)
+    for source, totals in directories.items():
+        report.directories[source] = dict(sorted(totals.items(), key=lambda item: item[1].size, reverse=True))
+    largest = sorted(infos, key=lambda info: info.file_size, reverse=True)[:top_n]
+    report.largest_files = [
+        FileSize(info.filename, sources.get(info.filename, "function"), info.file_size, info.compress_size)
+        for info in largest
+    ]
+    return report
+
+
+def log_archive_report(report: ArchiveReport, top_n: int = 5) -> None:
+    total = report.total
+    by_source = ", ".join(f"{source} {naturalsize(t.compressed_size)}" for source, t in report.sources.items())
+    logger.info(
+        f"- Zipped code is {naturalsize(report.archive_size)} ({naturalsize(total.size)} unpacked) with "
+        f"{total.files} file(s): {by_source}"
+    )
+    files = ", ".join(f"{f.name} ({naturalsize(f.size)})" for f in report.largest_files[:top_n])
+    logger.info(f"- Largest files: {files or '-'}")
+    directories = [
+        (directory if source == "function" else f"{source}:{directory}", totals)
+        for source, by_directory in report.directories.items()
+        for directory, totals in by_directory.items()
+    ]
+    directories.sort(key=lambda item: item[1].size, reverse=True)
+    logger.info(f"- Largest directories: {', '.join(f'{d} ({naturalsize(t.size)})' for d, t in directories[:top_n])}")
+
+
+def check_archive_budgets(
+    report: ArchiveReport, max_size: Optional[int], max_unpacked_size: Optional[int], warn_only: bool = False
+) -> None:
+    """Fails (or warns) when the zipped code exceeds the budgets (in bytes), before anything is uploaded"""
+    exceeded = []
+    if max_size is not None and report.archive_size > max_size:
+        exceeded.append(f"{naturalsize(report.archive_size)} zipped, budget is {naturalsize(max_size)}")
+    if max_unpacked_size is not None and report.total.size > max_unpacked_size:
+        exceeded.append(f"{naturalsize(report.total.size)} unpacked, budget is {naturalsize(max_unpacked_size)}")
+    if not exceeded:
+        return
+    err_msg = (
+        f"Zipped code of '{report.external_id}' exceeds its size budget ({'; '.join(exceeded)}). See the largest "
+        "files and directories above, and exclude what the function does not need with a '.functionignore' file"
+    )
+    if warn_only:
+        logger.warning(err_msg)
+        return
+    logger.error(err_msg)
+    raise ArchiveBudgetExceeded(err_msg)
+
+
+_reports: List[ArchiveReport] = []
+_reports_lock = threading.Lock()
+
+
+def record_archive_report(report: ArchiveReport) -> None:
+    with _reports_lock:
+        _reports.append(report)
+
+
+def write_archive_reports(path: Path) -> None:
+    """Writes the reports of all archives built in this run as JSON, e.g. to track their growth as an artifact"""
+    with _reports_lock:
+        archives = [asdict(report) for report in _reports]
+    Path(path).write_text(json.dumps({"archives": archives}, indent=2))
+    logger.info(f"Wrote archive report of {len(archives)} function(s) to '{path}'")
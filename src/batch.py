@@ -0,0 +1,89 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from cognite.experimental import CogniteClient
+from cognite.experimental.data_classes import Function
+
+from config import FunctionConfig, TenantConfig, load_yaml
+
+logger = logging.getLogger(__name__)
+
+
+class BatchDeployError(Exception):
+    pass
+
+
+class DeployStatus:
+    DEPLOYED = "Deployed"
+    REMOVED = "Removed"
+    FAILED = "Failed"
+
+
+@dataclass
+class DeployResult:
+    external_id: str
+    status: str
+    function_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+def load_manifest(path: Path, tenant: TenantConfig, defaults: Dict) -> List[FunctionConfig]:
+    """
+    The manifest is a YAML list where each entry holds the same parameters as the action itself
+    (function_name, function_folder, schedule_file, ...). Parameters given to the action are used
+    as defaults for all entries, while the tenant (and thus the credentials check) is shared.
+    """
+    entries = load_yaml(path)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"Manifest file '{path}' must contain a non-empty list of function configs")
+
+    configs = [FunctionConfig(tenant=tenant, **{**defaults, **entry}) for entry in entries]
+    external_ids = [config.external_id for config in configs]
+    if duplicated := {xid for xid in external_ids if external_ids.count(xid) > 1}:
+        raise ValueError(f"Manifest file '{path}' contains duplicated function names: {sorted(duplicated)}")
+    return configs
+
+
+def deploy_batch(
+    client: CogniteClient,
+    configs: List[FunctionConfig],
+    deploy_fn: Callable[[CogniteClient, FunctionConfig], Optional[Function]],
+    max_workers: int,
+) -> List[DeployResult]:
+    """
+    Runs 'deploy_fn' for all configs through a bounded thread pool. Most of the time is spent waiting
+    for the server-side deployments, so these waits overlap instead of adding up.
+    """
+    logger.info(f"Deploying {len(configs)} function(s) using {max_workers} worker(s)...")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="deploy") as executor:
+        futures = {executor.submit(deploy_fn, client, config): config for config in configs}
+        results = {}
+        for future in as_completed(futures):
+            external_id = futures[future].external_id
+            try:
+                function = future.result()
+            except Exception as e:
+                logger.error(f"Deployment of function '{external_id}' failed: {e!r}")
+                results[external_id] = DeployResult(external_id, DeployStatus.FAILED, error=repr(e))
+                continue
+            if function is None:
+                results[external_id] = DeployResult(external_id, DeployStatus.REMOVED)
+            else:
+                results[external_id] = DeployResult(external_id, DeployStatus.DEPLOYED, function_id=function.id)
+            logger.info(f"Function '{external_id}' done ({results[external_id].status})!")
+    # Report in manifest order:
+    return [results[config.external_id] for config in configs]
+
+
+def log_batch_summary(results: List[DeployResult]) -> None:
+    n_failed = sum(res.status == DeployStatus.FAILED for res in results)
+    logger.info(f"Batch deployment finished: {len(results) - n_failed} succeeded, {n_failed} failed")
+    for res in results:
+        extra = f" (ID: {res.function_id})" if res.function_id is not None else ""
+        logger.info(f"- {res.external_id}: {res.status}{extra}")
+    if n_failed:
+        failed = [res.external_id for res in results if res.status == DeployStatus.FAILED]
+        raise BatchDeployError(f"Deployment failed for {n_failed} function(s): {failed}")
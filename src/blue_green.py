@@ -0,0 +1,59 @@
+import logging
+from typing import List, Optional
+
+from cognite.experimental import CogniteClient
+from cognite.experimental.data_classes import Function
+
+from config import FunctionConfig
+from function import FunctionStatus, delete_single_cognite_function, upload_and_create_function
+
+logger = logging.getLogger(__name__)
+
+SLOTS = ("blue", "green")
+
+
+def get_slot_external_ids(external_id: str) -> List[str]:
+    return [f"{external_id}-{slot}" for slot in SLOTS]
+
+
+def retrieve_deployed_functions(client: CogniteClient, external_id: str) -> List[Function]:
+    """All deployed versions of the function: both slots, and the unsuffixed one (from a non-blue/green deploy)"""
+    candidates = {external_id, *get_slot_external_ids(external_id)}
+    # Listing by prefix is a single call, and unlike retrieve_multiple, does not fail on missing functions:
+    functions = client.functions.list(external_id_prefix=external_id, limit=None)
+    return [fn for fn in functions if fn.external_id in candidates]
+
+
+def find_live_function(functions: List[Function]) -> Optional[Function]:
+    # If more than one version is ready (e.g. the last retirement failed), the newest one is live:
+    ready = [fn for fn in functions if fn.status == FunctionStatus.READY]
+    return max(ready, key=lambda fn: fn.created_time or 0, default=None)
+
+
+def get_idle_slot(external_id: str, live: Optional[Function]) -> str:
+    blue, green = get_slot_external_ids(external_id)
+    return green if live is not None and live.external_id == blue else blue
+
+
+def deploy_to_idle_slot(client: CogniteClient, config: FunctionConfig, live: Optional[Function]) -> Function:
+    """
+    Deploys the function to the slot not in use, while the live version keeps running (with its schedules).
+    If the rollout fails, the idle slot is cleaned up, and the live version is left as-is. Note: If the live
+    version is unchanged, it is returned instead.
+    """
+    target = get_idle_slot(config.external_id, live)
+    live_external_id = live.external_id if live is not None else None
+    logger.info(f"Blue/green deployment of '{config.external_id}' to '{target}' (live: '{live_external_id}')")
+    try:
+        return upload_and_create_function(client, config, external_id=target, live_external_id=live_external_id)
+    except Exception:
+        logger.error(f"Rollout of '{target}' failed! Cleaning up, live version '{live_external_id}' is kept")
+        delete_single_cognite_function(client, target, remove_schedules=True, await_deletion=False)
+        raise
+
+
+def retire_functions(client: CogniteClient, functions: List[Function], keep: Optional[Function] = None) -> None:
+    for fn in functions:
+        if keep is None or fn.external_id != keep.external_id:
+            logger.info(f"Retiring old version '{fn.external_id}' of the function")
+            delete_single_cognite_function(client, fn.external_id, remove_schedules=True, await_deletion=False)
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MAX_SIZE_MB = 512
+COPY_CHUNK_SIZE = 1024**2
+
+
+class DeployCache:
+    """
+    Persistent, size-bounded cache in a local directory (e.g. restored by 'actions/cache' between CI runs).
+    Entries are files under '<root>/<namespace>/<key>', written atomically, so an interrupted run never
+    leaves a partial entry behind. Reads mark entries as recently used, and when the total size exceeds the
+    limit, the least recently used entries are evicted.
+    """
+
+    def __init__(self, root: Path, max_size: int):
+        self.root = Path(root)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, namespace: str, key: str) -> Path:
+        return self.root / namespace / key
+
+    def get_path(self, namespace: str, key: str) -> Optional[Path]:
+        path = self._path(namespace, key)
+        try:
+            os.utime(path)  # Mark as recently used (access times are not reliable, e.g. with 'noatime')
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put_stream(self, namespace: str, key: str, stream: BinaryIO) -> Path:
+        """Copies the stream from its current position, which is restored afterwards"""
+        position = stream.tell()
+        path = self._write_atomic(namespace, key, lambda f: shutil.copyfileobj(stream, f, COPY_CHUNK_SIZE))
+        stream.seek(position)
+        return path
+
+    def get_json(self, namespace: str, key: str) -> Optional[Dict]:
+        if (path := self.get_path(namespace, key)) is None:
+            return None
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None  # E.g. evicted by another process, or written by an incompatible version
+
+    def put_json(self, namespace: str, key: str, value: Dict) -> None:
+        self._write_atomic(namespace, key, lambda f: f.write(json.dumps(value).encode()))
+
+    def _write_atomic(self, namespace: str, key: str, write) -> Path:
+        path = self._path(namespace, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return path
+
+    def evict(self) -> int:
+        """Evicts least recently used entries until the cache fits its size limit. Returns the bytes freed"""
+        with self._lock:
+            entries = []
+            for path in self.root.glob("*/*"):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            total, freed = sum(size for _, size, _ in entries), 0
+            for _, size, path in sorted(entries):
+                if total - freed <= self.max_size:
+                    break
+                path.unlink(missing_ok=True)
+                freed += size
+        if freed:
+            logger.info(f"Evicted {freed} bytes from the deploy cache in '{self.root}'")
+        return freed
+
+
+_caches: Dict[Path, DeployCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_deploy_cache(cache_dir: Optional[Path], max_size_mb: int = DEFAULT_CACHE_MAX_SIZE_MB) -> Optional[DeployCache]:
+    """One cache per directory, shared by all functions deployed by this process. None if caching is disabled"""
+    if cache_dir is None:
+        return None
+    with _caches_lock:
+        if (cache := _caches.get(key := Path(cache_dir).resolve())) is None:
+            cache = _caches[key] = DeployCache(key, max_size_mb * 1024**2)
+        return cache
+
+
+def evict_deploy_caches() -> None:
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.evict()
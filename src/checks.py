@@ -1,13 +1,25 @@
 import ast
+import hashlib
 import logging
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
 
+from cache import DeployCache, get_deploy_cache
 from config import FunctionConfig
+from ignore import ExcludedStats, IgnoreMatcher, walk_included
+from requirements import Requirement, is_option_or_url, read_requirement_lines
 
 logger = logging.getLogger(__name__)
 
 
 HANDLE_ARGS = ("data", "client", "secrets", "function_call_info")
+# Below this number of files to parse, the overhead of spawning processes is not worth it:
+PARALLEL_MIN_FILES = 16
 
 
 class FunctionValidationError(Exception):
@@ -18,6 +30,8 @@ def run_checks(config: FunctionConfig) -> None:
     # Python-only checks:
     if config.function_file.endswith(".py"):
         _check_handle_args(config.function_folder / config.function_file)
+        _check_python_files(config)
+        _check_requirements(config.function_folder / "requirements.txt")
 
 
 def _check_handle_args(file_path: Path, fn_name: str = "handle") -> None:
@@ -41,3 +55,205 @@ def _check_handle_args(file_path: Path, fn_name: str = "handle") -> None:
     err_msg = f"No function named '{fn_name}' was found in file '{file_path}'. It is required!"
     logger.error(err_msg)
     raise FunctionValidationError(err_msg)
+
+
+@dataclass
+class FileAnalysis:
+    syntax_error: Optional[str] = None
+    # Imports as (relative import level, module, names imported from the module, line number):
+    imports: List[Tuple[int, str, List[str], int]] = field(default_factory=list)
+
+
+# Analyses (done or in progress) keyed by file content hash, so each file is parsed once, also when the checks of
+# functions sharing files (like a common folder) run concurrently:
+_analysis_cache: Dict[str, Future] = {}
+_analysis_lock = threading.Lock()
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """
+    One pool for all checks, created on first use. Its processes are started by a fork server, as forking the
+    (multithreaded) action process itself is not safe.
+    """
+    global _executor
+    with _analysis_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("forkserver"))
+        return _executor
+
+
+def _completed(analysis: FileAnalysis) -> Future:
+    future = Future()
+    future.set_result(analysis)
+    return future
+
+
+def _caught_exceptions(handler: ast.ExceptHandler) -> Set[str]:
+    if handler.type is None:
+        return {"BaseException"}  # Bare except
+    nodes = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+    return {node.id if isinstance(node, ast.Name) else getattr(node, "attr", "") for node in nodes}
+
+
+class _ImportCollector(ast.NodeVisitor):
+    def __init__(self):
+        self.imports = []
+
+    def visit_Try(self, node: ast.Try):
+        # Imports guarded by e.g. 'except ImportError' are allowed to fail, so we skip them:
+        caught = set().union(*map(_caught_exceptions, node.handlers))
+        if not caught.intersection({"ImportError", "ModuleNotFoundError", "Exception", "BaseException"}):
+            for child in node.body:
+                self.visit(child)
+        for child in node.handlers + node.orelse + node.finalbody:
+            self.visit(child)
+
+    def visit_Import(self, node: ast.Import):
+        self.imports.extend((0, alias.name, [], node.lineno) for alias in node.names)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        self.imports.append((node.level, node.module or "", [alias.name for alias in node.names], node.lineno))
+
+
+def _analyze_source(source: bytes, filename: str) -> FileAnalysis:
+    try:
+        tree = ast.parse(source, filename)
+    except SyntaxError as e:
+        return FileAnalysis(syntax_error=f"{e.msg} (line {e.lineno})")
+    collector = _ImportCollector()
+    collector.visit(tree)
+    return FileAnalysis(imports=collector.imports)
+
+
+def _collect_python_files(config: FunctionConfig) -> Dict[str, Path]:
+    # Same files (and archive names) as in the zipped code:
+    roots = [(config.function_folder, config.function_folder)]
+    if config.common_folder is not None:
+        roots.append((config.common_folder, config.common_folder.parent))
+    files = {}
+    for directory, root in roots:
+        for dirpath, filenames in walk_included(directory, IgnoreMatcher.from_folder(directory), ExcludedStats()):
+            for f in filenames:
+                if f.endswith(".py"):
+                    files[(dirpath / f).relative_to(root).as_posix()] = dirpath / f
+    return files
+
+
+def _analyze_files(files: Dict[str, Path], cache: Optional[DeployCache] = None) -> Dict[str, FileAnalysis]:
+    sources = {arcname: path.read_bytes() for arcname, path in files.items()}
+    hashes = {arcname: hashlib.sha256(source).hexdigest() for arcname, source in sources.items()}
+    if cache is not None:
+        with _analysis_lock:
+            missing = set(hashes.values()).difference(_analysis_cache)
+        _load_cached_analyses(cache, missing)
+    # Files not analyzed (nor being analyzed) yet are claimed, so concurrent checks wait for them instead:
+    todo: Dict[str, Tuple[str, bytes]] = {}
+    with _analysis_lock:
+        for arcname, sha in hashes.items():
+            if sha not in _analysis_cache:
+                _analysis_cache[sha] = Future()
+                todo[sha] = arcname, sources[arcname]
+    try:
+        if len(todo) >= PARALLEL_MIN_FILES:
+            names, contents = zip(*todo.values())
+            analyses = _get_executor().map(_analyze_source, contents, names, chunksize=8)
+        else:
+            analyses = (_analyze_source(source, arcname) for arcname, source in todo.values())
+        for sha, analysis in zip(todo, analyses):
+            _analysis_cache[sha].set_result(analysis)
+    except BaseException as e:
+        with _analysis_lock:
+            for sha in todo:
+                if not (future := _analysis_cache.pop(sha)).done():
+                    future.set_exception(e)
+        raise
+    if cache is not None:
+        for sha in todo:
+            cache.put_json("analyses", _get_analysis_key(sha), asdict(_analysis_cache[sha].result()))
+    logger.info(f"- Parsed {len(todo)} Python file(s) (the other {len(files) - len(todo)} were already parsed)")
+    return {arcname: _analysis_cache[hashes[arcname]].result() for arcname in files}
+
+
+def _get_analysis_key(sha: str) -> str:
+    # The grammar depends on the Python version, so analyses are only reused by the same version:
+    return f"py{sys.version_info.major}{sys.version_info.minor}-{sha}"
+
+
+def _load_cached_analyses(cache: DeployCache, hashes: Set[str]) -> None:
+    for sha in hashes:
+        if (analysis := cache.get_json("analyses", _get_analysis_key(sha))) is not None:
+            imports = [(level, module, names, lineno) for level, module, names, lineno in analysis["imports"]]
+            analysis = FileAnalysis(syntax_error=analysis["syntax_error"], imports=imports)
+            with _analysis_lock:
+                _analysis_cache.setdefault(sha, _completed(analysis))
+
+
+def _module_name(arcname: str) -> str:
+    parts = arcname[: -len(".py")].split("/")
+    return ".".join(parts[:-1] if parts[-1] == "__init__" else parts)
+
+
+def _resolve_import(arcname: str, level: int, module: str) -> Optional[str]:
+    if level == 0:
+        return module
+    # Relative import: resolve against the package of the importing file
+    package = arcname.split("/")[:-1]
+    if level - 1 >= len(package):
+        return None
+    base = package[: len(package) - (level - 1)]
+    return ".".join(base + ([module] if module else []))
+
+
+def _check_python_files(config: FunctionConfig) -> None:
+    files = _collect_python_files(config)
+    analyses = _analyze_files(files, get_deploy_cache(config.cache_dir, config.cache_max_size_mb))
+
+    # Modules and packages (including namespace packages, i.e. any directory) in the zipped code:
+    modules: Set[str] = set()
+    for arcname in files:
+        parts = _module_name(arcname).split(".")
+        modules.update(".".join(parts[: i + 1]) for i in range(len(parts)))
+    top_level = {module.split(".")[0] for module in modules}
+
+    errors = []
+    for arcname, analysis in sorted(analyses.items()):
+        if analysis.syntax_error:
+            errors.append(f"Syntax error in '{arcname}': {analysis.syntax_error}")
+            continue
+        for level, module, names, lineno in analysis.imports:
+            if (target := _resolve_import(arcname, level, module)) is None:
+                errors.append(f"In '{arcname}' (line {lineno}): relative import beyond top-level package")
+            elif level == 0 and target.split(".")[0] not in top_level:
+                continue  # Not part of the zipped code, e.g. standard library or a requirement
+            elif target and target not in modules:
+                errors.append(f"In '{arcname}' (line {lineno}): unable to resolve import of '{target}'")
+
+    for err in errors:
+        logger.error(err)
+    if errors:
+        raise FunctionValidationError(f"Found {len(errors)} error(s) in the Python files (see log for details)")
+    logger.info(f"Validated syntax and imports of {len(files)} Python file(s)!")
+
+
+def _check_requirements(path: Path) -> None:
+    if not path.is_file():
+        return
+    errors, seen = [], {}
+    for lineno, line in read_requirement_lines(path):
+        if is_option_or_url(line):
+            continue  # Pip option (e.g. --extra-index-url), or a requirement given by URL or path
+        if (req := Requirement.parse(line)) is None:
+            errors.append(f"In '{path}' (line {lineno}): invalid requirement '{line}'")
+            continue
+        # Requirements of the same package are fine with different markers, e.g. per Python version:
+        key = req.name, req.marker and " ".join(req.marker.replace('"', "'").split())
+        if key in seen:
+            errors.append(f"In '{path}' (line {lineno}): '{req.name}' is already required on line {seen[key]}")
+        seen[key] = lineno
+
+    for err in errors:
+        logger.error(err)
+    if errors:
+        raise FunctionValidationError(f"Found {len(errors)} error(s) in '{path}' (see log for details)")
+    logger.info(f"Validated {len(seen)} requirement(s) in '{path}'!")
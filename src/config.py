@@ -2,15 +2,19 @@ import base64
 import contextlib
 import json
 import logging
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional, Tuple
 
 import yaml
-from cognite.client import CogniteClient
-from cognite.experimental import CogniteClient as ExpCogniteClient
-from crontab import CronSlices
-from pydantic import BaseModel, constr, root_validator, validator
+from pydantic import BaseModel, PrivateAttr, confloat, conint, constr, root_validator, validator
+
+if TYPE_CHECKING:
+    # The SDKs take most of the startup time (pandas included), so they are imported on first use:
+    from cognite.client.data_classes import LoginStatus
+    from cognite.experimental import CogniteClient as ExpCogniteClient
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +23,14 @@ NonEmptyString = constr(min_length=1, strip_whitespace=True)
 
 DEPLOY_WAIT_TIME_SEC = 1500  # 25 minutes
 
+# The C-accelerated loader (if PyYAML was built with libyaml) is many times faster on large files:
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(path: Path):
+    with Path(path).open() as f:
+        return yaml.load(f, Loader=YamlLoader)  # nosec
+
 
 class TenantConfig(BaseModel):
     cdf_project: NonEmptyString = None
@@ -36,16 +48,7 @@ class TenantConfig(BaseModel):
 
     @staticmethod
     def _verify_credentials(env, values):
-        kwargs = {
-            "base_url": values["cdf_base_url"],
-            "client_name": "function-action-validator",
-            "disable_pypi_version_check": True,
-        }
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=UserWarning)
-            client = CogniteClient(api_key=values[f"cdf_{env}_credentials"], **kwargs)
-
-        login_status = client.login.status()
+        client, login_status = _login(values[f"cdf_{env}_credentials"], values["cdf_base_url"], values["cdf_project"])
         inferred_project = login_status.project
 
         if login_status.logged_in:
@@ -66,8 +69,13 @@ class TenantConfig(BaseModel):
 
     @root_validator(skip_on_failure=True)
     def check_credentials(cls, values):
-        deploy_project = cls._verify_credentials("deployment", values)
-        runtime_project = cls._verify_credentials("runtime", values)
+        # Both logins are network round trips, so we do them concurrently:
+        with warnings.catch_warnings(), ThreadPoolExecutor(max_workers=2) as executor:
+            warnings.filterwarnings("ignore", category=UserWarning)
+            deploy_future = executor.submit(cls._verify_credentials, "deployment", values)
+            runtime_future = executor.submit(cls._verify_credentials, "runtime", values)
+            deploy_project, runtime_project = deploy_future.result(), runtime_future.result()
+
         if deploy_project != runtime_project:
             raise ValueError(
                 "The deployment- and runtime credentials are for separate projects, "
@@ -77,16 +85,48 @@ class TenantConfig(BaseModel):
         return values
 
 
-def create_experimental_cognite_client(config: TenantConfig) -> ExpCogniteClient:
+# Clients (with their login status) for already verified credentials, keyed by base URL and API-key:
+_verified_clients: Dict[Tuple[str, str], Tuple["ExpCogniteClient", "LoginStatus"]] = {}
+_verified_clients_lock = threading.Lock()
+
+
+def _create_client(api_key: str, project: Optional[str], base_url: str) -> "ExpCogniteClient":
+    from cognite.experimental import CogniteClient as ExpCogniteClient
+
     return ExpCogniteClient(
-        api_key=config.deployment_key,
-        project=config.cdf_project,
-        base_url=config.cdf_base_url,
+        api_key=api_key,
+        project=project,
+        base_url=base_url,
         client_name="function-action",
         disable_pypi_version_check=True,
     )
 
 
+def _login(api_key: str, base_url: str, project: Optional[str]) -> Tuple["ExpCogniteClient", "LoginStatus"]:
+    with _verified_clients_lock:
+        if (key := (base_url, api_key)) in _verified_clients:
+            return _verified_clients[key]
+
+    # Note: If project is not given, the client infers it (from the login status) on creation:
+    client = _create_client(api_key, project, base_url)
+    login_status = client.login.status()
+    with _verified_clients_lock:
+        _verified_clients[key] = client, login_status
+    return client, login_status
+
+
+def create_experimental_cognite_client(config: TenantConfig) -> "ExpCogniteClient":
+    # Reuse the client created when verifying the credentials, if any:
+    key = (config.cdf_base_url, config.deployment_key)
+    with _verified_clients_lock:
+        if key in _verified_clients:
+            client, login_status = _verified_clients[key]
+            if login_status.logged_in and login_status.project == config.cdf_project:
+                return client
+
+    return _create_client(config.deployment_key, config.cdf_project, config.cdf_base_url)
+
+
 class ScheduleConfig(BaseModel):
     name: NonEmptyString
     cron: NonEmptyString
@@ -94,11 +134,27 @@ class ScheduleConfig(BaseModel):
 
     @validator("cron")
     def valid_cron(cls, value):
+        from crontab import CronSlices
+
         if not CronSlices.is_valid(value):
             raise ValueError(f"Invalid cron expression: '{value}'")
         return value
 
 
+def parse_schedules(path: Path, external_id: str) -> List[ScheduleConfig]:
+    all_schedules = load_yaml(path) or []
+    if not isinstance(all_schedules, list) or not all(isinstance(schedule, dict) for schedule in all_schedules):
+        raise ValueError(f"Schedule file '{path}' must contain a list of schedules")
+    return [
+        ScheduleConfig(
+            cron=schedule.get("cron"),  # If missing, we let Pydantic handle it
+            name=external_id + ":" + schedule.get("name", f"undefined-{i}"),
+            data=schedule.get("data"),
+        )
+        for i, schedule in enumerate(all_schedules)
+    ]
+
+
 def decode_and_parse(value) -> Optional[Dict]:
     if value is None:
         return None
@@ -118,14 +174,29 @@ class FunctionConfig(BaseModel):
     function_secrets: NonEmptyString = None
     function_file: constr(min_length=1, strip_whitespace=True, regex=r"^[\w\- ]+\.(py|js)$")  # noqa: F722
     schedule_file: constr(min_length=1, strip_whitespace=True, regex=r"^[\w\- /]+\.ya?ml$") = None  # noqa: F722
+    # Parsed (and validated) from the schedule file on creation, so a malformed file fails before anything is deployed:
+    _schedules: List[ScheduleConfig] = PrivateAttr(default_factory=list)
     data_set_external_id: NonEmptyString = None
     common_folder: Path = None
     tenant: TenantConfig
     remove_only: bool = False
+    remove_by_prefix: bool = False
     remove_schedules: bool = True
     cpu: float = None
     memory: float = None
     owner: constr(min_length=1, max_length=128, strip_whitespace=True) = None
+    force_redeploy: bool = False
+    blue_green: bool = False
+    zip_compression: Literal["stored", "deflate"] = "deflate"
+    zip_compression_level: conint(ge=0, le=9) = 6
+    cache_dir: Path = None
+    cache_max_size_mb: conint(gt=0) = 512
+    upload_chunk_size_mb: conint(gt=0) = None
+    upload_max_mb_per_sec: confloat(gt=0) = None
+    wheelhouse_dir: Path = None
+    max_archive_size_mb: confloat(gt=0) = None
+    max_unpacked_size_mb: confloat(gt=0) = None
+    archive_budget_action: Literal["fail", "warn"] = "fail"
 
     @validator("function_secrets")
     def valid_secret(cls, value):
@@ -137,6 +208,23 @@ class FunctionConfig(BaseModel):
             raise ValueError("Invalid secret, must be a valid base64 encoded json") from e
         return value
 
+    def __init__(self, **data):
+        super().__init__(**data)
+        if self.schedule_file is not None and not self.remove_only:
+            self._schedules = parse_schedules(self.function_folder / self.schedule_file, self.function_name)
+
+    @root_validator(pre=True)
+    def schedules_not_given(cls, values):
+        if "schedules" in values:
+            raise ValueError("Schedules can not be given directly, use 'schedule_file' instead")
+        return values
+
+    @validator("wheelhouse_dir")
+    def check_wheelhouse_dir(cls, value):
+        if value is None:
+            return value
+        return verify_path_is_directory(value)
+
     @root_validator(skip_on_failure=True)
     def check_function_folders(cls, values):
         verify_path_is_directory(values["function_folder"])
@@ -170,28 +258,18 @@ class FunctionConfig(BaseModel):
                 f"Passing '{remove_only=}' removes all schedules, but '{remove_schedules=}' was also passed, "
                 "which is incompatible!"
             )
+        if values["remove_by_prefix"] and not remove_only:
+            raise ValueError("Parameter 'remove_by_prefix' can only be used together with 'remove_only'")
         return values
 
-    @property
-    def schedules(self) -> List[ScheduleConfig]:
-        if self.schedule_file is None:
-            return []
-        path = self.function_folder / self.schedule_file
-        with path.open() as f:
-            all_schedules = yaml.safe_load(f)
-        return [
-            ScheduleConfig(
-                cron=schedule.get("cron"),  # If missing, we let Pydantic handle it
-                name=self.external_id + ":" + schedule.get("name", f"undefined-{i}"),
-                data=schedule.get("data"),
-            )
-            for i, schedule in enumerate(all_schedules)
-        ]
-
     @property
     def external_id(self):
         return self.function_name
 
+    @property
+    def schedules(self) -> List[ScheduleConfig]:
+        return self._schedules
+
     @property
     def unpacked_secrets(self) -> Optional[Dict]:
         return decode_and_parse(self.function_secrets)
@@ -1,23 +1,62 @@
-import io
+import hashlib
+import hmac
+import json
 import logging
 import os
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from zipfile import ZipFile
+from tempfile import SpooledTemporaryFile, TemporaryDirectory
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+from zipfile import BadZipFile, ZipFile
 
-from cognite.client.data_classes import DataSet, FileMetadata
-from cognite.client.exceptions import CogniteAPIError
+from cognite.client.data_classes import DataSet, FileMetadata, FileMetadataUpdate
+from cognite.client.exceptions import CogniteAPIError, CogniteNotFoundError
 from cognite.experimental import CogniteClient
 from cognite.experimental.data_classes import Function
+from humanize.filesize import naturalsize
 from humanize.time import precisedelta
-from retry import retry
 
+from archive import (
+    ArchiveWriter,
+    PreviousArchive,
+    build_manifest,
+    hash_archive,
+    hash_archive_inputs,
+    hash_files,
+    list_folder,
+)
+from archive_report import analyze_archive, check_archive_budgets, log_archive_report, record_archive_report
+from cache import DeployCache, get_deploy_cache
 from config import DEPLOY_WAIT_TIME_SEC, FunctionConfig
+from ignore import ExcludedStats
+from poller import Backoff, get_status_poller
+from retries import retry_phase
 from schedule import delete_function_schedules
-from utils import temporary_chdir
+from timing import bind_span, span
+from upload import upload_file, upload_file_in_chunks
+from wheelhouse import vendor_requirements
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+DIGEST_METADATA_KEY = "function-action-digest"  # Digest of the zipped code, stored on the uploaded file
+SIZE_METADATA_KEY = "function-action-size"  # Size of the zipped code (in bytes), stored on the uploaded file
+USED_AT_METADATA_KEY = "function-action-used-at"  # When a function was last deployed from the file (epoch ms)
+DESCRIPTION_DIGEST_PREFIX = "function-action-digest: "  # Deploy digest, stored as description of the function
+CODE_FILE_PREFIX = "function-action-code-"
+# Unused code files updated more recently are kept, as a function of another run may be about to be created from them:
+CODE_FILE_GRACE_PERIOD_SEC = 15 * 60
+MAX_BUILD_ATTEMPTS = 2  # Failed builds are re-created (reusing the uploaded file) this many times in total
+TEARDOWN_WORKERS = 8  # Max functions torn down concurrently
+DELETE_WAIT_TIME_SEC = 60  # Max wait for a deleted function to be gone, before it is re-created
+PIPELINE_WORKERS = 3  # Network work of a single deployment that runs alongside the main thread
+# Archives larger than this are spooled to disk instead of being kept in memory:
+ZIP_SPOOL_MAX_SIZE = 32 * 1024**2
+
 
 class FunctionDeployTimeout(Exception):
     pass
@@ -58,99 +97,238 @@ def await_function_deployment(client: CogniteClient, external_id: str, wait_time
         raise FunctionDeployError(err)
 
     t0 = time.time()
-    while time.time() <= t0 + wait_time_sec:
-        if function.status == FunctionStatus.READY:
-            logger.info(f"Function deployment successful! Deployment took {precisedelta(time.time()-t0)}")
-            return function
-
-        elif function.status == FunctionStatus.FAILED:
-            err_msg = f"Error message: {function.error['message']}.\nTrace: {function.error['trace']}"
-            logger.warning(f"Deployment failed after {precisedelta(time.time()-t0)}! {err_msg}")
-            raise FunctionDeployError(err_msg)
-
-        time.sleep(5)
-        function.update()
+    with span("await_deployment"):
+        if function.status not in (FunctionStatus.READY, FunctionStatus.FAILED):
+            # Shared between threads using the same client, so that status checks are batched:
+            poller = get_status_poller(client)
+            if (deployed := poller.wait(external_id, wait_time_sec)) is None:
+                err = f"Function {external_id} (ID: {function.id}) did not deploy within {precisedelta(wait_time_sec)}."
+                logger.error(err)
+                raise FunctionDeployTimeout(err)
+            function = deployed
+
+    if function.status == FunctionStatus.FAILED:
+        err_msg = f"Error message: {function.error['message']}.\nTrace: {function.error['trace']}"
+        logger.warning(f"Deployment failed after {precisedelta(time.time()-t0)}! {err_msg}")
+        raise FunctionDeployError(err_msg)
+
+    logger.info(f"Function deployment successful! Deployment took {precisedelta(time.time()-t0)}")
+    return function
+
+
+# Code files (by external ID) that are about to be used by functions deployed (concurrently) by this process:
+_files_in_use: Set[str] = set()
+_files_in_use_lock = threading.Lock()
+# Uploads of code files in progress, by external ID, shared by the functions with the same code:
+_code_file_uploads: Dict[str, Future] = {}
+_code_file_uploads_lock = threading.Lock()
+
+
+@contextmanager
+def reserve_file(external_id: str) -> Iterator[str]:
+    """Protects a (shared) code file from being deleted by teardowns, until the function using it is created"""
+    with _files_in_use_lock:
+        _files_in_use.add(external_id)
+    try:
+        yield external_id
+    finally:
+        with _files_in_use_lock:
+            _files_in_use.discard(external_id)
+
+
+@span("teardown")
+def delete_single_cognite_function(
+    client: CogniteClient,
+    external_id: str,
+    remove_schedules: bool,
+    await_deletion: bool = True,
+    deleted_external_ids: Optional[Set[str]] = None,
+):
+    """
+    Deletes the function, its code file (unless used by other functions) and, if specified, its schedules. The
+    deletions are independent, so they are issued concurrently. With 'await_deletion', we return once the function
+    is gone, so that it can be re-created with the same external ID. Code files used only by functions in
+    'deleted_external_ids' (i.e. being deleted together with this one) are deleted as well.
+    """
+    # The function is only retrieved to find its code file, all deletions handle 'not found' themselves:
+    if (function := client.functions.retrieve(external_id=external_id)) is None:
+        logger.info(f"Unable to delete function! External ID: '{external_id}' NOT found!")
+    deletions = []
+    if function is not None:
+        deletions.append((delete_function, external_id))
+        if function.file_id is not None:
+            deletions.append((delete_unused_code_file, function.file_id, deleted_external_ids or {external_id}))
+    # Files of functions deployed before code files were content-addressed:
+    deletions.append((delete_function_file, get_file_name(external_id)))
+    # Schedules live on when functions die, so we clean them up only if specified:
+    if remove_schedules:
+        deletions.append((delete_function_schedules, external_id))
+
+    with ThreadPoolExecutor(max_workers=len(deletions), thread_name_prefix="teardown") as executor:
+        futures = [executor.submit(bind_span(fn), client, *args) for fn, *args in deletions]
+    for future in futures:
+        future.result()  # Raises the first error, if any
+    if function is not None and await_deletion:
+        await_function_deletion(client, external_id)
+
+
+def delete_functions_by_prefix(client: CogniteClient, prefix: str, remove_schedules: bool) -> List[str]:
+    """Tears down all functions with external IDs starting with 'prefix' (e.g. of preview environments)"""
+    external_ids = {fn.external_id for fn in client.functions.list(external_id_prefix=prefix, limit=None)}
+    # The list filter is not exact in all API versions, so we double check the prefix:
+    external_ids = sorted(xid for xid in external_ids if xid is not None and xid.startswith(prefix))
+    logger.info(f"Found {len(external_ids)} function(s) with external ID prefix '{prefix}': {external_ids}")
+
+    def teardown(external_id: str) -> None:
+        delete_single_cognite_function(
+            client, external_id, remove_schedules, await_deletion=False, deleted_external_ids=set(external_ids)
+        )
 
-    err = f"Function {external_id} (ID: {function.id}) did not deploy within {precisedelta(wait_time_sec)}."
-    logger.error(err)
-    raise FunctionDeployTimeout(err)
+    with ThreadPoolExecutor(max_workers=TEARDOWN_WORKERS, thread_name_prefix="teardown") as executor:
+        list(executor.map(bind_span(teardown), external_ids))
+    return external_ids
 
 
-def delete_single_cognite_function(client: CogniteClient, external_id: str, remove_schedules: bool):
-    delete_function(client, external_id)
-    delete_function_file(client, get_file_name(external_id))
-    # Schedules live on when functions die, so we clean them up only if specified:
-    if remove_schedules:
-        delete_function_schedules(client, external_id)
-    time.sleep(3)
+def await_function_deletion(client: CogniteClient, external_id: str, wait_time_sec: float = DELETE_WAIT_TIME_SEC):
+    """Deletion is asynchronous, and until it is done, a new function with the same external ID can not be created"""
+    deadline, backoff = time.monotonic() + wait_time_sec, Backoff(initial_delay=0.5, max_delay=5, factor=2, jitter=0.5)
+    with span("await_deletion"):
+        while client.functions.retrieve(external_id=external_id) is not None:
+            if (remaining := deadline - time.monotonic()) <= 0:
+                logger.warning(f"Function '{external_id}' still exists {precisedelta(wait_time_sec)} after deletion")
+                return
+            time.sleep(backoff.next_delay(cap=remaining))
 
 
-def delete_function(client: CogniteClient, external_id: str):
-    function = client.functions.retrieve(external_id=external_id)
-    if function is not None:
-        logger.info(f"Found existing function '{external_id}'. Deleting...")
+def delete_function(client: CogniteClient, external_id: str) -> bool:
+    """Returns whether the function existed"""
+    logger.info(f"Deleting function '{external_id}'...")
+    try:
         client.functions.delete(external_id=external_id)
-        logger.info(f"- Delete of function '{external_id}' successful!")
-    else:
+    except CogniteNotFoundError:
         logger.info(f"Unable to delete function! External ID: '{external_id}' NOT found!")
+        return False
+    logger.info(f"- Delete of function '{external_id}' successful!")
+    return True
 
 
 def delete_function_file(client: CogniteClient, external_id: str):
-    file_meta = client.files.retrieve(external_id=external_id)
-    if file_meta is not None:
-        logger.info(f"Found existing file {external_id}. Deleting...")
-        try:
-            client.files.delete(external_id=external_id)
-            logger.info(f"- Delete of file '{external_id}' successful!")
-        except CogniteAPIError:
-            if file_meta.data_set_id is None:
-                raise  # File is not protected by dataset, so we re-raise immediately
-            logger.error(
-                f"Unable to delete file! It is governed by data set with ID: {file_meta.data_set_id}. Make sure "
-                "your deployment credentials have write/owner access (see README.md in function-action repo). "
-                "Trying to ignore and continue as this workflow will overwrite the file later."
-            )
+    _delete_file(client, external_id=external_id)
+
+
+def delete_unused_code_file(client: CogniteClient, file_id: int, deleted_external_ids: Set[str]):
+    """
+    Code files are shared between functions with the same code, so they are only deleted when no longer used.
+    Deployments mark the file they use (see 'touch_code_file'), and files marked within the grace period are
+    kept, as other runs (e.g. concurrent workflows) may be about to create functions from them.
+    """
+    users = [fn.external_id for fn in client.functions.list(file_id=file_id, limit=None)]
+    if users := [xid for xid in users if xid not in deleted_external_ids]:
+        logger.info(f"- Keeping file (ID: {file_id}), it is still used by function(s): {users}")
+        return
+    if (file_meta := client.files.retrieve(id=file_id)) is None:
+        return  # Already deleted
+    with _files_in_use_lock:
+        in_use = file_meta.external_id in _files_in_use
+    if in_use:
+        logger.info(f"- Keeping file (ID: {file_id}), it is used by a function being deployed")
+    elif time.time() - (file_meta.last_updated_time or 0) / 1000 < CODE_FILE_GRACE_PERIOD_SEC:
+        logger.info(
+            f"- Keeping file (ID: {file_id}), it was used less than {precisedelta(CODE_FILE_GRACE_PERIOD_SEC)} ago "
+            "and may be about to be used by a function deployed by another run"
+        )
     else:
-        logger.info(f"Unable to delete file! External ID: '{external_id}' NOT found!")
+        _delete_file(client, id=file_id)
+
+
+def _delete_file(client: CogniteClient, id: Optional[int] = None, external_id: Optional[str] = None):
+    # Deleted without looking it up first, the file is only retrieved if the deletion fails:
+    identifier = f"ID: {id}" if id is not None else f"External ID: '{external_id}'"
+    try:
+        client.files.delete(id=id, external_id=external_id)
+        logger.info(f"- Delete of file ({identifier}) successful!")
+    except CogniteNotFoundError:
+        logger.info(f"Unable to delete file! {identifier} NOT found!")
+    except CogniteAPIError:
+        file_meta = client.files.retrieve(id=id, external_id=external_id)
+        if file_meta is None or file_meta.data_set_id is None:
+            raise  # File is not protected by dataset, so we re-raise immediately
+        logger.error(
+            f"Unable to delete file! It is governed by data set with ID: {file_meta.data_set_id}. Make sure "
+            "your deployment credentials have write/owner access (see README.md in function-action repo). "
+            "Trying to ignore and continue as this workflow will overwrite the file later."
+        )
 
 
-def create_function_and_wait(client: CogniteClient, file_id: int, config: FunctionConfig) -> Function:
-    external_id, secrets = config.external_id, config.unpacked_secrets
+def create_function(
+    client: CogniteClient,
+    file_id: int,
+    config: FunctionConfig,
+    external_id: Optional[str] = None,
+    digest: Optional[str] = None,
+) -> Function:
+    external_id, secrets = external_id or config.external_id, config.unpacked_secrets
     logger.info(f"Trying to create function '{external_id}'...")
     if secrets:
         logger.info(f"- Adding {len(secrets)} extra secret(s) to the function '{external_id}'")
     else:
         logger.info(f"- No extra secrets added to function '{external_id}'")
-    client.functions.create(
-        name=external_id,
-        external_id=external_id,
-        file_id=file_id,
-        api_key=config.tenant.runtime_key,
-        function_path=config.function_file,
-        secrets=secrets,
-        owner=config.owner,
-        **config.get_memory_and_cpu(),  # Do not pass kwargs if mem/cpu is not set
-    )
+    with span("create"):
+        try:
+            return client.functions.create(
+                name=external_id,
+                external_id=external_id,
+                file_id=file_id,
+                api_key=config.tenant.runtime_key,
+                function_path=config.function_file,
+                secrets=secrets,
+                owner=config.owner,
+                description=get_function_description(digest),
+                **config.get_memory_and_cpu(),  # Do not pass kwargs if mem/cpu is not set
+            )
+        except CogniteAPIError as e:
+            if "Function externalId duplicated" not in e.message:
+                raise
+            # The function may have been registered by an earlier attempt, where only the response got lost:
+            existing = client.functions.retrieve(external_id=external_id)
+            if (
+                existing is None
+                or existing.file_id != file_id
+                or existing.description != get_function_description(digest)
+            ):
+                raise
+            logger.info(f"- Function '{external_id}' was already created (by an earlier attempt), re-attaching")
+            return existing
+
+
+def create_function_and_wait(
+    client: CogniteClient,
+    file_id: int,
+    config: FunctionConfig,
+    external_id: Optional[str] = None,
+    digest: Optional[str] = None,
+) -> Function:
+    external_id = external_id or config.external_id
+    create_function(client, file_id, config, external_id, digest)
     logging.info(f"Function '{external_id}' created. Waiting for deployment...")
     return await_function_deployment(client, external_id, DEPLOY_WAIT_TIME_SEC)
 
 
-def _write_files_to_zip_buffer(zf: ZipFile, directory: Path):
-    for dirpath, _, files in os.walk(directory):
-        zf.write(dirpath)
-        for f in files:
-            zf.write(Path(dirpath) / f)
-
-
-def upload_zipped_code_to_files(client, file_bytes: bytes, name: str, ds: DataSet) -> FileMetadata:
+def upload_zipped_code_to_files(
+    client,
+    content: BinaryIO,
+    name: str,
+    ds: DataSet,
+    metadata: Optional[Dict[str, str]] = None,
+    chunk_size: Optional[int] = None,
+    max_bytes_per_sec: Optional[float] = None,
+) -> FileMetadata:
     try:
-        return client.files.upload_bytes(
-            file_bytes,
-            name=name,
-            external_id=name,
-            data_set_id=ds.id,
-            overwrite=True,
-        )
+        file_meta = FileMetadata(name=name, external_id=name, data_set_id=ds.id, metadata=metadata)
+        if chunk_size is not None:
+            return upload_file_in_chunks(client, content, file_meta, chunk_size, max_bytes_per_sec)
+        # The content is streamed, not read into memory:
+        return upload_file(client, content, file_meta, max_bytes_per_sec)
     except CogniteAPIError as exc:
         if ds.id is None:
             # Error is not dataset related, so we immediately re-raise
@@ -169,47 +347,429 @@ def upload_zipped_code_to_files(client, file_bytes: bytes, name: str, ds: DataSe
         raise CogniteAPIError(err_msg, exc.code, exc.x_request_id) from None
 
 
-def zip_and_upload_folder(client: CogniteClient, config: FunctionConfig, name: str) -> int:
-    logger.info(f"Uploading code from '{config.function_folder}' to '{name}'")
-    buf = io.BytesIO()  # TempDir, who needs that?! :rocket:
-    with ZipFile(buf, mode="a") as zf:
-        with temporary_chdir(config.function_folder):
-            _write_files_to_zip_buffer(zf, directory=".")
+@contextmanager
+def zip_folder(config: FunctionConfig, spool_max_size: int = ZIP_SPOOL_MAX_SIZE) -> Iterator[BinaryIO]:
+    """
+    Yields a file handle to the zipped code, positioned at the start. Small archives are kept in
+    memory, while larger ones are rolled over to a temporary file, so memory usage stays flat.
+    With a cache directory, archives are reused when their inputs (contents and settings) are unchanged.
+    """
+    with ExitStack() as stack:
+        listed = _list_archive_files(config, stack)
+        all_files = [f for files, _ in listed for f in files]
+        compression, level = config.zip_compression, config.zip_compression_level
+        cache, cache_key = get_deploy_cache(config.cache_dir, config.cache_max_size_mb), None
+        file_hashes, previous = {}, None
+        if cache is not None:
+            # Unchanged files are copied (still compressed) from the previous archive of the function, if cached:
+            state = cache.get_json("manifests", _get_manifest_key(config)) or {}
+            file_hashes = hash_files(all_files, state.get("files"))
+            cache_key = hash_archive_inputs(all_files, compression, level, file_hashes)
+            if (cached := cache.get_path("archives", cache_key)) is not None:
+                logger.info(f"- Inputs unchanged, reusing cached archive '{cached}'")
+                _save_manifest(cache, config, cache_key, build_manifest(all_files, file_hashes))
+                with cached.open("rb") as archive:
+                    _check_archive(config, archive, listed)
+                    yield archive
+                return
+            if (previous := _open_previous_archive(cache, state, config)) is not None:
+                stack.enter_context(previous)
+
+        archive = stack.enter_context(SpooledTemporaryFile(max_size=spool_max_size, suffix=".zip"))
+        with span("zip") as zip_span, ZipFile(archive, mode="w") as zf:
+            with ArchiveWriter(zf, compression, level, previous=previous) as writer:
+                for files, source in listed:
+                    shared = source == "common"
+                    for path, arcname in files:
+                        writer.write(path, arcname, shared=shared, sha256=file_hashes.get(arcname.as_posix()))
+        if previous is not None:
+            logger.info(f"- Reused {writer.reused} of {len(all_files)} compressed file(s) from the previous archive")
+        zip_span.bytes = archive.tell()
+        archive.seek(0)
+        if cache is not None:
+            cache.put_stream("archives", cache_key, archive)
+            _save_manifest(cache, config, cache_key, build_manifest(all_files, file_hashes))
+        _check_archive(config, archive, listed)
+        yield archive
+
+
+def _list_archive_files(config: FunctionConfig, stack: ExitStack) -> List[Tuple[List[Tuple[Path, Path]], str]]:
+    """Files to archive with their archive names, by folder, with its source: 'function', 'common' or 'vendored'"""
+    # Note .parent for the common folder, we want the archive to contain the folder itself:
+    folders = [(config.function_folder, config.function_folder, "function")]
+    if config.common_folder is not None:
+        logger.info(f"- Added common directory: '{config.common_folder}' to the file/function")
+        folders.append((config.common_folder, config.common_folder.parent, "common"))
+    listed = []
+    for directory, root, source in folders:
+        files, excluded = list_folder(directory, root)
+        _log_excluded(excluded, directory)
+        listed.append((files, source))
+
+    if config.wheelhouse_dir is not None and config.function_file.endswith(".py"):
+        # Vendored packages are unpacked next to the function code, and replace its 'requirements.txt':
+        vendor_dir = Path(stack.enter_context(TemporaryDirectory(prefix="vendored-")))
+        taken = {arcname.as_posix() for files, _ in listed for _, arcname in files}
+        requirements = config.function_folder / "requirements.txt"
+        with span("vendor"):
+            plan = vendor_requirements(requirements, config.wheelhouse_dir, vendor_dir, taken)
+        if plan is not None:
+            function_files = [(path, arcname) for path, arcname in listed[0][0] if path != requirements]
+            listed[0] = function_files, "function"
+            listed.append((list_folder(vendor_dir, vendor_dir)[0], "vendored"))
+    return listed
+
+
+def _check_archive(
+    config: FunctionConfig, archive: BinaryIO, listed: List[Tuple[List[Tuple[Path, Path]], str]]
+) -> None:
+    # Local work only, so an oversized archive fails before anything is uploaded or deleted:
+    sources = {arcname.as_posix(): source for files, source in listed for _, arcname in files}
+    with span("analyze"):
+        report = analyze_archive(archive, sources, config.external_id)
+    log_archive_report(report)
+    record_archive_report(report)
+    max_size, max_unpacked_size = config.max_archive_size_mb, config.max_unpacked_size_mb
+    check_archive_budgets(
+        report,
+        max_size=max_size and int(max_size * 1024**2),
+        max_unpacked_size=max_unpacked_size and int(max_unpacked_size * 1024**2),
+        warn_only=config.archive_budget_action == "warn",
+    )
+
+
+def _get_manifest_key(config: FunctionConfig) -> str:
+    # One manifest (of the last archive built) per function:
+    return hashlib.sha256(config.external_id.encode()).hexdigest()
 
-        if config.common_folder is not None:
-            with temporary_chdir(config.common_folder.parent):  # Note .parent
-                logger.info(f"- Added common directory: '{config.common_folder}' to the file/function")
-                _write_files_to_zip_buffer(zf, directory=config.common_folder)
 
-    ds = DataSet(id=None)
+def _save_manifest(cache: DeployCache, config: FunctionConfig, archive_key: str, files: Dict[str, Dict]) -> None:
+    state = {
+        "archive": archive_key,
+        "compression": config.zip_compression,
+        "level": config.zip_compression_level,
+        "files": files,
+    }
+    cache.put_json("manifests", _get_manifest_key(config), state)
+
+
+def _open_previous_archive(cache: DeployCache, state: Dict, config: FunctionConfig) -> Optional[PreviousArchive]:
+    if not state.get("archive"):
+        return None
+    if (state["compression"], state["level"]) != (config.zip_compression, config.zip_compression_level):
+        return None  # The compressed bytes would differ
+    if (path := cache.get_path("archives", state["archive"])) is None:
+        return None  # Evicted
+    try:
+        return PreviousArchive(path, state["files"])
+    except (OSError, BadZipFile) as e:
+        logger.warning(f"Unable to open the previous archive '{path}', rebuilding from scratch: {e!r}")
+        return None
+
+
+def _log_excluded(excluded: ExcludedStats, folder: Path) -> None:
+    if excluded.files or excluded.directories:
+        logger.info(
+            f"- Excluded from '{folder}' by ignore patterns: {excluded.files} file(s) "
+            f"({naturalsize(excluded.bytes)}) and {excluded.directories} directory(-ies)"
+        )
+
+
+def compute_deploy_digest(code_digest: str, config: FunctionConfig) -> str:
+    """
+    Digest over everything that ends up in the deployed function: the zipped code (which is reproducible,
+    so it is simply the digest of the archive) and the config fields passed on function creation.
+    The digest is stored in the (readable) function description, so secrets and the runtime key are only
+    included as HMACs keyed with the deployment credentials, which can not be brute-forced without them.
+    """
+    digest = hashlib.sha256(code_digest.encode())
+    secrets = json.dumps(config.unpacked_secrets, sort_keys=True)
+    deploy_fields = {
+        "function_file": config.function_file,
+        "data_set_external_id": config.data_set_external_id,
+        "cpu": config.cpu,
+        "memory": config.memory,
+        "owner": config.owner,
+        "secrets": _keyed_hash(config, secrets),
+        "runtime_key": _keyed_hash(config, config.tenant.runtime_key),
+    }
+    digest.update(json.dumps(deploy_fields, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _keyed_hash(config: FunctionConfig, value: str) -> str:
+    return hmac.new(config.tenant.deployment_key.encode(), value.encode(), hashlib.sha256).hexdigest()
+
+
+def get_function_description(digest: Optional[str]) -> str:
+    return "" if digest is None else DESCRIPTION_DIGEST_PREFIX + digest
+
+
+def check_unchanged_function(
+    client: CogniteClient, function: Optional[Function], digest: str, known_file_id: Optional[int] = None
+) -> Optional[Function]:
+    """
+    Returns the (already retrieved) function if it is ready and deployed with the same digest, else None.
+    'known_file_id' is the code file this action last deployed with the same digest (from the deploy cache):
+    if the function still uses it, the file is known to exist and is not looked up.
+    """
+    if function is None or function.status != FunctionStatus.READY:
+        return None
+    if function.description != get_function_description(digest):
+        return None
+    if function.file_id is None:
+        return None
+    if function.file_id != known_file_id and client.files.retrieve(id=function.file_id) is None:
+        return None
+    return function
+
+
+def get_deployed_state(cache: Optional[DeployCache], external_id: str) -> Dict:
+    if cache is None:
+        return {}
+    return cache.get_json("deployed", _get_deployed_state_key(external_id)) or {}
+
+
+def record_deployed_state(cache: Optional[DeployCache], function: Function, digest: str) -> None:
+    if cache is not None:
+        state = {"digest": digest, "file_id": function.file_id, "function_id": function.id}
+        cache.put_json("deployed", _get_deployed_state_key(function.external_id), state)
+
+
+def _get_deployed_state_key(external_id: str) -> str:
+    return hashlib.sha256(external_id.encode()).hexdigest()
+
+
+def get_code_file_external_id(code_digest: str, data_set_external_id: Optional[str]) -> str:
+    # The data set is part of the key, as files with the same code may be governed by different data sets:
+    key = hashlib.sha256(f"{code_digest}:{data_set_external_id or ''}".encode()).hexdigest()
+    return f"{CODE_FILE_PREFIX}{key}.zip"
+
+
+def is_uploaded_code_file(file_meta: Optional[FileMetadata], code_digest: str, size: int) -> bool:
+    # Files without a recorded size (uploaded by earlier versions, which could store truncated files) are replaced:
+    metadata = (file_meta.metadata or {}) if file_meta is not None else {}
+    return (
+        file_meta is not None
+        and file_meta.uploaded
+        and metadata.get(DIGEST_METADATA_KEY) == code_digest
+        and metadata.get(SIZE_METADATA_KEY) == str(size)
+    )
+
+
+def touch_code_file(client: CogniteClient, file_id: int) -> Optional[FileMetadata]:
+    """
+    Marks the code file as used (which bumps its last updated time), so that teardowns of other runs keep it until
+    our function is created (see 'delete_unused_code_file'). Returns None if it has been deleted in the meantime.
+    """
+    update = FileMetadataUpdate(id=file_id).metadata.add({USED_AT_METADATA_KEY: str(int(time.time() * 1000))})
+    try:
+        return client.files.update(update)
+    except CogniteNotFoundError:
+        return None
+
+
+def find_uploaded_code_file(client: CogniteClient, name: str, code_digest: str, size: int) -> Optional[FileMetadata]:
+    """The code file 'name', if it holds the zipped code (digest and size), marked as used (see 'touch_code_file')"""
+    file_meta = client.files.retrieve(external_id=name)
+    if not is_uploaded_code_file(file_meta, code_digest, size):
+        return None
+    if (file_meta := touch_code_file(client, file_meta.id)) is None:
+        return None  # Deleted in the meantime
+    return file_meta if is_uploaded_code_file(file_meta, code_digest, size) else None
+
+
+def get_or_upload_code_file(
+    client: CogniteClient,
+    config: FunctionConfig,
+    name: str,
+    archive: BinaryIO,
+    code_digest: str,
+    ds: Optional[DataSet] = None,
+) -> int:
+    """
+    Returns the ID of the code file 'name', uploading the archive unless already uploaded (it is looked up again, as
+    the caller's lookup may be outdated). Functions with the same code deployed concurrently (e.g. in a batch) share
+    a single upload: the others wait for it, instead of overwriting the file while a function may be created from it.
+    """
+    with _code_file_uploads_lock:
+        if uploading := name in _code_file_uploads:
+            future = _code_file_uploads[name]
+        else:
+            future = _code_file_uploads[name] = Future()
+    if uploading:
+        logger.info(f"- Code file '{name}' is being uploaded by another deployment, waiting for it...")
+        return future.result()
+    try:
+        size = archive.seek(0, os.SEEK_END)
+        with span("file_lookup"):
+            file_meta = retry_phase("file_lookup", find_uploaded_code_file, client, name, code_digest, size)
+        if file_meta is not None:
+            logger.info(f"Code from '{config.function_folder}' was just uploaded to '{name}', skipping upload!")
+            file_id = file_meta.id
+        else:
+            file_id = retry_phase("upload", upload_folder_archive, client, config, name, archive, code_digest, ds)
+        future.set_result(file_id)
+        return file_id
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _code_file_uploads_lock:
+            del _code_file_uploads[name]
+
+
+def upload_folder_archive(
+    client: CogniteClient,
+    config: FunctionConfig,
+    name: str,
+    archive: BinaryIO,
+    digest: str,
+    ds: Optional[DataSet] = None,
+) -> int:
+    """'ds' is the data set governing the file, if already retrieved"""
+    logger.info(f"Uploading code from '{config.function_folder}' to '{name}'")
+    if ds is None:
+        ds = DataSet(id=None)
     if config.data_set_external_id is not None:
-        ds = retrieve_dataset(client, config.data_set_external_id)
+        if ds.id is None:
+            with span("dataset_lookup"):
+                ds = retrieve_dataset(client, config.data_set_external_id)
         logger.info(
             f"- Using dataset '{ds.external_id}' to govern the file (has write protection: {ds.write_protected})."
         )
     else:
         logger.info("- No dataset will be used to govern the file!")
 
-    file_meta = upload_zipped_code_to_files(client, buf.getvalue(), name, ds)
+    with span("upload") as upload_span:
+        upload_span.bytes = archive.seek(0, os.SEEK_END)
+        archive.seek(0)
+        file_meta = upload_zipped_code_to_files(
+            client,
+            archive,
+            name,
+            ds,
+            metadata={DIGEST_METADATA_KEY: digest, SIZE_METADATA_KEY: str(upload_span.bytes)},
+            chunk_size=config.upload_chunk_size_mb and config.upload_chunk_size_mb * 1024**2,
+            max_bytes_per_sec=config.upload_max_mb_per_sec and config.upload_max_mb_per_sec * 1024**2,
+        )
     if file_meta.id is not None:
         logger.info(f"- File uploaded successfully ({name})!")
         return file_meta.id
     raise FunctionDeployError(f"Failed to upload file ({name}) to CDF Files")
 
 
-# Note: Do NOT catch CogniteNotFoundError (used in data set check, if it fails, it will always fail)
-@retry(exceptions=(IOError, FunctionDeployError), tries=5, delay=2, jitter=2)
-def upload_and_create_function(client: CogniteClient, config: FunctionConfig) -> Function:
-    delete_single_cognite_function(client, config.external_id, config.remove_schedules)
-    zip_file_name = get_file_name(config.external_id)  # Also file external ID
-    try:
-        file_id = zip_and_upload_folder(client, config, zip_file_name)
-        return create_function_and_wait(client=client, file_id=file_id, config=config)
-    except CogniteAPIError as e:
-        if "Function externalId duplicated" in e.message:
-            # Function was registered, but an unknown error occurred. Trigger retry:
-            raise FunctionDeployError(e.message) from None
-        raise  # We don't want to trigger retry for unknown problems
+def upload_and_create_function(
+    client: CogniteClient,
+    config: FunctionConfig,
+    external_id: Optional[str] = None,
+    live_external_id: Optional[str] = None,
+    checks: Optional[Future] = None,
+) -> Function:
+    """
+    Deploys the function under 'external_id' (defaults to the configured one). Unless forced, deployment is
+    skipped if the live function, which defaults to the one being replaced, is unchanged.
+
+    Each phase is retried on its own on transient errors, so that a retry resumes from the failed phase: the
+    archive is built once, an uploaded file is reused, and a function that is already registered is awaited
+    (again) instead of being deleted and re-created.
+
+    Network work overlaps local work where there is no data dependency: the live function and the data set are
+    looked up while the archive is built, and the old function is torn down while the code is uploaded. The
+    'checks' (run concurrently by the caller, if given) are awaited once the archive is built, so that failing
+    checks, like a failing build of the archive, abort the deployment before anything is uploaded or deleted.
+    """
+    external_id = external_id or config.external_id
+    live_external_id = live_external_id or external_id
+    cache = get_deploy_cache(config.cache_dir, config.cache_max_size_mb)
+    # Reservations are released only after all tasks of the pool are done:
+    with ExitStack() as reservations, ThreadPoolExecutor(max_workers=PIPELINE_WORKERS) as pool:
+        live = dataset = None
+        if not config.force_redeploy:
+            live = pool.submit(
+                bind_span(_run_phase), "live_lookup", client.functions.retrieve, external_id=live_external_id
+            )
+        if config.data_set_external_id is not None:
+            dataset = pool.submit(
+                bind_span(_run_phase), "dataset_lookup", retrieve_dataset, client, config.data_set_external_id
+            )
+
+        with zip_folder(config) as archive:
+            with span("digest"):
+                archive_size = archive.seek(0, os.SEEK_END)
+                code_digest = hash_archive(archive)
+                digest = compute_deploy_digest(code_digest, config)
+            if checks is not None:
+                checks.result()
+            if live is not None:
+                state = get_deployed_state(cache, live_external_id)
+                known_file_id = state.get("file_id") if state.get("digest") == digest else None
+                with span("unchanged_check"):
+                    function = retry_phase(
+                        "unchanged_check", check_unchanged_function, client, live.result(), digest, known_file_id
+                    )
+                if function is not None:
+                    logger.info(
+                        f"Function '{live_external_id}' is unchanged (digest: {digest[:12]}), skipping deployment!"
+                    )
+                    record_deployed_state(cache, function, digest)
+                    return function
+
+            # Code files are content-addressed (the external ID is derived from the digest of the zipped code), so
+            # functions with the same code, e.g. sharing a large common folder, reuse the file instead of uploading:
+            name = get_code_file_external_id(code_digest, config.data_set_external_id)
+            # The old function may use this file (its ID is kept when overwritten), so it is not deleted by teardowns:
+            reservations.enter_context(reserve_file(name))
+            # Lookups that may fail (e.g. a missing data set or capability) are done before anything is deleted:
+            ds = dataset.result() if dataset is not None else None
+            with span("file_lookup"):
+                file_meta = retry_phase("file_lookup", find_uploaded_code_file, client, name, code_digest, archive_size)
+
+            # Schedules live on when functions die, and are reconciled after deployment:
+            teardown = pool.submit(
+                bind_span(retry_phase),
+                "teardown",
+                delete_single_cognite_function,
+                client,
+                external_id,
+                remove_schedules=False,
+            )
+            if file_meta is not None:
+                logger.info(f"Code from '{config.function_folder}' already uploaded to '{name}', skipping upload!")
+                file_id = file_meta.id
+            else:
+                file_id = get_or_upload_code_file(client, config, name, archive, code_digest, ds)
+            teardown.result()
+
+        deadline = time.monotonic() + DEPLOY_WAIT_TIME_SEC
+        for build_attempt in range(1, MAX_BUILD_ATTEMPTS + 1):
+            retry_phase("create", create_function, client, file_id, config, external_id, digest)
+            try:
+                # If polling fails, we re-attach to the deployment in progress (until the deadline):
+                function = retry_phase("await_deployment", _await_until, client, external_id, deadline)
+                record_deployed_state(cache, function, digest)
+                return function
+            except FunctionDeployTimeout:
+                raise  # No time left for another build
+            except FunctionDeployError:
+                if build_attempt == MAX_BUILD_ATTEMPTS:
+                    raise
+                logger.warning(f"Build of '{external_id}' failed, deleting and re-creating it (same file)...")
+                retry_phase("teardown", delete_function, client, external_id)
+                retry_phase("teardown", await_function_deletion, client, external_id)
+
+
+def _run_phase(phase: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    with span(phase):
+        return retry_phase(phase, fn, *args, **kwargs)
+
+
+def _await_until(client: CogniteClient, external_id: str, deadline: float) -> Function:
+    if (wait_time_sec := deadline - time.monotonic()) <= 0:
+        raise FunctionDeployTimeout(
+            f"Function {external_id} did not deploy within {precisedelta(DEPLOY_WAIT_TIME_SEC)}."
+        )
+    return await_function_deployment(client, external_id, wait_time_sec)
 
 
 def get_file_name(function_name: str) -> str:
@@ -1,22 +1,200 @@
+import atexit
 import logging
-from typing import Dict
+import re
+import threading
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from timing import current_root_span
+
+GROUP_START, GROUP_END = "start", "end"
+REPEAT_BURST = 5  # Similar lines (same logger, equal up to numbers) written per window, before they are suppressed
+REPEAT_WINDOW_SEC = 60
+# Pass as 'extra' to opt a line in to suppression of its repeats, e.g. progress or status lines logged in a loop:
+RATE_LIMITED = {"github_rate_limited": True}
+NUMBERS_RE = re.compile(r"\d+(\.\d+)?")
+
+group_logger = logging.getLogger("github.group")
 
 
 class GitHubLogHandler(logging.StreamHandler):
+    """
+    Writes records as GitHub workflow commands (warnings and errors become annotations). Records are folded
+    into '::group::' blocks by group (see 'log_group'). GitHub groups can not be nested nor interleaved, so one
+    group is written as it goes, while the lines of groups logging concurrently (e.g. functions deployed in
+    a batch) are held back and written as a whole once the live group has ended. Similar lines repeated in
+    quick succession are suppressed for records logged with 'RATE_LIMITED' (like progress messages), and a
+    summary is written when closed.
+    """
+
+    # https://docs.github.com/en/actions/reference/workflow-commands-for-github-actions
+    LEVEL_COMMANDS: Dict[int, str] = {
+        logging.CRITICAL: "error",
+        logging.ERROR: "error",
+        logging.WARNING: "warning",
+        logging.DEBUG: "debug",
+    }
+
     def __init__(self, stream=None):
         super(GitHubLogHandler, self).__init__(stream=stream)
+        self._live: Optional[str] = None  # The group being written as it goes
+        self._held: Dict[str, List[str]] = {}  # Lines of other open groups, in order of start
+        self._done: List[Tuple[str, List[str]]] = []  # Groups that ended while another one was live
+        self._ungrouped: List[str] = []  # Lines without group, logged while a group was live
+        self._repeats: Dict[Tuple[str, str], Tuple[float, int]] = {}  # Window start and count, by similar line
+        self._counts = {"warnings": 0, "errors": 0, "suppressed": 0}
+        self._closed = False
 
-    # https://docs.github.com/en/free-pro-team@latest/actions/reference/workflow-commands-for-github-actions#setting-a-debug-message
     def format(self, record):
         message = super(GitHubLogHandler, self).format(record)
-        level_map: Dict = {
-            logging.CRITICAL: "error",
-            logging.ERROR: "error",
-            logging.WARNING: "warning",
-            logging.INFO: "warning",
-            logging.DEBUG: "debug",
-            logging.NOTSET: "warning",
-        }
+        if (command := self.LEVEL_COMMANDS.get(record.levelno)) is None:
+            return f"{record.name}: {message}"
+        return f"::{command} file={record.filename},line={record.lineno}::{record.name}: {message}"
+
+    def emit(self, record):
+        try:
+            group = getattr(record, "github_group", None)
+            event = getattr(record, "github_group_event", None)
+            if event == GROUP_START:
+                self._start_group(group)
+            elif event == GROUP_END:
+                self._end_group(group)
+            elif self._allow(record):
+                line = self.format(record)
+                if group in self._held:
+                    self._held[group].append(line)
+                elif self._live is not None and group != self._live:
+                    self._ungrouped.append(line)
+                else:
+                    self._write(line)
+        except Exception:
+            self.handleError(record)
+
+    def _allow(self, record) -> bool:
+        if record.levelno >= logging.ERROR:
+            self._counts["errors"] += 1
+            return True
+        if not getattr(record, "github_rate_limited", False):
+            self._counts["warnings"] += record.levelno >= logging.WARNING
+            return True
+        key = record.name, NUMBERS_RE.sub("#", record.getMessage())
+        window_start, count = self._repeats.get(key, (record.created, 0))
+        if record.created - window_start >= REPEAT_WINDOW_SEC:
+            window_start, count = record.created, 0
+        self._repeats[key] = window_start, count + 1
+        if count >= REPEAT_BURST:
+            self._counts["suppressed"] += 1
+            return False
+        self._counts["warnings"] += record.levelno >= logging.WARNING
+        return True
+
+    def _start_group(self, title: str) -> None:
+        if self._live is None:
+            self._live = title
+            self._write(f"::group::{title}")
+        else:
+            self._held[title] = []
+
+    def _end_group(self, title: str) -> None:
+        if title != self._live:
+            if (lines := self._held.pop(title, None)) is not None:
+                self._done.append((title, lines))
+            return
+        self._write("::endgroup::")
+        self._live = None
+        for title, lines in self._done:
+            self._write_group(title, lines)
+        self._done.clear()
+        lines, self._ungrouped = self._ungrouped, []
+        self._write(*lines)
+        if self._held:
+            # The group that started first goes live, with the lines it logged so far:
+            self._live = next(iter(self._held))
+            self._write(f"::group::{self._live}", *self._held.pop(self._live))
+
+    def _write_group(self, title: str, lines: List[str]) -> None:
+        self._write(f"::group::{title}", *lines, "::endgroup::")
+
+    def _write(self, *lines: str) -> None:
+        if lines:
+            self.stream.write("".join(line + self.terminator for line in lines))
+            self.flush()
+
+    def close(self):
+        with self.lock:
+            if not self._closed:
+                self._closed = True
+                # Groups that never ended (e.g. on a crash) are written as well:
+                if self._live is not None:
+                    self._end_group(self._live)
+                while self._held:
+                    self._end_group(self._live)
+                self._write(self.summary())
+        super(GitHubLogHandler, self).close()
+
+    def summary(self) -> str:
+        counts = self._counts
         return (
-            f"::{level_map.get(record.levelno)} file={record.filename},line={record.levelno}::{record.name}: {message}"
+            f"Log summary: {counts['warnings']} warning(s), {counts['errors']} error(s), "
+            f"{counts['suppressed']} repeated line(s) suppressed"
         )
+
+
+class _GroupTaggingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Tagged in the logging thread, as spans (and thus groups) are per thread:
+        if not hasattr(record, "github_group"):
+            record.github_group = current_root_span()
+        return super().prepare(record)
+
+
+@contextmanager
+def log_group(title: str) -> Iterator[None]:
+    """
+    Folds the records logged within the root span named 'title' (see 'timing.span') into a group. Use it around
+    that span, as records are grouped by the root span of the thread logging them (worker threads included,
+    see 'timing.bind_span').
+    """
+    group_logger.info(title, extra={"github_group": title, "github_group_event": GROUP_START})
+    try:
+        yield
+    finally:
+        group_logger.info(title, extra={"github_group": title, "github_group_event": GROUP_END})
+
+
+_install_lock = threading.Lock()
+_installed: Optional[Tuple[logging.Logger, QueueHandler, QueueListener]] = None
+
+
+def install_github_log_handler(logger: logging.Logger = None, stream=None) -> GitHubLogHandler:
+    """
+    Adds a handler to the (root) logger that only puts records on a queue, while a background thread formats
+    and writes them, so that deploying threads never wait on log output. The queue is drained (and the summary
+    written) on exit, or by 'stop_github_log_handler'.
+    """
+    global _installed
+    logger = logger or logging.getLogger()
+    handler = GitHubLogHandler(stream=stream)
+    queue = SimpleQueue()
+    with _install_lock:
+        if _installed is not None:
+            raise RuntimeError("GitHub log handler is already installed")
+        _installed = logger, _GroupTaggingQueueHandler(queue), QueueListener(queue, handler)
+        _installed[2].start()
+        logger.addHandler(_installed[1])
+    atexit.register(stop_github_log_handler)
+    return handler
+
+
+def stop_github_log_handler() -> None:
+    global _installed
+    with _install_lock:
+        installed, _installed = _installed, None
+    if installed is not None:
+        logger, queue_handler, listener = installed
+        logger.removeHandler(queue_handler)
+        listener.stop()  # Writes what is left on the queue
+        for handler in listener.handlers:
+            handler.close()
@@ -0,0 +1,118 @@
+import logging
+import os
+import re
+from dataclasses import dataclass
+from itertools import groupby
+from pathlib import Path
+from typing import Iterable, Iterator, List, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+IGNORE_FILES = (".gitignore", ".functionignore")  # Patterns in the latter take precedence
+DEFAULT_IGNORE_PATTERNS = (
+    ".git/",
+    ".DS_Store",
+    "__pycache__/",
+    "*.py[cod]",
+    ".pytest_cache/",
+    ".mypy_cache/",
+    ".venv/",
+)
+
+
+@dataclass
+class ExcludedStats:
+    files: int = 0
+    bytes: int = 0
+    directories: int = 0  # Pruned, so their contents are not counted
+
+
+def _translate_glob(glob: str) -> str:
+    regex, i = "", 0
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            regex, i = regex + "(?:.*/)?", i + 3
+        elif glob.startswith("**", i):
+            regex, i = regex + ".*", i + 2
+        elif glob[i] == "*":
+            regex, i = regex + "[^/]*", i + 1
+        elif glob[i] == "?":
+            regex, i = regex + "[^/]", i + 1
+        elif glob[i] == "[" and (end := glob.find("]", i + 2)) != -1:
+            char_class = glob[i + 1 : end].replace("\\", "\\\\")
+            regex, i = regex + "[" + ("^" + char_class[1:] if char_class[0] == "!" else char_class) + "]", end + 1
+        elif glob[i] == "\\" and i + 1 < len(glob):
+            regex, i = regex + re.escape(glob[i + 1]), i + 2
+        else:
+            regex, i = regex + re.escape(glob[i]), i + 1
+    return regex
+
+
+def _parse_pattern(line: str) -> Tuple[str, bool, bool]:
+    """Returns the regex, whether it is a negation and whether it only matches directories (gitignore syntax)"""
+    negate = line.startswith("!")
+    pattern = line[1:] if negate else line
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    # Patterns with a slash (not trailing) are relative to the folder root, else they match at any level:
+    anchored = "/" in pattern
+    regex = _translate_glob(pattern.lstrip("/"))
+    return ("" if anchored else "(?:.*/)?") + regex, negate, dir_only
+
+
+class IgnoreMatcher:
+    """
+    Matches relative (posix) paths against gitignore-style patterns. Consecutive patterns of the same kind are
+    compiled into a single regex, and as in gitignore, the last matching pattern decides.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        parsed = []
+        for line in patterns:
+            line = line.rstrip("\n").rstrip(" ")
+            if line and not line.startswith("#"):
+                parsed.append(_parse_pattern(line[1:] if line.startswith("\\#") else line))
+
+        self._rules: List[Tuple[Pattern, bool, bool]] = [
+            (re.compile(r"\A(?:" + "|".join(regex for regex, *_ in group) + r")\Z"), negate, dir_only)
+            for (negate, dir_only), group in groupby(parsed, key=lambda p: p[1:])
+        ]
+
+    @classmethod
+    def from_folder(cls, folder: Path) -> "IgnoreMatcher":
+        patterns = list(DEFAULT_IGNORE_PATTERNS)
+        for name in IGNORE_FILES:
+            if (path := folder / name).is_file():
+                logger.info(f"- Using ignore patterns from '{path}'")
+                patterns.extend(path.read_text().splitlines())
+        return cls(patterns)
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        for regex, negate, dir_only in reversed(self._rules):
+            if (is_dir or not dir_only) and regex.match(rel_path):
+                return not negate
+        return False
+
+
+def walk_included(directory: Path, matcher: IgnoreMatcher, stats: ExcludedStats) -> Iterator[Tuple[Path, List[str]]]:
+    """
+    Like os.walk (yielding directory and file names), but in sorted order, skipping ignored files, and
+    pruning ignored directories before descending into them.
+    """
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirpath = Path(dirpath)
+        rel_dir = dirpath.relative_to(directory).as_posix()
+        prefix = "" if rel_dir == "." else rel_dir + "/"
+
+        kept_dirs = [d for d in dirnames if not matcher.is_ignored(prefix + d, is_dir=True)]
+        stats.directories += len(dirnames) - len(kept_dirs)
+        dirnames[:] = sorted(kept_dirs)  # Modifying in-place prunes the walk (and sorting makes it deterministic)
+
+        files = []
+        for f in sorted(filenames):
+            if matcher.is_ignored(prefix + f, is_dir=False):
+                stats.files += 1
+                stats.bytes += (dirpath / f).lstat().st_size
+            else:
+                files.append(f)
+        yield dirpath, files
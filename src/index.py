@@ -1,36 +1,110 @@
+import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Set
 
 import yaml
 
-from checks import run_checks
+from archive_report import write_archive_reports
+from cache import evict_deploy_caches
 from config import FunctionConfig, TenantConfig, create_experimental_cognite_client
-from function import delete_single_cognite_function, upload_and_create_function
-from github_log_handler import GitHubLogHandler
-from schedule import deploy_schedules
+from github_log_handler import install_github_log_handler, log_group, stop_github_log_handler
+from timing import bind_span, get_report, install_counters, span, summarize, summary_lines, write_report
 
-# Configure logging:
+if TYPE_CHECKING:
+    from cognite.experimental import CogniteClient
+    from cognite.experimental.data_classes import Function
+
+# Note: The modules doing the actual work (and thus the SDKs) are imported where they are first needed, so that
+# a run only pays for what it uses, and invalid inputs fail before the (slow) SDK imports. See benchmarks/startup.py
+
+# Configure logging (the handler is installed when run as a script):
 root_logger = logging.getLogger()
 root_logger.setLevel(logging.INFO)
-root_logger.addHandler(GitHubLogHandler())
 
 logger = logging.getLogger(__name__)
 
 
-def main(config: FunctionConfig) -> None:
-    client = create_experimental_cognite_client(config.tenant)
+# Inputs that configure the action run itself, and not the function(s) being deployed:
+RUN_PARAMS = {"manifest_file", "max_workers", "report_file", "archive_report_file"}
+
+
+def deploy_function(client: "CogniteClient", config: FunctionConfig) -> Optional["Function"]:
+    # Spans nest per thread, so each function deployed in a batch gets its own phases (and log group):
+    name = f"deploy:{config.external_id}"
+    with log_group(name), span(name):
+        return _deploy_function(client, config)
+
+
+def _deploy_function(client: "CogniteClient", config: FunctionConfig) -> Optional["Function"]:
+    from function import delete_functions_by_prefix, delete_single_cognite_function, upload_and_create_function
+
+    if config.remove_by_prefix:
+        # Delete all functions (with files and schedules) matching the name:
+        delete_functions_by_prefix(client, config.external_id, remove_schedules=True)
+        return None
+
+    if config.blue_green:
+        return deploy_function_blue_green(client, config)
+
     if config.remove_only:
         # Delete old function, file and schedules:
-        delete_single_cognite_function(client, config.external_id, remove_schedules=True)
-        return
+        delete_single_cognite_function(client, config.external_id, remove_schedules=True, await_deletion=False)
+        return None
 
-    # Run checks, then zip together and upload the code files, then create Function:
-    run_checks(config)
-    function = upload_and_create_function(client, config)
+    # The checks are local work, so they run while the code is zipped and remote lookups are in flight. They must
+    # pass before the code is uploaded and the function (re-)created:
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        checks = pool.submit(bind_span(run_function_checks), config)
+        function = upload_and_create_function(client, config, checks=checks)
     logger.info(f"Successfully created and deployed function {config.external_id} with id {function.id}")
+    deploy_function_schedules(client, config, function)
+    return function
+
+
+def deploy_function_blue_green(client: "CogniteClient", config: FunctionConfig) -> Optional["Function"]:
+    from blue_green import deploy_to_idle_slot, find_live_function, retire_functions, retrieve_deployed_functions
+    from schedule import copy_schedules
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # The checks are local work, so they run while the deployed versions are looked up:
+        checks = None if config.remove_only else pool.submit(bind_span(run_function_checks), config)
+        deployed = retrieve_deployed_functions(client, config.external_id)
+    if config.remove_only:
+        # Delete all versions (with file and schedules):
+        retire_functions(client, deployed)
+        return None
+
+    checks.result()
+    live = find_live_function(deployed)
+    function = deploy_to_idle_slot(client, config, live)
+    logger.info(f"Successfully created and deployed function {function.external_id} with id {function.id}")
+    if live is not None and not config.remove_schedules and function.external_id != live.external_id:
+        # Existing schedules are kept as-is, so we move them over to the new version:
+        copy_schedules(client, live.external_id, function)
+    else:
+        deploy_function_schedules(client, config, function)
+    # The new version is ready and scheduled, only now do we take down the old one(s):
+    retire_functions(client, deployed, keep=function)
+    return function
+
+
+def run_function_checks(config: FunctionConfig) -> None:
+    from checks import run_checks
+
+    with span("checks"):
+        run_checks(config)
+
+
+def deploy_function_schedules(client: "CogniteClient", config: FunctionConfig, function: "Function") -> None:
+    from schedule import reconcile_schedules
+
     if config.remove_schedules:
-        # Normal operation is to always remove all attached schedules and then re-create them:
-        deploy_schedules(client, function, config.schedules)
+        # Normal operation is to make the attached schedules match the schedule file (only changes are applied):
+        reconcile_schedules(client, function, config.schedules)
     else:
         # If we did not remove existing schedules, we should also not add new ones. Warn if user gave any:
         if n_schedules := len(config.schedules):
@@ -39,30 +113,86 @@ def main(config: FunctionConfig) -> None:
                 "Parameter 'remove_schedules=False' was passed, so this is to avoid creating duplicate schedules, "
                 "as they do not have an unique identifier."
             )
+
+
+def main(config: FunctionConfig) -> None:
+    client = create_experimental_cognite_client(config.tenant)
+    if (function := deploy_function(client, config)) is None:
+        return
     # Return output parameter (GitHub magic syntax):
     print(f"::set-output name=function_external_id::{function.external_id}")
 
 
+def main_batch(configs: List[FunctionConfig], max_workers: int) -> None:
+    from batch import deploy_batch, log_batch_summary
+
+    # All configs share the same (already validated) tenant:
+    client = create_experimental_cognite_client(configs[0].tenant)
+    results = deploy_batch(client, configs, deploy_function, max_workers)
+
+    deployed = [res.external_id for res in results if res.function_id is not None]
+    print(f"::set-output name=function_external_ids::{json.dumps(deployed)}")
+    print(f"::set-output name=deploy_results::{json.dumps([asdict(res) for res in results])}")
+    log_batch_summary(results)
+
+
 def get_param_value(param):
     # GitHub action passes all missing arguments as an empty string:
     return os.getenv(f"INPUT_{param.upper()}") or None
 
 
-def setup_config() -> FunctionConfig:
-    # Use 'action.yaml' as the single source of truth for param names:
-    with open("/app/action.yaml") as f:
-        inputs = set(yaml.safe_load(f)["inputs"])
+def get_action_inputs() -> Set[str]:
+    # Use 'action.yaml' (next to this file, i.e. in '/app') as the single source of truth for param names:
+    with open(Path(__file__).with_name("action.yaml")) as f:
+        return set(yaml.safe_load(f)["inputs"]).difference(RUN_PARAMS)
+
 
-    tenant_params = [inp for inp in inputs if inp.startswith("cdf")]
-    function_params = inputs.difference(tenant_params)
+def setup_tenant_config() -> TenantConfig:
+    return TenantConfig(**{p: get_param_value(p) for p in get_action_inputs() if p.startswith("cdf")})
 
+
+def setup_config() -> FunctionConfig:
+    function_params = {inp for inp in get_action_inputs() if not inp.startswith("cdf")}
     return FunctionConfig(
-        tenant=TenantConfig(**{p: get_param_value(p) for p in tenant_params}),
+        tenant=setup_tenant_config(),
         **{p: get_param_value(p) for p in function_params},
     )
 
 
+def setup_batch_configs(manifest_file: str) -> List[FunctionConfig]:
+    from batch import load_manifest
+
+    # Action inputs that are given, are used as defaults for all functions in the manifest:
+    function_params = {inp for inp in get_action_inputs() if not inp.startswith("cdf")}
+    defaults = {p: value for p in function_params if (value := get_param_value(p)) is not None}
+    return load_manifest(manifest_file, setup_tenant_config(), defaults)
+
+
+def report_timings(report_file: Optional[str]) -> None:
+    report = write_report(report_file) if report_file else get_report()
+    print(f"::set-output name=deploy_duration_sec::{report['total_duration']}")
+    print(f"::set-output name=deploy_timings::{json.dumps(summarize(report))}")
+    for line in summary_lines(report):
+        logger.info(f"Timings of {line}")
+
+
 if __name__ == "__main__":
     # Function Action, assemble!!
-    config = setup_config()
-    main(config)
+    install_github_log_handler()
+    install_counters()
+    try:
+        if manifest_file := get_param_value("manifest_file"):
+            with span("setup"):
+                configs = setup_batch_configs(manifest_file)
+            main_batch(configs, max_workers=int(get_param_value("max_workers") or 4))
+        else:
+            with span("setup"):
+                config = setup_config()
+            main(config)
+    finally:
+        # Also (or rather, especially) report the timings of failed runs:
+        report_timings(get_param_value("report_file"))
+        if archive_report_file := get_param_value("archive_report_file"):
+            write_archive_reports(archive_report_file)
+        evict_deploy_caches()
+        stop_github_log_handler()
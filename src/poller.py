@@ -0,0 +1,166 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+from weakref import WeakKeyDictionary
+
+from cognite.experimental import CogniteClient
+from cognite.experimental.data_classes import Function
+
+from github_log_handler import RATE_LIMITED
+from timing import bind_span, count_retry
+
+logger = logging.getLogger(__name__)
+
+POLL_INITIAL_DELAY_SEC = 2
+POLL_MAX_DELAY_SEC = 30
+POLL_BACKOFF_FACTOR = 1.5
+POLL_JITTER_SEC = 1
+
+
+class Backoff:
+    def __init__(
+        self,
+        initial_delay: float = POLL_INITIAL_DELAY_SEC,
+        max_delay: float = POLL_MAX_DELAY_SEC,
+        factor: float = POLL_BACKOFF_FACTOR,
+        jitter: float = POLL_JITTER_SEC,
+    ):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.reset()
+
+    def reset(self) -> None:
+        self._delay = self.initial_delay
+
+    def next_delay(self, cap: float = float("inf")) -> float:
+        """Returns the next (jittered) delay, capped by e.g. the time remaining until a deadline"""
+        delay = min(self._delay + random.uniform(0, self.jitter), self.max_delay)  # nosec
+        self._delay = min(self._delay * self.factor, self.max_delay)
+        return max(0.0, min(delay, cap))
+
+
+class FunctionStatusPoller:
+    """
+    Tracks the deployment status of any number of functions using a single batched request
+    per tick, from one background thread. Waiting threads are woken up as soon as the status
+    of their function is seen to be final (ready or failed).
+    """
+
+    def __init__(self, client: CogniteClient, backoff: Backoff = None, final_statuses=("Ready", "Failed")):
+        self._client = client
+        self._backoff = backoff or Backoff()
+        self._final_statuses = set(final_statuses)
+        self._cond = threading.Condition()
+        self._deadlines: Dict[str, float] = {}
+        self._last_status: Dict[str, str] = {}
+        self._results: Dict[str, Function] = {}
+        self._errors: Dict[str, Exception] = {}
+        self._log_status: Dict[str, Callable[..., None]] = {}  # Logs within the spans of the waiting thread
+        self._thread: Optional[threading.Thread] = None
+
+    def wait(self, external_id: str, wait_time_sec: float) -> Optional[Function]:
+        """Blocks until the function reaches a final status and returns it, or returns None on timeout"""
+        deadline = time.monotonic() + wait_time_sec
+        with self._cond:
+            # Drop any stale outcome from an earlier (timed out) wait for the same function:
+            self._results.pop(external_id, None)
+            self._errors.pop(external_id, None)
+            self._deadlines[external_id] = deadline
+            self._log_status[external_id] = bind_span(logger.info)
+            self._backoff.reset()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="function-status-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()  # Wake up the poller, so the new function is polled right away
+            try:
+                while external_id not in self._results and external_id not in self._errors:
+                    if (remaining := deadline - time.monotonic()) <= 0:
+                        return None
+                    self._cond.wait(timeout=remaining)
+                if external_id in self._errors:
+                    raise self._errors.pop(external_id)
+                return self._results.pop(external_id)
+            finally:
+                self._deadlines.pop(external_id, None)
+                self._last_status.pop(external_id, None)
+                self._log_status.pop(external_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._deadlines:
+                    self._thread = None
+                    return
+                external_ids = list(self._pending())
+                if not external_ids:
+                    # All waiters have their result (or timed out), but not necessarily picked it up yet:
+                    self._cond.wait(timeout=0.1)
+                    continue
+            try:
+                functions = self._client.functions.retrieve_multiple(external_ids=external_ids)
+            except Exception as e:
+                with self._cond:
+                    if not self._is_transient(e):
+                        self._errors.update((xid, e) for xid in external_ids if xid in self._deadlines)
+                        self._cond.notify_all()
+                        continue
+                    # Waiters keep waiting until their deadline, so one hiccup does not fail a whole batch:
+                    logger.warning(
+                        f"Polling the status of {len(external_ids)} function(s) failed: {e!r}. Retrying...",
+                        extra=RATE_LIMITED,
+                    )
+                    count_retry()
+                    if pending := self._pending():
+                        self._cond.wait(timeout=self._backoff.next_delay(cap=min(pending.values()) - time.monotonic()))
+                continue
+
+            with self._cond:
+                for function in functions:
+                    xid = function.external_id
+                    if xid not in self._deadlines:
+                        continue  # Waiting thread timed out
+                    if (old_status := self._last_status.get(xid)) != function.status:
+                        self._last_status[xid] = function.status
+                        self._log_status[xid](
+                            f"- Function '{xid}' status: {old_status or 'Unknown'} -> {function.status}",
+                            extra=RATE_LIMITED,
+                        )
+                        self._backoff.reset()
+                    if function.status in self._final_statuses:
+                        self._results[xid] = function
+                self._cond.notify_all()
+
+                # Functions registered during the request are polled right away, else we back off (a new
+                # waiter notifies us, which cuts the sleep short):
+                if (pending := self._pending()) and pending.keys() <= set(external_ids):
+                    self._cond.wait(timeout=self._backoff.next_delay(cap=min(pending.values()) - time.monotonic()))
+
+    @staticmethod
+    def _is_transient(exc: Exception) -> bool:
+        from retries import is_transient  # Not at the top, as 'retries' uses our 'Backoff'
+
+        return is_transient(exc)
+
+    def _pending(self) -> Dict[str, float]:
+        now = time.monotonic()
+        return {
+            xid: deadline
+            for xid, deadline in self._deadlines.items()
+            if deadline > now and xid not in self._results and xid not in self._errors
+        }
+
+
+_pollers: "WeakKeyDictionary[CogniteClient, FunctionStatusPoller]" = WeakKeyDictionary()
+_pollers_lock = threading.Lock()
+
+
+def get_status_poller(client: CogniteClient) -> FunctionStatusPoller:
+    """All threads using the same client share one poller, so their status checks are batched together"""
+    with _pollers_lock:
+        if (poller := _pollers.get(client)) is None:
+            poller = _pollers[client] = FunctionStatusPoller(client)
+        return poller
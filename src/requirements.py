@@ -0,0 +1,66 @@
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+COMMENT_RE = re.compile(r"(^|\s)#.*$")
+# Options given per requirement (e.g. '--hash=sha256:...'), after the requirement itself:
+REQUIREMENT_OPTIONS_RE = re.compile(r"\s+--?[A-Za-z].*$")
+REQUIREMENT_RE = re.compile(
+    r"^(?P<name>[A-Za-z0-9]([A-Za-z0-9._-]*[A-Za-z0-9])?)\s*(?P<extras>\[[\w\s,.-]*\])?\s*"
+    r"(@\s*(?P<url>\S+)\s*|\(?(?P<spec>[^;()@]*)\)?)\s*(;(?P<marker>.*))?$"
+)
+SPECIFIER_RE = re.compile(r"^\s*(===|==|~=|!=|<=|>=|<|>)\s*([\w.*+!-]+)\s*$")
+# Requirements given as a URL (also VCS, like 'git+https://...') or path, e.g. to a wheel or project directory:
+URL_OR_PATH_RE = re.compile(r"^([a-z][a-z0-9+.-]*://|\.{0,2}/|[^;\s]*\.(whl|zip|tar\.gz|tgz)(\s|;|$))", re.IGNORECASE)
+
+
+def normalize_name(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+@dataclass
+class Requirement:
+    line: str  # As given, with any per-requirement options
+    name: str  # Normalized
+    specifiers: List[Tuple[str, str]] = field(default_factory=list)
+    extras: bool = False
+    url: bool = False
+    marker: Optional[str] = None
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["Requirement"]:
+        """Parses a named requirement (see PEP 508), returning None if it is invalid"""
+        line = line.strip()
+        if (match := REQUIREMENT_RE.match(REQUIREMENT_OPTIONS_RE.sub("", line))) is None:
+            return None
+        specifiers = []
+        for spec in filter(None, (s.strip() for s in (match["spec"] or "").split(","))):
+            if (spec_match := SPECIFIER_RE.match(spec)) is None:
+                return None
+            specifiers.append((spec_match[1], spec_match[2]))
+        marker = match["marker"].strip() if match["marker"] else None
+        return cls(line, normalize_name(match["name"]), specifiers, bool(match["extras"]), bool(match["url"]), marker)
+
+
+def is_option_or_url(line: str) -> bool:
+    """Pip options (e.g. '--extra-index-url ...') and unnamed requirements (URLs and paths) are not parsed"""
+    return line.startswith("-") or URL_OR_PATH_RE.match(line) is not None
+
+
+def read_requirement_lines(path: Path) -> Iterator[Tuple[int, str]]:
+    """
+    Logical lines of a requirements file with their (first) line number, like pip reads them: lines ending with
+    a backslash are joined with the next, then comments and empty lines are dropped.
+    """
+    lineno, parts = None, []
+    for i, line in enumerate(path.read_text().splitlines(), start=1):
+        lineno = lineno or i
+        if line.endswith("\\"):
+            parts.append(line[:-1])
+            continue
+        if joined := COMMENT_RE.sub("", " ".join(parts + [line])).strip():
+            yield lineno, joined
+        lineno, parts = None, []
+    if parts and (joined := COMMENT_RE.sub("", " ".join(parts)).strip()):
+        yield lineno, joined
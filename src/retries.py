@@ -0,0 +1,78 @@
+import logging
+import socket
+import time
+from typing import Callable, TypeVar
+
+import requests
+import urllib3
+from cognite.client.exceptions import CogniteAPIError, CogniteConnectionError, CogniteReadTimeout
+
+from poller import Backoff
+from timing import count_retry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PHASE_MAX_ATTEMPTS = 5
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+# The SDK does not expose the 'Retry-After' header (it is honoured by the SDK itself for idempotent requests),
+# so when rate limited, we wait at least this long:
+RATE_LIMITED_MIN_DELAY_SEC = 10
+
+
+# Network errors only: other I/O errors, like a missing file or a permission error, will not go away by retrying
+NETWORK_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    socket.timeout,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.TimeoutError,
+    urllib3.exceptions.NewConnectionError,
+    CogniteConnectionError,
+    CogniteReadTimeout,
+)
+
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, CogniteAPIError):
+        return exc.code in TRANSIENT_STATUS_CODES
+    return isinstance(exc, NETWORK_ERRORS)
+
+
+def get_retry_delay(exc: Exception, backoff: Backoff) -> float:
+    delay = backoff.next_delay()
+    if isinstance(exc, CogniteAPIError) and exc.code == 429:
+        return max(delay, RATE_LIMITED_MIN_DELAY_SEC)
+    return delay
+
+
+def retry_phase(
+    phase: str,
+    fn: Callable[..., T],
+    *args,
+    max_attempts: int = PHASE_MAX_ATTEMPTS,
+    retry_on: Callable[[Exception], bool] = is_transient,
+    **kwargs,
+) -> T:
+    """
+    Calls 'fn', retrying only this phase (with exponential backoff) on transient errors. The results of earlier
+    phases are kept by the caller, so a transient failure costs a few seconds, not a full redeploy.
+    """
+    backoff, attempt = Backoff(initial_delay=1, max_delay=60, factor=2, jitter=1), 1
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_attempts or not retry_on(e):
+                raise
+            delay = get_retry_delay(e, backoff)
+            logger.warning(
+                f"Phase '{phase}' failed (attempt {attempt}/{max_attempts}): {e!r}. Retrying in {delay:.1f}s..."
+            )
+            count_retry()
+            time.sleep(delay)
+            attempt += 1
@@ -1,19 +1,31 @@
 import logging
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
 
+from cognite.client.exceptions import CogniteAPIError
 from cognite.experimental import CogniteClient
-from cognite.experimental.data_classes import Function
+from cognite.experimental.data_classes import Function, FunctionSchedule
 
 from config import ScheduleConfig
+from timing import bind_span, span
 
 logger = logging.getLogger(__name__)
 
+SCHEDULE_WORKERS = 8  # Max concurrent schedule API calls
+_UNKNOWN = object()  # Input data of an existing schedule that we failed to retrieve
 
+
+def _run_concurrently(fn: Callable, items: Iterable) -> List:
+    # Experimental SDK does not support "create/delete multiple" for schedules, so we do one call per schedule:
+    with ThreadPoolExecutor(max_workers=SCHEDULE_WORKERS, thread_name_prefix="schedule") as executor:
+        return list(executor.map(bind_span(fn), items))
+
+
+@span("delete_schedules")
 def delete_function_schedules(client: CogniteClient, function_external_id: str):
     all_schedules = client.functions.schedules.list(function_external_id=function_external_id, limit=None)
     if all_schedules:
-        for s in all_schedules:  # TODO: Experimental SDK does not support "delete multiple"
-            client.functions.schedules.delete(s.id)
+        _run_concurrently(client.functions.schedules.delete, [s.id for s in all_schedules])
         logger.info(f"Deleted all ({len(all_schedules)}) existing schedule(s)!")
     else:
         logger.info("No existing schedule(s) to delete!")
@@ -25,7 +37,8 @@ def deploy_schedules(client: CogniteClient, function: Function, schedules: List[
         return
 
     logger.info(f"Attaching {len(schedules)} schedule(s) to {function.external_id}")
-    for schedule in schedules:
+
+    def create(schedule: ScheduleConfig):
         client.functions.schedules.create(
             function_external_id=function.external_id,
             cron_expression=schedule.cron,
@@ -33,3 +46,70 @@ def deploy_schedules(client: CogniteClient, function: Function, schedules: List[
             data=schedule.data,
         )
         logger.info(f"- Schedule '{schedule.name}' with cron: '{schedule.cron}' attached successfully!")
+
+    _run_concurrently(create, schedules)
+
+
+@span("reconcile_schedules")
+def reconcile_schedules(client: CogniteClient, function: Function, schedules: List[ScheduleConfig]):
+    """
+    Makes the schedules of the function match the given ones: Existing schedules with the same name, cron
+    expression and data are left untouched, while only the difference is created and deleted. New schedules
+    are created before the outdated ones are deleted, so there is never a window without schedules.
+    """
+    existing = list(client.functions.schedules.list(function_external_id=function.external_id, limit=None))
+    # Input data is not part of the listed schedules, so we look it up, but only for possible matches:
+    wanted_keys = {(s.name, s.cron) for s in schedules}
+    candidates = [s for s in existing if (s.name, s.cron_expression) in wanted_keys]
+    fetched = _run_concurrently(lambda s: _get_input_data(client, s), candidates)
+    input_data = {s.id: data for s, data in zip(candidates, fetched)}
+
+    to_create, unmatched = [], existing
+    for schedule in schedules:
+        match = next((s for s in unmatched if _is_same_schedule(s, input_data.get(s.id, _UNKNOWN), schedule)), None)
+        if match is None:
+            to_create.append(schedule)
+        else:
+            unmatched = [s for s in unmatched if s is not match]
+
+    n_unchanged = len(schedules) - len(to_create)
+    logger.info(
+        f"Schedules of {function.external_id}: {n_unchanged} unchanged, {len(to_create)} to create, "
+        f"{len(unmatched)} to delete"
+    )
+    if to_create:
+        deploy_schedules(client, function, to_create)
+    if unmatched:
+        _run_concurrently(client.functions.schedules.delete, [s.id for s in unmatched])
+        for s in unmatched:
+            logger.info(f"- Schedule '{s.name}' with cron: '{s.cron_expression}' deleted successfully!")
+
+
+@span("copy_schedules")
+def copy_schedules(client: CogniteClient, source_external_id: str, function: Function):
+    """Attaches copies of all schedules of the source function (same name, cron expression and data) to 'function'"""
+    existing = list(client.functions.schedules.list(function_external_id=source_external_id, limit=None))
+    input_data = _run_concurrently(lambda s: _get_input_data(client, s), existing)
+    if _UNKNOWN in input_data:
+        raise ValueError(f"Unable to retrieve input data of all schedules of '{source_external_id}'")
+    schedules = [
+        ScheduleConfig.construct(name=s.name, cron=s.cron_expression, data=data)
+        for s, data in zip(existing, input_data)
+    ]
+    deploy_schedules(client, function, schedules)
+
+
+def _get_input_data(client: CogniteClient, schedule: FunctionSchedule) -> Optional[dict]:
+    try:
+        return client.functions.schedules.get_input_data(schedule.id) or None
+    except (CogniteAPIError, KeyError):
+        return _UNKNOWN  # Forces the schedule to be re-created
+
+
+def _is_same_schedule(existing: FunctionSchedule, existing_data, schedule: ScheduleConfig) -> bool:
+    return (
+        existing.name == schedule.name
+        and existing.cron_expression == schedule.cron
+        and existing_data is not _UNKNOWN
+        and existing_data == (schedule.data or None)
+    )
@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Every HTTP request is logged (at debug level) by urllib3 with this format, and so are its retries:
+HTTP_REQUEST_LOG_FORMAT = '%s://%s:%s "%s %s %s" %s %s'
+RETRY_LOG_PREFIXES = ("Retry: ", "Retrying (")
+
+
+@dataclass
+class Span:
+    name: str  # Path of the span, e.g. 'deploy:my-function/upload'
+    start: float  # Seconds since the recorder was started
+    duration: Optional[float] = None
+    bytes: int = 0
+    api_calls: int = 0
+    retries: int = 0
+    error: Optional[str] = None
+
+
+class PhaseRecorder:
+    """
+    Records the duration of (possibly nested) phases of a run, with the number of bytes processed and the
+    number of API calls and retries made from within them. Spans nest per thread, so functions deployed
+    concurrently get separate span trees.
+    """
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._spans: List[Span] = []
+        # API calls and retries made outside of any span (e.g. by SDK worker threads):
+        self._unattributed = Span("unattributed", start=0)
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        stack = self._stack()
+        path = f"{stack[-1].name}/{name}" if stack else name
+        current = Span(path, start=round(time.perf_counter() - self._t0, 3))
+        with self._lock:
+            self._spans.append(current)
+        stack.append(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.error = repr(e)
+            raise
+        finally:
+            stack.pop()
+            current.duration = round(time.perf_counter() - self._t0 - current.start, 3)
+
+    def bind(self, fn: Callable[..., T]) -> Callable[..., T]:
+        """Wraps 'fn' to run within the current span(s) of this thread, e.g. when it is run by a worker thread"""
+        parents = list(self._stack())
+
+        def run_in_span(*args, **kwargs) -> T:
+            stack = self._stack()
+            outer, stack[:] = stack[:], parents
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stack[:] = outer
+
+        return run_in_span
+
+    def root(self) -> Optional[str]:
+        """Name of the outermost span of this thread, if any"""
+        return stack[0].name if (stack := self._stack()) else None
+
+    def count(self, api_calls: int = 0, retries: int = 0) -> None:
+        """Counts towards the innermost span of this thread, and all its parents"""
+        with self._lock:
+            for s in self._stack() or [self._unattributed]:
+                s.api_calls += api_calls
+                s.retries += retries
+
+    def report(self) -> Dict:
+        with self._lock:
+            spans = [asdict(s) for s in self._spans]
+            counted = [s for s in spans if "/" not in s["name"]] + [asdict(self._unattributed)]
+            return {
+                "total_duration": round(time.perf_counter() - self._t0, 3),
+                "total_api_calls": sum(s["api_calls"] for s in counted),
+                "total_retries": sum(s["retries"] for s in counted),
+                "unattributed_api_calls": self._unattributed.api_calls,
+                "unattributed_retries": self._unattributed.retries,
+                "spans": spans,
+            }
+
+
+class _CountingFilter(logging.Filter):
+    def __init__(self, recorder: PhaseRecorder):
+        super().__init__()
+        self.recorder = recorder
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.msg == HTTP_REQUEST_LOG_FORMAT:
+            self.recorder.count(api_calls=1)
+        elif isinstance(record.msg, str) and record.msg.startswith(RETRY_LOG_PREFIXES):
+            self.recorder.count(retries=1)
+        # Debug records are only enabled for counting, so they are dropped:
+        return record.levelno > logging.DEBUG
+
+
+_recorder = PhaseRecorder()
+
+
+def span(name: str):
+    """Context manager (or decorator) timing a phase on the global recorder"""
+    return _recorder.span(name)
+
+
+def bind_span(fn: Callable[..., T]) -> Callable[..., T]:
+    """See 'PhaseRecorder.bind'"""
+    return _recorder.bind(fn)
+
+
+def current_root_span() -> Optional[str]:
+    return _recorder.root()
+
+
+def install_counters(recorder: PhaseRecorder = None) -> None:
+    counting_filter = _CountingFilter(recorder or _recorder)
+    urllib3_logger = logging.getLogger("urllib3.connectionpool")
+    urllib3_logger.setLevel(logging.DEBUG)  # Needed to see each request
+    urllib3_logger.addFilter(counting_filter)
+
+
+def count_retry() -> None:
+    """Counts a retry (of a deployment phase) towards the current span"""
+    _recorder.count(retries=1)
+
+
+def write_report(path: Path, recorder: PhaseRecorder = None) -> Dict:
+    """Writes the report as JSON, e.g. to upload as a workflow artifact"""
+    report = (recorder or _recorder).report()
+    Path(path).write_text(json.dumps(report, indent=2))
+    logger.info(f"Wrote timing report to '{path}' (total duration: {report['total_duration']}s)")
+    return report
+
+
+def get_report() -> Dict:
+    return _recorder.report()
+
+
+def summarize(report: Dict) -> Dict[str, float]:
+    """Total duration per span name (retried phases occur more than once), e.g. for action outputs"""
+    durations: Dict[str, float] = {}
+    for s in report["spans"]:
+        durations[s["name"]] = round(durations.get(s["name"], 0) + (s["duration"] or 0), 3)
+    return durations
+
+
+def summary_lines(report: Dict) -> List[str]:
+    """Compact summary, one line per root span with the durations of its phases"""
+    durations = summarize(report)
+    lines = []
+    for root, duration in durations.items():
+        if "/" not in root:
+            phases = [
+                f"{name.split('/', 1)[1]} {sec}s"
+                for name, sec in durations.items()
+                if name.startswith(f"{root}/") and name.count("/") == 1
+            ]
+            lines.append(f"{root}: {duration}s" + (f" ({', '.join(phases)})" if phases else ""))
+    return lines
@@ -0,0 +1,202 @@
+import logging
+import os
+import re
+import threading
+import time
+from typing import BinaryIO, Dict, Optional, Tuple
+
+import requests
+from cognite.client.data_classes import FileMetadata
+from cognite.client.exceptions import CogniteAPIError
+from cognite.experimental import CogniteClient
+from humanize.filesize import naturalsize
+
+from github_log_handler import RATE_LIMITED
+from poller import Backoff
+from retries import is_transient
+from timing import count_retry
+
+logger = logging.getLogger(__name__)
+
+# Chunks of resumable uploads must be multiples of this size (except for the last one):
+CHUNK_ALIGNMENT = 256 * 1024
+CHUNK_MAX_ATTEMPTS = 5
+PROGRESS_LOG_INTERVAL_SEC = 10
+RESUME_INCOMPLETE = 308  # Status of an acknowledged chunk, when more is expected
+RANGE_RE = re.compile(r"^bytes=0-(\d+)$")
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadSessionExpired(ConnectionError):
+    """The upload starts over when retried (see 'retries.is_transient')"""
+
+
+class _ThrottledReader:
+    """File-like view of 'length' bytes of 'content' (from its current position), read at most at the given rate"""
+
+    def __init__(self, content: BinaryIO, length: int, max_bytes_per_sec: Optional[float]):
+        self.content = content
+        self.remaining = self.length = length
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self._t0 = time.monotonic()
+
+    def __len__(self) -> int:
+        return self.length  # Used for the 'Content-Length' header
+
+    def read(self, size: int = -1) -> bytes:
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.content.read(min(size, READ_BLOCK_SIZE))
+        self.remaining -= len(data)
+        if self.max_bytes_per_sec:
+            # Sleep until the bytes read so far are within the rate:
+            ahead = (self.length - self.remaining) / self.max_bytes_per_sec - (time.monotonic() - self._t0)
+            if ahead > 0:
+                time.sleep(ahead)
+        return data
+
+
+class ResumableUpload:
+    """
+    Uploads content to the upload URL of a file in chunks, using the resumable upload protocol of the storage
+    behind it: each chunk is sent with a 'Content-Range' header and acknowledged (status 308) with the 'Range'
+    received so far. After a failure, the server is asked how much it got, and the upload continues from there,
+    so a network hiccup costs at most one chunk instead of the whole transfer.
+    """
+
+    def __init__(
+        self,
+        upload_url: str,
+        total_size: int,
+        chunk_size: int,
+        max_bytes_per_sec: Optional[float] = None,
+        timeout: float = 600,
+        session: requests.Session = None,
+    ):
+        if chunk_size % CHUNK_ALIGNMENT:
+            raise ValueError(f"Chunk size must be a multiple of {CHUNK_ALIGNMENT} bytes, got {chunk_size}")
+        self.upload_url = upload_url
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.offset = 0  # Bytes confirmed by the server
+
+    def upload(self, content: BinaryIO) -> None:
+        """Uploads (the rest of) 'content', a seekable file handle. Can be called again to resume after a failure"""
+        if self.offset:
+            logger.info(f"- Resuming upload at {naturalsize(self.offset)} of {naturalsize(self.total_size)}")
+        t0 = last_log = time.monotonic()
+        resumed_at = self.offset
+        while self.offset < self.total_size:
+            self._upload_chunk(content)
+            if (now := time.monotonic()) - last_log >= PROGRESS_LOG_INTERVAL_SEC or self.offset == self.total_size:
+                rate = (self.offset - resumed_at) / max(now - t0, 1e-6)
+                logger.info(
+                    f"- Uploaded {naturalsize(self.offset)} of {naturalsize(self.total_size)} "
+                    f"({self.offset / self.total_size:.0%}, {naturalsize(rate)}/s)",
+                    extra=RATE_LIMITED,
+                )
+                last_log = now
+
+    def _upload_chunk(self, content: BinaryIO) -> None:
+        backoff = Backoff(initial_delay=1, max_delay=30, factor=2, jitter=1)
+        for attempt in range(1, CHUNK_MAX_ATTEMPTS + 1):
+            try:
+                if attempt > 1:
+                    # The failed chunk may have arrived, in part or in full:
+                    if (offset := self._query_offset()) == self.total_size:
+                        self.offset = offset
+                        return
+                    self.offset = offset
+                self.offset = self._send_chunk(content)
+                return
+            except Exception as e:
+                if attempt == CHUNK_MAX_ATTEMPTS or isinstance(e, UploadSessionExpired) or not is_transient(e):
+                    raise
+            delay = backoff.next_delay()
+            logger.warning(
+                f"Upload of chunk at byte {self.offset} failed (attempt {attempt}). Retrying in {delay:.1f}s..."
+            )
+            count_retry()
+            time.sleep(delay)
+
+    def _send_chunk(self, content: BinaryIO) -> int:
+        end = min(self.offset + self.chunk_size, self.total_size)
+        content.seek(self.offset)
+        headers = {"Content-Range": f"bytes {self.offset}-{end - 1}/{self.total_size}"}
+        body = _ThrottledReader(content, end - self.offset, self.max_bytes_per_sec)
+        res = self.session.put(self.upload_url, data=body, headers=headers, timeout=self.timeout)
+        return self._parse_offset(res)
+
+    def _query_offset(self) -> int:
+        headers = {"Content-Range": f"bytes */{self.total_size}", "Content-Length": "0"}
+        return self._parse_offset(self.session.put(self.upload_url, headers=headers, timeout=self.timeout))
+
+    def _parse_offset(self, res: requests.Response) -> int:
+        if res.status_code in (200, 201):
+            return self.total_size
+        if res.status_code == RESUME_INCOMPLETE:
+            match = RANGE_RE.match(res.headers.get("Range", ""))
+            return int(match.group(1)) + 1 if match else 0
+        if res.status_code in (404, 410):
+            raise UploadSessionExpired(f"Upload session expired (status {res.status_code})")
+        raise CogniteAPIError(f"Upload failed: {res.text[:200]}", res.status_code, res.headers.get("X-Request-Id"))
+
+
+def upload_file(
+    client: CogniteClient, content: BinaryIO, file_meta: FileMetadata, max_bytes_per_sec: Optional[float] = None
+) -> FileMetadata:
+    """
+    Creates the file (overwriting any existing one with the same external ID), then uploads 'content' in a single
+    request. Unlike 'files.upload_bytes', a failed request is not retried with the (already consumed) stream, which
+    sends an empty body: the caller retries the whole upload, which starts over from the start of 'content'.
+    """
+    created, upload_url = client.files.create(file_meta, overwrite=True)
+    total_size = content.seek(0, os.SEEK_END)
+    content.seek(0)
+    # A sized body, so requests does not call 'fileno()' to get the size (which rolls spooled files over to disk):
+    body = _ThrottledReader(content, total_size, max_bytes_per_sec)
+    res = requests.put(upload_url, data=body, timeout=client.config.file_transfer_timeout)
+    if res.status_code not in (200, 201):
+        raise CogniteAPIError(f"Upload failed: {res.text[:200]}", res.status_code, res.headers.get("X-Request-Id"))
+    return created
+
+
+# Upload sessions in progress, by file external ID, so that a retried upload phase resumes where it failed:
+_sessions: Dict[str, Tuple[FileMetadata, ResumableUpload]] = {}
+_sessions_lock = threading.Lock()
+
+
+def upload_file_in_chunks(
+    client: CogniteClient,
+    content: BinaryIO,
+    file_meta: FileMetadata,
+    chunk_size: int,
+    max_bytes_per_sec: Optional[float] = None,
+) -> FileMetadata:
+    """
+    Creates the file (overwriting any existing one with the same external ID), then uploads 'content' in chunks.
+    If the upload fails, the next call for the same file resumes it, instead of starting over.
+    """
+    with _sessions_lock:
+        session = _sessions.get(file_meta.external_id)
+    if session is None:
+        created, upload_url = client.files.create(file_meta, overwrite=True)
+        total_size = content.seek(0, os.SEEK_END)
+        content.seek(0)
+        timeout = client.config.file_transfer_timeout
+        session = created, ResumableUpload(upload_url, total_size, chunk_size, max_bytes_per_sec, timeout)
+        with _sessions_lock:
+            _sessions[file_meta.external_id] = session
+
+    created, upload = session
+    try:
+        upload.upload(content)
+    except UploadSessionExpired:
+        with _sessions_lock:
+            _sessions.pop(file_meta.external_id, None)  # Starts over when retried
+        raise
+    with _sessions_lock:
+        _sessions.pop(file_meta.external_id, None)
+    return created
@@ -0,0 +1,203 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from email.parser import HeaderParser
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from zipfile import ZipFile
+
+from humanize.filesize import naturalsize
+from humanize.time import precisedelta
+
+from requirements import Requirement, is_option_or_url, normalize_name, read_requirement_lines
+
+logger = logging.getLogger(__name__)
+
+# Only pure-Python wheels are vendored, as the platform (and Python version) of the server may differ from ours:
+PURE_PYTHON_TAGS = {"py3", "py2.py3"}
+WHEEL_NAME_RE = re.compile(
+    r"^(?P<name>[^-]+)-(?P<version>[^-]+)(-\d[^-]*)?-(?P<python>[^-]+)-(?P<abi>[^-]+)-(?P<platform>[^-]+)\.whl$"
+)
+VERSION_RE = re.compile(r"^v?(?P<release>\d+(\.\d+)*)(?P<suffix>.*)$")
+PRE_RELEASE_RE = re.compile(r"^(a|b|c|rc|alpha|beta|pre|preview|dev)")
+# Rough cost of installing a package during the server-side build (resolving, downloading and installing it):
+EST_INSTALL_SEC_PER_PACKAGE = 2.0
+EST_INSTALL_MB_PER_SEC = 5.0
+
+
+@dataclass
+class Wheel:
+    path: Path
+    name: str  # Normalized
+    version: str
+
+    def requires(self) -> List[str]:
+        with ZipFile(self.path) as zf:
+            metadata_name = next(n for n in zf.namelist() if n.endswith(".dist-info/METADATA") and n.count("/") == 1)
+            metadata = HeaderParser().parsestr(zf.read(metadata_name).decode("utf-8"))
+        return metadata.get_all("Requires-Dist") or []
+
+
+def _version_key(version: str) -> Optional[Tuple]:
+    if (match := VERSION_RE.match(version.lower())) is None:
+        return None
+    release = tuple(int(part) for part in match["release"].split("."))
+    release += (0,) * (6 - len(release))
+    suffix = match["suffix"].lstrip(".-_")
+    # Pre-releases (and dev releases) sort before the final release, post-releases after it:
+    rank = 0 if not suffix or suffix.startswith("+") else -1 if PRE_RELEASE_RE.match(suffix) else 1
+    return release, rank, suffix
+
+
+def satisfies(version: str, specifiers: Iterable[Tuple[str, str]]) -> bool:
+    """Simplified version matching (PEP 440). When in doubt, the answer is no, so the package is not vendored"""
+    if (key := _version_key(version)) is None:
+        return False
+    for op, spec in specifiers:
+        if op == "===":
+            if version != spec:
+                return False
+            continue
+        if spec.endswith(".*"):
+            if op not in ("==", "!="):
+                return False
+            prefix = tuple(int(part) for part in spec[:-2].split(".") if part.isdigit())
+            if (key[0][: len(prefix)] == prefix) != (op == "=="):
+                return False
+            continue
+        if (spec_key := _version_key(spec)) is None:
+            return False
+        if op == "~=":
+            n_parts = len(spec.split("."))
+            if n_parts < 2 or key < spec_key or key[0][: n_parts - 1] != spec_key[0][: n_parts - 1]:
+                return False
+        elif not {
+            "==": key == spec_key,
+            "!=": key != spec_key,
+            "<=": key <= spec_key,
+            ">=": key >= spec_key,
+            "<": key < spec_key,
+            ">": key > spec_key,
+        }[op]:
+            return False
+    return True
+
+
+def index_wheelhouse(wheelhouse: Path) -> Dict[str, List[Wheel]]:
+    """Pure-Python wheels in the wheelhouse by (normalized) name, newest version first"""
+    wheels: Dict[str, List[Wheel]] = {}
+    for path in sorted(wheelhouse.glob("*.whl")):
+        match = WHEEL_NAME_RE.match(path.name)
+        if match is None or match["python"] not in PURE_PYTHON_TAGS or match["abi"] != "none":
+            continue
+        if match["platform"] == "any" and _version_key(match["version"]) is not None:
+            name = normalize_name(match["name"])
+            wheels.setdefault(name, []).append(Wheel(path, name, match["version"]))
+    for candidates in wheels.values():
+        candidates.sort(key=lambda w: _version_key(w.version), reverse=True)
+    return wheels
+
+
+@dataclass
+class VendorPlan:
+    vendored: Dict[str, Wheel] = field(default_factory=dict)
+    requirements: List[str] = field(default_factory=list)  # Left for the server to install
+
+    @property
+    def vendored_size(self) -> int:
+        return sum(wheel.path.stat().st_size for wheel in self.vendored.values())
+
+    def expected_savings_sec(self) -> float:
+        n_packages, size_mb = len(self.vendored), self.vendored_size / 1024**2
+        return n_packages * EST_INSTALL_SEC_PER_PACKAGE + size_mb / EST_INSTALL_MB_PER_SEC
+
+
+def plan_vendoring(requirement_lines: List[str], wheels: Dict[str, List[Wheel]]) -> VendorPlan:
+    """
+    Resolves the requirements (logical lines, see 'read_requirement_lines') and their dependencies against the
+    wheelhouse. Whatever can not be vendored, e.g.
+    platform-specific packages, conditional (marker) dependencies or versions missing from the wheelhouse, is kept
+    as a requirement for the server to install, so the function gets the same packages either way.
+    """
+    plan, kept = VendorPlan(), {}
+    pending: List[Tuple[Requirement, bool]] = []
+    for line in requirement_lines:
+        if is_option_or_url(line) or (req := Requirement.parse(line)) is None:
+            plan.requirements.append(line)  # Pip options (e.g. --extra-index-url) and URLs are kept as-is
+            continue
+        pending.append((req, True))
+
+    while pending:
+        req, given = pending.pop(0)
+        if req.name in plan.vendored:
+            if not satisfies(plan.vendored[req.name].version, req.specifiers):
+                logger.warning(
+                    f"- Vendored {req.name}=={plan.vendored[req.name].version} does not satisfy '{req.line}', "
+                    "which is left for the server to install"
+                )
+                plan.requirements.append(req.line)
+            continue
+        if req.name in kept and not given:
+            continue  # Installed by the server anyway (with its dependencies)
+        wheel = None
+        if not (req.extras or req.url or req.marker):
+            wheel = next((w for w in wheels.get(req.name, []) if satisfies(w.version, req.specifiers)), None)
+        if wheel is None:
+            kept[req.name] = req
+            plan.requirements.append(req.line)
+            continue
+        dependencies = [Requirement.parse(dependency) for dependency in wheel.requires()]
+        if None in dependencies:
+            logger.warning(f"- Unable to parse the dependencies of {wheel.path.name}, not vendoring it")
+            kept[req.name] = req
+            plan.requirements.append(req.line)
+            continue
+        plan.vendored[req.name] = wheel
+        # Extras are not requested (requirements with extras are not vendored), so neither are their dependencies:
+        pending.extend((dep, False) for dep in dependencies if dep.marker is None or "extra" not in dep.marker)
+    return plan
+
+
+def vendor_requirements(
+    requirements_file: Path, wheelhouse: Path, target: Path, taken: Set[str]
+) -> Optional[VendorPlan]:
+    """
+    Extracts the wheels (from the local wheelhouse) that satisfy the requirements into 'target', next to a rewritten
+    'requirements.txt' holding only what is left for the server to install. Wheels with files that would overwrite
+    files of the function ('taken' archive names) are not vendored. Returns None if nothing was vendored.
+    """
+    if not requirements_file.is_file():
+        return None
+    lines = [line for _, line in read_requirement_lines(requirements_file)]
+    wheels = index_wheelhouse(wheelhouse)
+    while True:
+        plan = plan_vendoring(lines, wheels)
+        if not (unpackable := [name for name, wheel in plan.vendored.items() if not _can_unpack(wheel, taken)]):
+            break
+        for name in unpackable:
+            logger.info(f"- Not vendoring {plan.vendored[name].path.name}, it can not be unpacked into the function")
+            del wheels[name]
+    return _extract(plan, target)
+
+
+def _can_unpack(wheel: Wheel, taken: Set[str]) -> bool:
+    with ZipFile(wheel.path) as zf:
+        members = [name for name in zf.namelist() if not name.endswith("/")]
+    # Files in '<name>.data/' go elsewhere (like scripts), which only an installer handles:
+    return not taken.intersection(members) and not any(m.split("/", 1)[0].endswith(".data") for m in members)
+
+
+def _extract(plan: VendorPlan, target: Path) -> Optional[VendorPlan]:
+    if not plan.vendored:
+        return None
+    for wheel in plan.vendored.values():
+        with ZipFile(wheel.path) as zf:
+            zf.extractall(target)
+    header = "# Rewritten by function-action: the other requirements are vendored (unpacked next to this file)"
+    (target / "requirements.txt").write_text("\n".join([header, *plan.requirements]) + "\n")
+    logger.info(
+        f"- Vendored {len(plan.vendored)} package(s) ({naturalsize(plan.vendored_size)} of wheels) from the "
+        f"wheelhouse, {len(plan.requirements)} requirement(s) left for the server to install. Expected to save "
+        f"about {precisedelta(plan.expected_savings_sec())} of the server-side build (rough estimate)"
+    )
+    return plan
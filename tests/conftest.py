@@ -2,6 +2,7 @@ from contextlib import contextmanager
 from unittest.mock import MagicMock
 
 import pytest
+from cognite.client._api.files import FilesAPI
 from cognite.client.data_classes import LoginStatus
 from cognite.client.testing import monkeypatch_cognite_client
 from cognite.experimental import CogniteClient
@@ -20,6 +21,7 @@ class ExperimentalCogniteClientMock(MagicMock):
         super().__init__(spec=CogniteClient, *args, **kwargs)
         self.functions = MagicMock(spec=FunctionsAPI)
         self.functions.schedules = MagicMock(spec_set=FunctionSchedulesAPI)
+        self.files = MagicMock(spec=FilesAPI)
 
 
 @contextmanager
@@ -0,0 +1,101 @@
+import contextlib
+import io
+import os
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+import pytest
+
+import archive
+from archive import ArchiveWriter, Compression, PreviousArchive, _deflate, build_manifest, hash_files, list_folder
+
+
+@pytest.fixture
+def function_folder(tmp_path):
+    folder = tmp_path / "function"
+    (folder / "pkg").mkdir(parents=True)
+    (folder / "handler.py").write_text("def handle():\n    pass\n" * 100)
+    (folder / "pkg" / "model.pkl").write_bytes(os.urandom(1000))
+    for i in range(20):
+        (folder / "pkg" / f"module_{i}.py").write_text(f"VALUE = {i}\n" * 100)
+    return folder
+
+
+def _write_folder(writer, folder, root, shared=False):
+    # As 'function.zip_folder' does:
+    for path, arcname in list_folder(folder, root)[0]:
+        writer.write(path, arcname, shared=shared)
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_archive_writer_deflates_in_parallel(function_folder, max_workers, monkeypatch):
+    monkeypatch.setattr(archive, "PARALLEL_MAX_FILE_SIZE", 1000)  # Some files are written by ZipFile
+    buf = io.BytesIO()
+    with ZipFile(buf, "w") as zf:
+        with ArchiveWriter(zf, Compression.DEFLATE, level=9, max_workers=max_workers) as writer:
+            _write_folder(writer, function_folder, root=function_folder)
+
+    with ZipFile(buf) as zf:
+        assert zf.testzip() is None
+        infos = {info.filename: info for info in zf.infolist()}
+        assert zf.read("handler.py") == (function_folder / "handler.py").read_bytes()
+        assert zf.read("pkg/module_7.py") == b"VALUE = 7\n" * 100
+    assert infos["handler.py"].compress_type == ZIP_DEFLATED
+    assert infos["pkg/model.pkl"].compress_type == ZIP_STORED
+    assert infos["pkg/module_0.py"].compress_size < infos["pkg/module_0.py"].file_size
+
+
+def test_archive_writer_bounds_pending_size(function_folder, monkeypatch):
+    monkeypatch.setattr(archive, "PENDING_MAX_SIZE", 2500)  # Room for two of the modules (1000-1100 bytes)
+    buf = io.BytesIO()
+    with ZipFile(buf, "w") as zf:
+        with ArchiveWriter(zf, Compression.DEFLATE, max_workers=8) as writer:
+            for path, arcname in list_folder(function_folder, function_folder)[0]:
+                writer.write(path, arcname)
+                assert writer._pending_size <= 2500 and len(writer._pending) <= 2
+        assert writer._pending_size == 0
+
+    with ZipFile(buf) as zf:
+        assert zf.testzip() is None and len(zf.namelist()) == 22
+
+
+def test_archive_writer_stored(function_folder):
+    buf = io.BytesIO()
+    with ZipFile(buf, "w") as zf:
+        with ArchiveWriter(zf, Compression.STORED) as writer:
+            _write_folder(writer, function_folder, root=function_folder.parent)
+
+    with ZipFile(buf) as zf:
+        assert {info.compress_type for info in zf.infolist()} == {ZIP_STORED}
+        assert "function/pkg/module_0.py" in zf.namelist()
+
+
+def _build_incremental(folder, previous_path=None, previous_manifest=None):
+    files, _ = list_folder(folder, folder)
+    file_hashes = hash_files(files)
+    buf = io.BytesIO()
+    with contextlib.ExitStack() as stack, ZipFile(buf, "w") as zf:
+        previous = stack.enter_context(PreviousArchive(previous_path, previous_manifest)) if previous_path else None
+        with ArchiveWriter(zf, previous=previous) as writer:
+            for path, arcname in files:
+                writer.write(path, arcname, sha256=file_hashes[arcname.as_posix()])
+    return buf.getvalue(), build_manifest(files, file_hashes), writer.reused
+
+
+@pytest.mark.parametrize("large_file_size", [10_000, 100])  # Copied in one piece or streamed
+def test_unchanged_entries_are_copied_from_previous_archive(function_folder, tmp_path, large_file_size, monkeypatch):
+    monkeypatch.setattr(archive, "PARALLEL_MAX_FILE_SIZE", large_file_size)
+    first, manifest, _ = _build_incremental(function_folder)
+    (tmp_path / "previous.zip").write_bytes(first)
+
+    deflated = []
+    monkeypatch.setattr(archive, "_deflate", lambda path, level: deflated.append(path) or _deflate(path, level))
+    (function_folder / "pkg" / "module_3.py").write_text("VALUE = 'changed'\n")
+    (function_folder / "pkg" / "model.pkl").chmod(0o755)  # Permissions are part of the entry
+    second, _, reused = _build_incremental(function_folder, tmp_path / "previous.zip", manifest)
+
+    assert reused == 20
+    assert deflated == [function_folder / "pkg" / "module_3.py"]
+    assert second == _build_incremental(function_folder)[0]  # Same bytes as a full build
+    with ZipFile(io.BytesIO(second)) as zf:
+        assert zf.testzip() is None
+        assert zf.read("pkg/module_3.py") == b"VALUE = 'changed'\n"
@@ -0,0 +1,64 @@
+import io
+import json
+import logging
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+import archive_report
+from archive_report import (
+    ArchiveBudgetExceeded,
+    analyze_archive,
+    check_archive_budgets,
+    record_archive_report,
+    write_archive_reports,
+)
+
+
+@pytest.fixture
+def archive():
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w", compression=ZIP_DEFLATED) as zf:
+        zf.writestr("handler.py", "def handle():\n    pass\n")
+        zf.writestr("data/big.csv", "1,2,3\n" * 10_000)
+        zf.writestr("common/utils/helpers.py", "# Helpers\n" * 100)
+        zf.writestr("common/__init__.py", "")
+    buffer.seek(0)
+    return buffer
+
+
+def test_analyze_archive(archive):
+    sources = {"common/utils/helpers.py": "common", "common/__init__.py": "common"}
+    report = analyze_archive(archive, sources, "my-function", top_n=2)
+    assert archive.tell() == 0
+    assert report.archive_size == len(archive.getvalue())
+    assert report.total.files == 4 and report.total.size == 60_000 + 1000 + 23
+    assert report.total.compressed_size < report.total.size
+    assert {source: totals.files for source, totals in report.sources.items()} == {"function": 2, "common": 2}
+    assert list(report.directories["function"]) == ["data", "."]  # Largest first
+    assert list(report.directories["common"]) == ["common/utils", "common"]
+    assert [(f.name, f.source) for f in report.largest_files] == [
+        ("data/big.csv", "function"),
+        ("common/utils/helpers.py", "common"),
+    ]
+
+
+def test_check_archive_budgets(archive, caplog):
+    report = analyze_archive(archive, {}, "my-function")
+    check_archive_budgets(report, max_size=report.archive_size, max_unpacked_size=None)
+    with pytest.raises(ArchiveBudgetExceeded, match="unpacked"):
+        check_archive_budgets(report, max_size=None, max_unpacked_size=1000)
+
+    with caplog.at_level(logging.WARNING):
+        check_archive_budgets(report, max_size=100, max_unpacked_size=None, warn_only=True)
+    assert "exceeds its size budget" in caplog.text
+
+
+def test_write_archive_reports(archive, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_report, "_reports", [])
+    record_archive_report(analyze_archive(archive, {}, "my-function"))
+    write_archive_reports(tmp_path / "report.json")
+
+    (written,) = json.loads((tmp_path / "report.json").read_text())["archives"]
+    assert written["external_id"] == "my-function"
+    assert written["largest_files"][0]["name"] == "data/big.csv"
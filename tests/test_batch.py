@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock
+
+import pytest
+from cognite.experimental.data_classes import Function
+
+from batch import BatchDeployError, DeployStatus, deploy_batch, load_manifest, log_batch_summary
+
+
+def test_load_manifest(tmp_path, valid_config):
+    manifest = tmp_path / "manifest.yml"
+    manifest.write_text("- function_name: fn-1\n- function_name: fn-2\n  cpu: 0.5\n")
+    defaults = {"function_folder": "tests", "function_file": "handler.py", "cpu": 1.0}
+
+    configs = load_manifest(manifest, valid_config.tenant, defaults)
+    assert [c.external_id for c in configs] == ["fn-1", "fn-2"]
+    assert [c.cpu for c in configs] == [1.0, 0.5]
+
+
+def test_load_manifest_duplicated_names(tmp_path, valid_config):
+    manifest = tmp_path / "manifest.yml"
+    manifest.write_text("- function_name: fn-1\n- function_name: fn-1\n")
+    with pytest.raises(ValueError, match="duplicated"):
+        load_manifest(manifest, valid_config.tenant, {"function_folder": "tests", "function_file": "handler.py"})
+
+
+def test_deploy_batch(cognite_experimental_client_mock):
+    configs = [MagicMock(external_id=xid) for xid in ("ok", "removed", "broken")]
+
+    def deploy_fn(client, config):
+        if config.external_id == "broken":
+            raise RuntimeError("oops")
+        return Function(id=1, external_id=config.external_id) if config.external_id == "ok" else None
+
+    results = deploy_batch(cognite_experimental_client_mock, configs, deploy_fn, max_workers=3)
+    assert [res.external_id for res in results] == ["ok", "removed", "broken"]
+    assert [res.status for res in results] == [DeployStatus.DEPLOYED, DeployStatus.REMOVED, DeployStatus.FAILED]
+    assert results[0].function_id == 1
+
+    with pytest.raises(BatchDeployError):
+        log_batch_summary(results)
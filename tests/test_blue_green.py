@@ -0,0 +1,81 @@
+from unittest.mock import call, patch
+
+import pytest
+from cognite.experimental.data_classes import Function
+
+from blue_green import (
+    deploy_to_idle_slot,
+    find_live_function,
+    get_idle_slot,
+    retire_functions,
+    retrieve_deployed_functions,
+)
+from function import FunctionDeployError
+
+
+def test_retrieve_deployed_functions(cognite_experimental_client_mock):
+    cognite_experimental_client_mock.functions.list.return_value = [
+        Function(external_id="fn"),
+        Function(external_id="fn-blue"),
+        Function(external_id="fn-other"),
+    ]
+    deployed = retrieve_deployed_functions(cognite_experimental_client_mock, "fn")
+    assert [fn.external_id for fn in deployed] == ["fn", "fn-blue"]
+
+
+def test_find_live_function():
+    functions = [
+        Function(external_id="fn", status="Ready", created_time=1),
+        Function(external_id="fn-blue", status="Ready", created_time=3),
+        Function(external_id="fn-green", status="Failed", created_time=5),
+    ]
+    assert find_live_function(functions).external_id == "fn-blue"
+    assert find_live_function(functions[2:]) is None
+
+
+@pytest.mark.parametrize("live_external_id, idle", [(None, "fn-blue"), ("fn", "fn-blue"), ("fn-blue", "fn-green")])
+def test_get_idle_slot(live_external_id, idle):
+    live = None if live_external_id is None else Function(external_id=live_external_id)
+    assert get_idle_slot("fn", live) == idle
+
+
+@patch("blue_green.delete_single_cognite_function")
+@patch("blue_green.upload_and_create_function")
+def test_deploy_to_idle_slot(upload_and_create_mock, delete_mock, cognite_experimental_client_mock, valid_config):
+    live = Function(external_id=valid_config.external_id + "-blue", status="Ready")
+    deploy_to_idle_slot(cognite_experimental_client_mock, valid_config, live)
+    assert upload_and_create_mock.call_args == call(
+        cognite_experimental_client_mock,
+        valid_config,
+        external_id=valid_config.external_id + "-green",
+        live_external_id=live.external_id,
+    )
+    delete_mock.assert_not_called()
+
+
+@patch("blue_green.delete_single_cognite_function")
+@patch("blue_green.upload_and_create_function")
+def test_failed_rollout_keeps_live(upload_and_create_mock, delete_mock, cognite_experimental_client_mock, valid_config):
+    upload_and_create_mock.side_effect = FunctionDeployError
+    live = Function(external_id=valid_config.external_id + "-green", status="Ready")
+    with pytest.raises(FunctionDeployError):
+        deploy_to_idle_slot(cognite_experimental_client_mock, valid_config, live)
+    # Only the idle slot is cleaned up:
+    assert delete_mock.call_args_list == [
+        call(
+            cognite_experimental_client_mock,
+            valid_config.external_id + "-blue",
+            remove_schedules=True,
+            await_deletion=False,
+        )
+    ]
+
+
+@patch("blue_green.delete_single_cognite_function")
+def test_retire_functions(delete_mock, cognite_experimental_client_mock):
+    functions = [Function(external_id="fn"), Function(external_id="fn-blue"), Function(external_id="fn-green")]
+    retire_functions(cognite_experimental_client_mock, functions, keep=functions[2])
+    assert delete_mock.call_args_list == [
+        call(cognite_experimental_client_mock, "fn", remove_schedules=True, await_deletion=False),
+        call(cognite_experimental_client_mock, "fn-blue", remove_schedules=True, await_deletion=False),
+    ]
@@ -0,0 +1,39 @@
+import io
+import os
+
+from cache import DeployCache, get_deploy_cache
+
+
+def test_put_and_get(tmp_path):
+    cache = DeployCache(tmp_path, max_size=1024)
+    assert cache.get_path("archives", "key") is None
+    assert cache.get_json("deployed", "key") is None
+
+    stream = io.BytesIO(b"header-zip")
+    stream.seek(len(b"header-"))
+    cache.put_stream("archives", "key", stream)
+    assert stream.tell() == len(b"header-")  # Position is restored
+    assert cache.get_path("archives", "key").read_bytes() == b"zip"
+
+    cache.put_json("deployed", "key", {"digest": "abc"})
+    assert cache.get_json("deployed", "key") == {"digest": "abc"}
+    assert not list(tmp_path.glob("*/.tmp-*"))  # No leftovers from the atomic writes
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DeployCache(tmp_path, max_size=250)
+    for i, key in enumerate("abc"):
+        cache.put_stream("archives", key, io.BytesIO(b"x" * 100))
+        os.utime(tmp_path / "archives" / key, (i, i))  # 'a' is the oldest
+    cache.get_path("archives", "a")  # ...but is used again
+
+    assert cache.evict() == 100
+    assert {p.name for p in (tmp_path / "archives").iterdir()} == {"a", "c"}
+    assert cache.evict() == 0
+
+
+def test_get_deploy_cache(tmp_path):
+    assert get_deploy_cache(None) is None
+    cache = get_deploy_cache(tmp_path / "cache", max_size_mb=1)
+    assert get_deploy_cache(tmp_path / "cache") is cache  # Shared by all functions in a run
+    assert cache.max_size == 1024**2
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+import checks
+from checks import FunctionValidationError, run_checks
+from config import FunctionConfig
+
+HANDLER = """
+from common.utils import helper
+from pkg import sub
+from pkg.sub.mod import VALUE
+import requests
+
+try:
+    import pkg.optional
+except ImportError:
+    pass
+
+
+def handle(data, client):
+    return helper(VALUE)
+"""
+
+
+@pytest.fixture
+def function_config(tmp_path):
+    folder, common = tmp_path / "function", tmp_path / "common"
+    (folder / "pkg" / "sub").mkdir(parents=True)
+    common.mkdir()
+    (folder / "handler.py").write_text(HANDLER)
+    (folder / "pkg" / "__init__.py").write_text("from .sub.mod import VALUE\n")
+    (folder / "pkg" / "sub" / "mod.py").write_text("from ..other import X\nVALUE = X\n")
+    (folder / "pkg" / "other.py").write_text("X = 42\n")
+    (folder / "requirements.txt").write_text("requests>=2.0, <3  # comment\n--extra-index-url https://pypi\nnumpy\n")
+    (common / "utils.py").write_text("def helper(x):\n    return x\n")
+    return FunctionConfig.construct(function_folder=folder, common_folder=common, function_file="handler.py")
+
+
+def test_run_checks(function_config):
+    run_checks(function_config)
+
+
+@pytest.mark.parametrize(
+    "path, content",
+    [
+        ("pkg/other.py", "X = (42\n"),
+        ("pkg/other.py", "from pkg.missing import X\n"),
+        ("pkg/other.py", "from ...outside import X\n"),
+        ("handler.py", HANDLER.replace("common.utils", "common.missing")),
+        ("requirements.txt", "requests\nRequests==2.0\n"),
+        ("requirements.txt", "requests=2.0\n"),
+        ("requirements.txt", "numpy==1.21; python_version < '3.9'\nnumpy==1.22 ; python_version  <  \"3.9\"\n"),
+    ],
+)
+def test_run_checks_failing(function_config, path, content):
+    (function_config.function_folder / path).write_text(content)
+    with pytest.raises(FunctionValidationError):
+        run_checks(function_config)
+
+
+@pytest.mark.parametrize(
+    "requirements",
+    [
+        "requests==2.0 \\\n    --hash=sha256:abc \\\n    --hash=sha256:def\n",
+        "git+https://github.com/org/pkg.git@v1#egg=pkg\n",
+        "https://example.com/pkg-1.0-py3-none-any.whl\n./wheels/pkg-1.0.tar.gz\n",
+        "requests (>=2.0)\npkg[extra] (>=1, <2); python_version >= '3.8'\n",
+        "pkg @ https://example.com/pkg.zip ; sys_platform == 'linux'\n",
+        'numpy==1.21; python_version < "3.9"\nnumpy==1.26; python_version >= "3.9"\n',
+    ],
+)
+def test_valid_requirements(function_config, requirements):
+    (function_config.function_folder / "requirements.txt").write_text(requirements)
+    run_checks(function_config)
+
+
+def test_parsed_files_are_cached(function_config, monkeypatch):
+    run_checks(function_config)
+    monkeypatch.setattr(checks, "_analyze_source", None)  # Must not be called
+    run_checks(function_config)
+
+
+def test_parsed_files_are_cached_on_disk(function_config, tmp_path, monkeypatch):
+    function_config.cache_dir = tmp_path
+    monkeypatch.setattr(checks, "_analysis_cache", {})
+    run_checks(function_config)
+    monkeypatch.setattr(checks, "_analysis_cache", {})  # E.g. the next run
+    monkeypatch.setattr(checks, "_analyze_source", None)
+    run_checks(function_config)
+    assert len(checks._analysis_cache) == 5
+
+
+def test_run_checks_in_parallel(function_config, monkeypatch):
+    monkeypatch.setattr(checks, "PARALLEL_MIN_FILES", 1)
+    monkeypatch.setattr(checks, "_analysis_cache", {})
+    run_checks(function_config)
+    assert len(checks._analysis_cache) == 5
+
+
+def test_concurrent_checks_parse_shared_files_once(function_config, monkeypatch):
+    monkeypatch.setattr(checks, "_analysis_cache", {})
+    analyze, parsed = checks._analyze_source, []
+
+    def slow_analyze(source, filename):
+        parsed.append(filename)
+        time.sleep(0.01)
+        return analyze(source, filename)
+
+    monkeypatch.setattr(checks, "_analyze_source", slow_analyze)
+    threads = [threading.Thread(target=run_checks, args=(function_config,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(parsed) == sorted(set(parsed)) and len(parsed) == 5
@@ -1,7 +1,8 @@
 import pytest
 from cognite.client.testing import monkeypatch_cognite_client
 
-from config import FunctionConfig
+import config
+from config import FunctionConfig, create_experimental_cognite_client
 
 
 def test_read_config_whitespace_cron(valid_config):
@@ -17,3 +18,61 @@ def test_bad_config__cdf_project_mismatch(loggedin_status, valid_config_dct):
         cdf_mock.login.status.return_value = loggedin_status
         with pytest.raises(ValueError):
             _ = FunctionConfig.parse_obj(valid_config_dct)
+
+
+def test_verified_logins_are_reused(loggedin_status, valid_config_dct, monkeypatch):
+    monkeypatch.setattr(config, "_verified_clients", {})
+    with monkeypatch_cognite_client() as cdf_mock:
+        cdf_mock.login.status.return_value = loggedin_status
+        tenant = FunctionConfig.parse_obj(valid_config_dct).tenant
+        assert cdf_mock.login.status.call_count == 2  # Deployment and runtime credentials
+        _ = FunctionConfig.parse_obj(valid_config_dct)
+        assert cdf_mock.login.status.call_count == 2
+
+        assert create_experimental_cognite_client(tenant) is cdf_mock
+
+
+@pytest.mark.parametrize("remove_only, valid", [(True, True), (False, False)])
+def test_remove_by_prefix_requires_remove_only(remove_only, valid, loggedin_status, valid_config_dct):
+    valid_config_dct.update(remove_only=remove_only, remove_by_prefix=True)
+    with monkeypatch_cognite_client() as cdf_mock:
+        cdf_mock.login.status.return_value = loggedin_status
+        if valid:
+            assert FunctionConfig.parse_obj(valid_config_dct).remove_by_prefix
+        else:
+            with pytest.raises(ValueError):
+                FunctionConfig.parse_obj(valid_config_dct)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "- name: no cron\n",
+        "- name: bad cron\n  cron: '* * *'\n",
+        "name: not a list\ncron: '* * * * *'\n",
+    ],
+)
+def test_bad_schedule_file(content, tmp_path, loggedin_status, valid_config_dct):
+    (tmp_path / "handler.py").write_text("def handle():\n    pass\n")
+    (tmp_path / "schedules.yml").write_text(content)
+    valid_config_dct.update(function_folder=tmp_path, schedule_file="schedules.yml")
+    with monkeypatch_cognite_client() as cdf_mock:
+        cdf_mock.login.status.return_value = loggedin_status
+        with pytest.raises(ValueError):
+            FunctionConfig.parse_obj(valid_config_dct)
+
+
+def test_schedules_are_parsed_once(valid_config, monkeypatch):
+    monkeypatch.setattr(config, "load_yaml", None)  # Must not be used
+    assert valid_config.schedules == valid_config.schedules
+    assert valid_config.schedules[0].name == f"{valid_config.external_id}:schedule_#1"
+    # Kept by copies (e.g. a forced redeploy of the same config):
+    assert valid_config.copy(update={"force_redeploy": True}).schedules == valid_config.schedules
+
+
+def test_schedules_can_not_be_given(loggedin_status, valid_config_dct):
+    valid_config_dct.update(schedules=[{"name": "unprefixed", "cron": "* * * * *"}])
+    with monkeypatch_cognite_client() as cdf_mock:
+        cdf_mock.login.status.return_value = loggedin_status
+        with pytest.raises(ValueError, match="schedule_file"):
+            FunctionConfig.parse_obj(valid_config_dct)
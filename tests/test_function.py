@@ -1,19 +1,49 @@
 import contextlib
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from unittest.mock import MagicMock, call, patch
+from zipfile import ZipFile
 
 import pytest
+from cognite.client.data_classes import DataSet, FileMetadata
+from cognite.client.exceptions import CogniteAPIError, CogniteNotFoundError
 from cognite.experimental.data_classes import Function
 
+import archive
+import function
+from archive import FIXED_DATE_TIME, _deflate, hash_archive
+from archive_report import ArchiveBudgetExceeded
+from checks import FunctionValidationError
 from config import DEPLOY_WAIT_TIME_SEC
 from function import (
+    DIGEST_METADATA_KEY,
+    MAX_BUILD_ATTEMPTS,
+    SIZE_METADATA_KEY,
     FunctionDeployError,
     FunctionDeployTimeout,
+    await_function_deletion,
     await_function_deployment,
+    check_unchanged_function,
+    compute_deploy_digest,
+    create_function,
     create_function_and_wait,
     delete_function,
+    delete_function_file,
+    delete_functions_by_prefix,
     delete_single_cognite_function,
+    delete_unused_code_file,
+    get_code_file_external_id,
     get_file_name,
+    get_function_description,
+    get_or_upload_code_file,
+    is_uploaded_code_file,
+    reserve_file,
     upload_and_create_function,
+    zip_folder,
 )
 
 # TODO: Tests need an overhaul / update
@@ -26,44 +56,124 @@ from function import (
         (["Failed"], 1, pytest.raises(FunctionDeployError)),
         (["Not ready", "Ready"], 6, contextlib.nullcontext()),
         (["Not ready", "Failed"], 6, pytest.raises(FunctionDeployError)),
+        (["Queued", "Deploying", "Ready"], 6, contextlib.nullcontext()),
+        (["Not ready", "Not ready"], 1, pytest.raises(FunctionDeployTimeout)),
     ],
 )
 def test_await_function_deployment(retrieve_status, wait_time_seconds, expectation, cognite_experimental_client_mock):
     responses = [
         Function(
-            status=status, error={"trace": "foo", "message": "bar"}, cognite_client=cognite_experimental_client_mock
+            external_id="",
+            status=status,
+            error={"trace": "foo", "message": "bar"},
+            cognite_client=cognite_experimental_client_mock,
         )
         for status in retrieve_status
     ]
-    cognite_experimental_client_mock.functions.retrieve.side_effect = responses
+    # First status is checked on retrieve, the rest are polled (batched) while waiting:
+    cognite_experimental_client_mock.functions.retrieve.return_value = responses[0]
+    cognite_experimental_client_mock.functions.retrieve_multiple.side_effect = [[r] for r in responses[1:]] + [
+        [responses[-1]]
+    ] * 10
     with expectation:
         r = await_function_deployment(cognite_experimental_client_mock, "", wait_time_seconds)
         assert isinstance(r, Function)
         assert r == responses[-1]
 
 
+@pytest.mark.parametrize("remove_schedules", [True, False])
+@patch("function.delete_function_schedules")
 @patch("function.delete_function")
 @patch("function.delete_function_file")
+@patch("function.delete_unused_code_file")
 def test_delete_single_cognite_function(
+    delete_unused_code_file_mock,
     delete_function_file_mock,
-    delete_function,
+    delete_function_mock,
+    delete_schedules_mock,
+    remove_schedules,
     cognite_experimental_client_mock,
 ):
-    file_name = "file/external_id"
-    delete_single_cognite_function(cognite_experimental_client_mock, file_name, remove_schedules=True)
+    xid = "file/external_id"
+    # Found, then gone when awaiting the deletion:
+    cognite_experimental_client_mock.functions.retrieve.side_effect = [Function(external_id=xid, file_id=1), None]
+    delete_single_cognite_function(cognite_experimental_client_mock, xid, remove_schedules=remove_schedules)
 
-    assert delete_function.call_args_list == [call(cognite_experimental_client_mock, file_name)]
+    assert delete_function_mock.call_args_list == [call(cognite_experimental_client_mock, xid)]
+    assert delete_unused_code_file_mock.call_args_list == [call(cognite_experimental_client_mock, 1, {xid})]
     assert delete_function_file_mock.call_args_list == [call(cognite_experimental_client_mock, "file-external_id.zip")]
+    assert delete_schedules_mock.called is remove_schedules
+    assert cognite_experimental_client_mock.functions.retrieve.call_count == 2
+
+
+@patch("function.time.sleep")
+def test_await_function_deletion(sleep_mock, cognite_experimental_client_mock):
+    cognite_experimental_client_mock.functions.retrieve.side_effect = [Function(external_id="id")] * 2 + [None]
+    await_function_deletion(cognite_experimental_client_mock, "id")
+    assert sleep_mock.call_count == 2
+
+    # Gives up (without raising) when the deadline is passed:
+    cognite_experimental_client_mock.functions.retrieve.side_effect = None
+    cognite_experimental_client_mock.functions.retrieve.return_value = Function(external_id="id")
+    await_function_deletion(cognite_experimental_client_mock, "id", wait_time_sec=0)
+
+
+@patch("function.delete_single_cognite_function")
+def test_delete_functions_by_prefix(delete_mock, cognite_experimental_client_mock):
+    functions = [Function(external_id=xid) for xid in ["preview-2", "preview-1", "other"]]
+    cognite_experimental_client_mock.functions.list.return_value = functions
+    deleted = delete_functions_by_prefix(cognite_experimental_client_mock, "preview-", remove_schedules=True)
+    assert deleted == ["preview-1", "preview-2"]
+    assert sorted(c.args[1] for c in delete_mock.call_args_list) == deleted
+    # Files shared between the deleted functions are deleted too:
+    assert {frozenset(c.kwargs["deleted_external_ids"]) for c in delete_mock.call_args_list} == {frozenset(deleted)}
 
 
 @pytest.mark.parametrize(
-    "function, expected_delete_calls",
-    [(Function(id=123), [call(external_id="some id")]), (None, [])],
+    "users, in_use, used_sec_ago, deleted",
+    [
+        ([], False, 3600, True),
+        (["old"], False, 3600, True),
+        (["old", "other"], False, 3600, False),
+        ([], True, 3600, False),
+        ([], False, 60, False),  # May be about to be used by another run
+    ],
 )
-def test_delete_function(function, expected_delete_calls, cognite_experimental_client_mock):
-    cognite_experimental_client_mock.functions.retrieve.return_value = function
-    delete_function(cognite_experimental_client_mock, "some id")
-    assert cognite_experimental_client_mock.functions.delete.call_args_list == expected_delete_calls
+def test_delete_unused_code_file(users, in_use, used_sec_ago, deleted, cognite_experimental_client_mock):
+    cognite_experimental_client_mock.functions.list.return_value = [Function(external_id=xid) for xid in users]
+    last_updated_time = int((time.time() - used_sec_ago) * 1000)
+    file_meta = FileMetadata(id=1, external_id="code.zip", last_updated_time=last_updated_time)
+    cognite_experimental_client_mock.files.retrieve.return_value = file_meta
+    with reserve_file("code.zip") if in_use else contextlib.nullcontext():
+        delete_unused_code_file(cognite_experimental_client_mock, 1, deleted_external_ids={"old"})
+    assert cognite_experimental_client_mock.files.delete.call_args_list == (
+        [call(id=1, external_id=None)] if deleted else []
+    )
+
+
+@pytest.mark.parametrize(
+    "error, file_meta, expectation",
+    [
+        (None, None, contextlib.nullcontext()),
+        (CogniteNotFoundError([{"externalId": "code.zip"}]), None, contextlib.nullcontext()),
+        (CogniteAPIError("Forbidden", 403), FileMetadata(id=1, data_set_id=2), contextlib.nullcontext()),
+        (CogniteAPIError("Forbidden", 403), FileMetadata(id=1), pytest.raises(CogniteAPIError)),
+    ],
+)
+def test_delete_function_file(error, file_meta, expectation, cognite_experimental_client_mock):
+    cognite_experimental_client_mock.files.delete.side_effect = error
+    cognite_experimental_client_mock.files.retrieve.return_value = file_meta
+    with expectation:
+        delete_function_file(cognite_experimental_client_mock, "code.zip")
+    assert cognite_experimental_client_mock.files.delete.call_args == call(id=None, external_id="code.zip")
+
+
+@pytest.mark.parametrize("error, existed", [(None, True), (CogniteNotFoundError([{"externalId": "id"}]), False)])
+def test_delete_function(error, existed, cognite_experimental_client_mock):
+    cognite_experimental_client_mock.functions.delete.side_effect = error
+    assert delete_function(cognite_experimental_client_mock, "id") is existed
+    assert cognite_experimental_client_mock.functions.delete.call_args == call(external_id="id")
+    cognite_experimental_client_mock.functions.retrieve.assert_not_called()
 
 
 @pytest.mark.parametrize(
@@ -84,22 +194,98 @@ def test_create_and_wait(await_function_deployment_mock, response, expectation,
         ]
 
 
-@pytest.mark.parametrize("exception", [FunctionDeployTimeout, FunctionDeployError])
-@patch("function.create_function_and_wait")
-@patch("function.delete_function_file")
+@pytest.mark.parametrize("exception, n_builds", [(FunctionDeployTimeout, 1), (FunctionDeployError, MAX_BUILD_ATTEMPTS)])
+@patch("function.await_function_deletion")
+@patch("function._await_until")
+@patch("function.create_function")
+@patch("function.delete_single_cognite_function")
+@patch("function.upload_folder_archive")
 def test_upload_and_create_function_exception(
-    delete_function_file_mock,
-    create_and_wait_mock,
-    cognite_client_mock,
+    upload_mock,
+    delete_single_mock,
+    create_mock,
+    await_mock,
+    await_deletion_mock,
+    valid_config,
     cognite_experimental_client_mock,
     exception,
-    valid_config,
+    n_builds,
 ):
-    create_and_wait_mock.side_effect = exception
-    cognite_client_mock.functions = cognite_experimental_client_mock.functions
+    await_mock.side_effect = exception
+    valid_config.force_redeploy = True
 
     with pytest.raises(exception):
-        upload_and_create_function(cognite_client_mock, valid_config)
+        upload_and_create_function(cognite_experimental_client_mock, valid_config)
+    # Failed builds are re-created from the same file, timeouts are not:
+    assert upload_mock.call_count == 1
+    assert create_mock.call_count == n_builds
+    assert await_deletion_mock.call_count == n_builds - 1  # Before re-creating with the same external ID
+
+
+@patch("retries.time.sleep")
+@patch("function._await_until")
+@patch("function.create_function")
+@patch("function.delete_single_cognite_function")
+@patch("function.upload_folder_archive")
+def test_upload_and_create_function_resumes_failed_phase(
+    upload_mock, delete_single_mock, create_mock, await_mock, sleep_mock, valid_config, cognite_experimental_client_mock
+):
+    upload_mock.return_value = 42
+    create_mock.side_effect = [CogniteAPIError("Service Unavailable", code=503), Function(external_id="id")]
+    await_mock.side_effect = [ConnectionError("Connection reset"), Function(external_id="id", status="Ready")]
+    valid_config.force_redeploy = True
+
+    function = upload_and_create_function(cognite_experimental_client_mock, valid_config)
+    assert function.status == "Ready"
+    assert upload_mock.call_count == delete_single_mock.call_count == 1
+    assert create_mock.call_count == await_mock.call_count == 2
+    assert {c.args[1] for c in create_mock.call_args_list} == {42}
+
+
+@patch("function.delete_single_cognite_function")
+@patch("function.upload_folder_archive")
+def test_upload_and_create_function_failing_checks(
+    upload_mock, delete_single_mock, valid_config, cognite_experimental_client_mock
+):
+    checks = Future()
+    checks.set_exception(FunctionValidationError("bad"))
+    with pytest.raises(FunctionValidationError):
+        upload_and_create_function(cognite_experimental_client_mock, valid_config, checks=checks)
+    # Aborted before anything was uploaded or deleted:
+    assert not upload_mock.called and not delete_single_mock.called
+    assert not cognite_experimental_client_mock.functions.create.called
+
+
+@pytest.mark.parametrize("failing", ["dataset", "file"])
+@patch("function.retrieve_dataset")
+@patch("function.delete_single_cognite_function")
+def test_upload_and_create_function_failing_lookups(
+    delete_single_mock, retrieve_dataset_mock, failing, valid_config, cognite_experimental_client_mock
+):
+    valid_config.force_redeploy = True
+    valid_config.data_set_external_id = "data-set"
+    if failing == "dataset":
+        retrieve_dataset_mock.side_effect = ValueError("No dataset exists with external ID: 'data-set'")
+    retrieve_dataset_mock.return_value = DataSet(id=1, external_id="data-set")
+    if failing == "file":
+        cognite_experimental_client_mock.files.retrieve.side_effect = CogniteAPIError("Forbidden", 403)
+    with pytest.raises((ValueError, CogniteAPIError)):
+        upload_and_create_function(cognite_experimental_client_mock, valid_config)
+    # Aborted before the old function was torn down:
+    assert not delete_single_mock.called
+    assert not cognite_experimental_client_mock.files.create.called
+
+
+def test_create_function_reattaches(valid_config, cognite_experimental_client_mock):
+    functions = cognite_experimental_client_mock.functions
+    functions.create.side_effect = CogniteAPIError("Function externalId duplicated", code=409)
+    functions.retrieve.return_value = existing = Function(
+        external_id="id", file_id=1, description=get_function_description("digest")
+    )
+    assert create_function(cognite_experimental_client_mock, 1, valid_config, "id", "digest") is existing
+    # Not created by us (different file), so we do not re-attach:
+    with pytest.raises(CogniteAPIError):
+        create_function(cognite_experimental_client_mock, 2, valid_config, "id", "digest")
 
 
 @pytest.mark.parametrize(
@@ -108,3 +294,216 @@ def test_upload_and_create_function_exception(
 )
 def test_get_file_name(function_name, file_name):
     assert get_file_name(function_name) == file_name
+
+
+def test_compute_deploy_digest(valid_config):
+    with zip_folder(valid_config) as archive:
+        code_digest = hash_archive(archive)
+        assert archive.tell() == 0  # Ready for upload
+        with zip_folder(valid_config, spool_max_size=1) as archive_on_disk:
+            assert code_digest == hash_archive(archive_on_disk)
+
+    digest = compute_deploy_digest(code_digest, valid_config)
+    for field, value in [("memory", 2.0), ("data_set_external_id", "other-data-set")]:
+        changed = valid_config.copy(update={field: value})
+        assert digest != compute_deploy_digest(code_digest, changed)
+    # Secrets are only included as keyed hashes:
+    other_key = valid_config.tenant.copy(update={"cdf_deployment_credentials": "OTHER_KEY"})
+    assert digest != compute_deploy_digest(code_digest, valid_config.copy(update={"tenant": other_key}))
+
+
+@pytest.mark.parametrize(
+    "status, file_exists, stored_digest, unchanged",
+    [
+        ("Ready", True, "digest", True),
+        ("Deploying", True, "digest", False),
+        ("Ready", False, "digest", False),
+        ("Ready", True, "other digest", False),
+    ],
+)
+def test_check_unchanged_function(status, file_exists, stored_digest, unchanged, cognite_experimental_client_mock):
+    function = Function(external_id="id", status=status, file_id=1, description=get_function_description(stored_digest))
+    cognite_experimental_client_mock.files.retrieve.return_value = FileMetadata(id=1) if file_exists else None
+    result = check_unchanged_function(cognite_experimental_client_mock, function, "digest")
+    assert (result is function) is unchanged
+    assert check_unchanged_function(cognite_experimental_client_mock, None, "digest") is None
+
+
+def test_check_unchanged_function_with_known_file(cognite_experimental_client_mock):
+    function = Function(external_id="id", status="Ready", file_id=1, description=get_function_description("digest"))
+    assert check_unchanged_function(cognite_experimental_client_mock, function, "digest", known_file_id=1) is function
+    assert not cognite_experimental_client_mock.files.retrieve.called
+
+
+def test_zip_folder_cache(valid_config, tmp_path, monkeypatch):
+    valid_config.cache_dir = tmp_path
+    with zip_folder(valid_config) as archive:
+        code_digest = hash_archive(archive)
+    (cached,) = (tmp_path / "archives").iterdir()
+
+    monkeypatch.setattr("function.ArchiveWriter", None)  # Must not be used
+    with zip_folder(valid_config) as archive:
+        assert archive.name == str(cached)
+        assert hash_archive(archive) == code_digest
+
+
+def test_zip_folder_reuses_previous_archive(valid_config, tmp_path, caplog):
+    folder = tmp_path / "function"
+    folder.mkdir()
+    for name in ["handler.py", "a.py", "b.py"]:
+        (folder / name).write_text(f"# {name}\n" * 100)
+    config = valid_config.copy(update={"function_folder": folder, "cache_dir": tmp_path / "cache"})
+    with zip_folder(config):
+        pass
+
+    (folder / "a.py").write_text("# changed\n")
+    with caplog.at_level(logging.INFO), zip_folder(config) as archive, ZipFile(archive) as zf:
+        assert zf.read("a.py") == b"# changed\n"
+    assert "Reused 2 of 3 compressed file(s)" in caplog.text
+
+
+@pytest.fixture
+def code_folders(tmp_path):
+    folder, common = tmp_path / "function", tmp_path / "common"
+    (folder / "pkg").mkdir(parents=True)
+    common.mkdir()
+    (folder / "handler.py").write_text("def handle():\n    pass\n" * 100)
+    (folder / "pkg" / "model.pkl").write_bytes(os.urandom(1000))
+    for i in range(20):
+        (folder / "pkg" / f"module_{i}.py").write_text(f"VALUE = {i}\n" * 100)
+    (common / "utils.py").write_text("def helper(x):\n    return x\n" * 100)
+    return folder, common
+
+
+def test_zip_folder_is_reproducible(valid_config, code_folders, monkeypatch):
+    folder, common = code_folders
+    config = valid_config.copy(update={"function_folder": folder, "common_folder": common})
+    monkeypatch.setattr(archive, "PARALLEL_MAX_FILE_SIZE", 1000)  # Some files are written by ZipFile
+
+    def build(max_workers):
+        monkeypatch.setattr(os, "cpu_count", lambda: max_workers)
+        with zip_folder(config) as zipped:
+            return zipped.read()
+
+    first = build(max_workers=4)
+    for path in [*folder.rglob("*"), *common.rglob("*")]:
+        os.utime(path, (0, 1234567890))
+    assert build(max_workers=1) == first
+
+    with ZipFile(io.BytesIO(first)) as zf:
+        assert zf.testzip() is None
+        assert not any(info.is_dir() for info in zf.infolist())
+        assert {info.date_time for info in zf.infolist()} == {FIXED_DATE_TIME}
+        assert zf.namelist()[:3] == ["handler.py", "pkg/model.pkl", "pkg/module_0.py"]
+        assert zf.read("common/utils.py") == (common / "utils.py").read_bytes()
+
+
+def test_zip_folder_reuses_shared_entries(valid_config, code_folders, tmp_path, monkeypatch):
+    folder, common = code_folders
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "handler.py").write_text("def handle():\n    return 42\n")
+    monkeypatch.setattr(archive, "_shared_cache", archive._DeflateCache(max_size=10_000))
+    deflated = []
+    monkeypatch.setattr(archive, "_deflate", lambda path, level: deflated.append(path) or _deflate(path, level))
+
+    def build(function_folder):
+        config = valid_config.copy(update={"function_folder": function_folder, "common_folder": common})
+        with zip_folder(config) as zipped, ZipFile(zipped) as zf:
+            return zf.read("common/utils.py")
+
+    build(folder), build(other)
+    assert deflated.count(common / "utils.py") == 1  # Compressed once, for both functions
+
+    # Modified files are compressed again:
+    (common / "utils.py").write_text("changed")
+    assert build(other) == b"changed"
+
+
+def test_zip_folder_vendors_wheels(valid_config, tmp_path):
+    folder, wheelhouse = tmp_path / "function", tmp_path / "wheelhouse"
+    folder.mkdir(), wheelhouse.mkdir()
+    (folder / "handler.py").write_text("import alpha\n")
+    (folder / "requirements.txt").write_text("alpha==1.0\nnumpy\n")
+    with ZipFile(wheelhouse / "alpha-1.0-py3-none-any.whl", "w") as zf:
+        zf.writestr("alpha/__init__.py", "")
+        zf.writestr("alpha-1.0.dist-info/METADATA", "Metadata-Version: 2.1\nName: alpha\nVersion: 1.0\n")
+    config = valid_config.copy(update={"function_folder": folder, "wheelhouse_dir": wheelhouse})
+
+    with zip_folder(config) as archive, ZipFile(archive) as zf:
+        assert {"handler.py", "alpha/__init__.py", "requirements.txt"} <= set(zf.namelist())
+        assert zf.read("requirements.txt").decode().splitlines()[1:] == ["numpy"]
+
+
+def test_upload_and_create_function_fails_on_size_budget(valid_config, cognite_experimental_client_mock):
+    valid_config.max_unpacked_size_mb = 0.001
+    with pytest.raises(ArchiveBudgetExceeded):
+        upload_and_create_function(cognite_experimental_client_mock, valid_config)
+    # Nothing was uploaded nor deleted:
+    assert not cognite_experimental_client_mock.files.create.called
+    assert not cognite_experimental_client_mock.functions.delete.called
+
+
+@pytest.mark.parametrize(
+    "existing, uploaded",
+    [
+        (None, False),
+        (FileMetadata(id=1, uploaded=True, metadata={DIGEST_METADATA_KEY: "code", SIZE_METADATA_KEY: "42"}), True),
+        (FileMetadata(id=1, uploaded=False, metadata={DIGEST_METADATA_KEY: "code", SIZE_METADATA_KEY: "42"}), False),
+        (FileMetadata(id=1, uploaded=True, metadata={DIGEST_METADATA_KEY: "other", SIZE_METADATA_KEY: "42"}), False),
+        (FileMetadata(id=1, uploaded=True, metadata={DIGEST_METADATA_KEY: "code", SIZE_METADATA_KEY: "0"}), False),
+        (FileMetadata(id=1, uploaded=True, metadata={DIGEST_METADATA_KEY: "code"}), False),  # Size unknown
+    ],
+)
+def test_is_uploaded_code_file(existing, uploaded):
+    assert is_uploaded_code_file(existing, "code", 42) is uploaded
+
+
+def test_get_code_file_external_id():
+    # Content-addressed, so the same code (and data set) gives the same file:
+    name = get_code_file_external_id("code", "data-set")
+    assert name == get_code_file_external_id("code", "data-set")
+    assert name != get_code_file_external_id("code", "other-data-set")
+
+
+@pytest.mark.parametrize("touched, uploads", [(True, 0), (False, 1)])
+@patch("function.upload_folder_archive")
+def test_get_or_upload_code_file_reuses_uploaded_file(
+    upload_mock, touched, uploads, valid_config, cognite_experimental_client_mock
+):
+    upload_mock.return_value = 2
+    archive = io.BytesIO(b"zipped")
+    metadata = {DIGEST_METADATA_KEY: "code", SIZE_METADATA_KEY: "6"}
+    cognite_experimental_client_mock.files.retrieve.return_value = FileMetadata(id=1, uploaded=True, metadata=metadata)
+    # Marked as used before it is reused, unless deleted in the meantime:
+    files_update = cognite_experimental_client_mock.files.update
+    files_update.side_effect = lambda update: FileMetadata(id=1, uploaded=True, metadata=metadata)
+    if not touched:
+        files_update.side_effect = CogniteNotFoundError([{"id": 1}])
+
+    file_id = get_or_upload_code_file(cognite_experimental_client_mock, valid_config, "code.zip", archive, "code")
+    assert file_id == (1 if touched else 2)
+    assert upload_mock.call_count == uploads
+    assert files_update.call_args.args[0].dump()["update"]["metadata"]["add"].keys() == {"function-action-used-at"}
+
+
+@patch("function.upload_folder_archive")
+def test_get_or_upload_code_file_shares_uploads(upload_mock, valid_config, cognite_experimental_client_mock, caplog):
+    cognite_experimental_client_mock.files.retrieve.return_value = None
+    release = threading.Event()
+    upload_mock.side_effect = lambda *args: release.wait(timeout=5) and 1
+
+    def deploy():
+        return get_or_upload_code_file(cognite_experimental_client_mock, valid_config, "code.zip", io.BytesIO(), "c")
+
+    with caplog.at_level(logging.INFO), ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(deploy)
+        while not upload_mock.called:
+            time.sleep(0.01)
+        second = executor.submit(deploy)
+        while "is being uploaded by another deployment" not in caplog.text:
+            time.sleep(0.01)
+        release.set()
+        assert first.result() == second.result() == 1
+    assert upload_mock.call_count == 1
+    assert not function._code_file_uploads
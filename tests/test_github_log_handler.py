@@ -0,0 +1,106 @@
+import io
+import logging
+import threading
+
+import pytest
+
+from github_log_handler import (
+    RATE_LIMITED,
+    REPEAT_BURST,
+    GitHubLogHandler,
+    install_github_log_handler,
+    log_group,
+    stop_github_log_handler,
+)
+from timing import bind_span, span
+
+
+@pytest.fixture
+def github_log(monkeypatch):
+    logger = logging.getLogger("github-log-test")
+    logger.setLevel(logging.INFO)
+    monkeypatch.setattr(logger, "propagate", False)
+    stream = io.StringIO()
+    install_github_log_handler(logger, stream)
+    group_logger = logging.getLogger("github.group")
+    monkeypatch.setattr(group_logger, "level", logging.INFO)
+    monkeypatch.setattr(group_logger, "propagate", False)
+    monkeypatch.setattr(group_logger, "handlers", logger.handlers)  # Group markers are logged by their own logger
+    try:
+        yield logger, stream
+    finally:
+        stop_github_log_handler()
+
+
+def test_format():
+    handler = GitHubLogHandler()
+    record = logging.LogRecord("function", logging.WARNING, "/src/function.py", 42, "Careful!", (), None)
+    assert handler.format(record) == "::warning file=function.py,line=42::function: Careful!"
+    record.levelno = logging.INFO
+    assert handler.format(record) == "function: Careful!"  # Not an annotation
+
+
+def test_concurrent_groups_are_not_interleaved(github_log):
+    logger, stream = github_log
+    a_ended = threading.Event()
+
+    def deploy(name, wait_for):
+        with log_group(name), span(name):
+            logger.info(f"{name}: first")
+            wait_for.wait()
+            worker = threading.Thread(target=bind_span(logger.info), args=(f"{name}: from worker",))
+            worker.start()
+            worker.join()
+
+    b = threading.Thread(target=deploy, args=("deploy:b", a_ended))
+    with log_group("deploy:a"), span("deploy:a"):
+        b.start()
+        logger.info("deploy:a: first")
+        # Lines of threads without a span are not part of the live group, so they are written after it:
+        ungrouped = threading.Thread(target=logger.info, args=("ungrouped",))
+        ungrouped.start()
+        ungrouped.join()
+    a_ended.set()
+    b.join()
+    stop_github_log_handler()
+
+    lines = stream.getvalue().splitlines()
+    assert lines[:4] == [
+        "::group::deploy:a",
+        "github-log-test: deploy:a: first",
+        "::endgroup::",
+        "github-log-test: ungrouped",
+    ]
+    # Group 'deploy:b' started while 'deploy:a' was live, so its lines were held back until then:
+    assert lines[4:8] == [
+        "::group::deploy:b",
+        "github-log-test: deploy:b: first",
+        "github-log-test: deploy:b: from worker",
+        "::endgroup::",
+    ]
+    assert lines[8].startswith("Log summary: 0 warning(s), 0 error(s)")
+
+
+def test_repeated_lines_are_suppressed(github_log):
+    logger, stream = github_log
+    for i in range(REPEAT_BURST + 3):
+        logger.info(f"Uploaded {i} MB of 10 MB", extra=RATE_LIMITED)
+    logger.warning("Something else")
+    stop_github_log_handler()
+
+    lines = stream.getvalue().splitlines()
+    assert len([line for line in lines if "Uploaded" in line]) == REPEAT_BURST
+    assert lines[-1] == "Log summary: 1 warning(s), 0 error(s), 3 repeated line(s) suppressed"
+
+
+def test_distinct_numbered_lines_are_not_suppressed(github_log):
+    logger, stream = github_log
+    for i in range(REPEAT_BURST + 3):
+        logger.info(f"- fn-{i}: Deployed (ID: {1000 + i})")
+    stop_github_log_handler()
+
+    lines = stream.getvalue().splitlines()
+    assert [line for line in lines if "fn-" in line] == [
+        f"github-log-test: - fn-{i}: Deployed (ID: {1000 + i})" for i in range(REPEAT_BURST + 3)
+    ]
+    assert lines[-1] == "Log summary: 0 warning(s), 0 error(s), 0 repeated line(s) suppressed"
@@ -0,0 +1,47 @@
+import pytest
+
+from ignore import ExcludedStats, IgnoreMatcher, walk_included
+
+
+@pytest.mark.parametrize(
+    "patterns, path, is_dir, ignored",
+    [
+        (["*.csv"], "data/big.csv", False, True),
+        (["*.csv"], "data.csv.py", False, False),
+        (["/data"], "data", True, True),
+        (["/data"], "sub/data", True, False),
+        (["data/"], "sub/data", True, True),
+        (["data/"], "sub/data", False, False),
+        (["docs/*.md"], "docs/index.md", False, True),
+        (["docs/*.md"], "docs/sub/index.md", False, False),
+        (["**/fixtures"], "a/b/fixtures", True, True),
+        (["tests/**"], "tests/unit/test_x.py", False, True),
+        (["*.log", "!keep.log"], "keep.log", False, False),
+        (["*.log", "!keep.log"], "other.log", False, True),
+        (["!keep.log", "*.log"], "keep.log", False, True),
+        (["# comment", "", "file[0-9].txt"], "file7.txt", False, True),
+        (["file[!0-9].txt"], "file7.txt", False, False),
+    ],
+)
+def test_ignore_matcher(patterns, path, is_dir, ignored):
+    assert IgnoreMatcher(patterns).is_ignored(path, is_dir) is ignored
+
+
+def test_walk_included_prunes_ignored_directories(tmp_path):
+    (tmp_path / "pkg" / "__pycache__").mkdir(parents=True)
+    (tmp_path / "node_modules" / "dep").mkdir(parents=True)
+    (tmp_path / "handler.py").write_text("")
+    (tmp_path / "pkg" / "util.py").write_text("")
+    (tmp_path / "pkg" / "util.pyc").write_bytes(b"12345")
+    (tmp_path / "pkg" / "__pycache__" / "util.cpython-38.pyc").write_bytes(b"")
+    (tmp_path / "node_modules" / "dep" / "index.js").write_text("")
+    (tmp_path / ".functionignore").write_text("node_modules/\n")
+
+    stats = ExcludedStats()
+    matcher = IgnoreMatcher.from_folder(tmp_path)
+    walked = {
+        dirpath.relative_to(tmp_path).as_posix(): sorted(files)
+        for dirpath, files in walk_included(tmp_path, matcher, stats)
+    }
+    assert walked == {".": [".functionignore", "handler.py"], "pkg": ["util.py"]}
+    assert stats == ExcludedStats(files=1, bytes=5, directories=2)
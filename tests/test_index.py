@@ -0,0 +1,14 @@
+import subprocess  # nosec
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def test_sdk_is_not_imported_on_startup():
+    # The SDKs are imported on first use, so that startup (and failing on invalid inputs) is fast:
+    script = "import sys, index; print(sorted({m.split('.')[0] for m in sys.modules} & {'cognite', 'pandas'}))"
+    res = subprocess.run(
+        [sys.executable, "-c", script], cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )  # nosec
+    assert res.stdout.strip() == "[]"
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+from cognite.client.exceptions import CogniteAPIError
+from cognite.experimental.data_classes import Function
+
+from poller import Backoff, FunctionStatusPoller
+
+
+def test_backoff_is_capped():
+    backoff = Backoff(initial_delay=1, max_delay=4, factor=2, jitter=0)
+    assert [backoff.next_delay() for _ in range(4)] == [1, 2, 4, 4]
+    assert backoff.next_delay(cap=0.5) == 0.5
+    backoff.reset()
+    assert backoff.next_delay() == 1
+
+
+def test_poller_batches_status_checks(cognite_experimental_client_mock):
+    external_ids = ["fn-1", "fn-2", "fn-3"]
+    # Status of each function, given the number of times it has been polled:
+    statuses = {"fn-1": ["Queued", "Ready"], "fn-2": ["Queued", "Deploying", "Ready"], "fn-3": ["Failed"]}
+    calls = []
+
+    def retrieve_multiple(external_ids):
+        calls.append(external_ids)
+        n_polls = {xid: sum(xid in call for call in calls) for xid in external_ids}
+        return [
+            Function(external_id=xid, status=statuses[xid][min(n_polls[xid], len(statuses[xid])) - 1])
+            for xid in external_ids
+        ]
+
+    cognite_experimental_client_mock.functions.retrieve_multiple.side_effect = retrieve_multiple
+    poller = FunctionStatusPoller(cognite_experimental_client_mock, Backoff(initial_delay=0.05, jitter=0))
+    results = {}
+
+    def wait(xid):
+        results[xid] = poller.wait(xid, wait_time_sec=5)
+
+    threads = [threading.Thread(target=wait, args=(xid,)) for xid in external_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert {xid: fn.status for xid, fn in results.items()} == {"fn-1": "Ready", "fn-2": "Ready", "fn-3": "Failed"}
+    assert max(len(call) for call in calls) > 1
+
+
+def test_poller_retries_transient_errors(cognite_experimental_client_mock):
+    retrieve_multiple = cognite_experimental_client_mock.functions.retrieve_multiple
+    retrieve_multiple.side_effect = [
+        CogniteAPIError("Service unavailable", code=503),
+        ConnectionError("reset"),
+        [Function(external_id="fn-1", status="Ready")],
+    ]
+    poller = FunctionStatusPoller(cognite_experimental_client_mock, Backoff(initial_delay=0.01, jitter=0))
+    assert poller.wait("fn-1", wait_time_sec=5).status == "Ready"
+
+    retrieve_multiple.side_effect = CogniteAPIError("Forbidden", code=403)
+    with pytest.raises(CogniteAPIError):
+        poller.wait("fn-1", wait_time_sec=5)
@@ -0,0 +1,47 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from cognite.client.exceptions import CogniteAPIError
+
+from retries import RATE_LIMITED_MIN_DELAY_SEC, is_transient, retry_phase
+
+
+@pytest.mark.parametrize(
+    "exc, transient",
+    [
+        (CogniteAPIError("Too Many Requests", code=429), True),
+        (CogniteAPIError("Bad Gateway", code=502), True),
+        (CogniteAPIError("Forbidden", code=403), False),
+        (ConnectionError("reset"), True),
+        (requests.exceptions.ReadTimeout("read timed out"), True),
+        (FileNotFoundError("handler.py"), False),
+        (PermissionError("denied"), False),
+        (ValueError("bad input"), False),
+    ],
+)
+def test_is_transient(exc, transient):
+    assert is_transient(exc) is transient
+
+
+@patch("retries.time.sleep")
+def test_retry_phase(sleep_mock):
+    fn = MagicMock(side_effect=[CogniteAPIError("Too Many Requests", code=429), ConnectionError("reset"), "done"])
+    assert retry_phase("upload", fn, 1, key="value") == "done"
+    assert fn.call_count == 3
+    assert fn.call_args.args == (1,) and fn.call_args.kwargs == {"key": "value"}
+    # Rate limited calls back off for longer:
+    assert sleep_mock.call_args_list[0].args[0] >= RATE_LIMITED_MIN_DELAY_SEC
+
+
+@patch("retries.time.sleep")
+def test_retry_phase_gives_up(sleep_mock):
+    fn = MagicMock(side_effect=ConnectionError("reset"))
+    with pytest.raises(ConnectionError):
+        retry_phase("upload", fn, max_attempts=3)
+    assert fn.call_count == 3
+
+    fn = MagicMock(side_effect=CogniteAPIError("Forbidden", code=403))
+    with pytest.raises(CogniteAPIError):
+        retry_phase("upload", fn)
+    assert fn.call_count == 1
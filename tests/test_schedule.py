@@ -1,6 +1,9 @@
 from unittest.mock import MagicMock, call
 
-from schedule import deploy_schedules
+from cognite.experimental.data_classes import Function, FunctionSchedule
+
+from config import ScheduleConfig
+from schedule import deploy_schedules, reconcile_schedules
 
 
 def test_deploy_schedules(cognite_experimental_client_mock, valid_config):
@@ -17,3 +20,27 @@ def test_deploy_schedules(cognite_experimental_client_mock, valid_config):
             data=valid_config.schedules[0].data,
         )
     ]
+
+
+def test_reconcile_schedules(cognite_experimental_client_mock):
+    function = Function(external_id="fn")
+    existing = [
+        FunctionSchedule(id=1, name="fn:unchanged", cron_expression="0 * * * *"),
+        FunctionSchedule(id=2, name="fn:new-cron", cron_expression="0 * * * *"),
+        FunctionSchedule(id=3, name="fn:new-data", cron_expression="0 * * * *"),
+        FunctionSchedule(id=4, name="fn:removed", cron_expression="0 * * * *"),
+    ]
+    schedules = [
+        ScheduleConfig(name="fn:unchanged", cron="0 * * * *", data={"a": 1}),
+        ScheduleConfig(name="fn:new-cron", cron="1 * * * *"),
+        ScheduleConfig(name="fn:new-data", cron="0 * * * *", data={"b": 2}),
+    ]
+    schedules_api = cognite_experimental_client_mock.functions.schedules
+    schedules_api.list.return_value = existing
+    schedules_api.get_input_data.side_effect = lambda id: {1: {"a": 1}, 3: {"b": 1}}[id]
+
+    reconcile_schedules(cognite_experimental_client_mock, function, schedules)
+
+    assert sorted(c.args[0] for c in schedules_api.get_input_data.call_args_list) == [1, 3]
+    assert sorted(c.kwargs["name"] for c in schedules_api.create.call_args_list) == ["fn:new-cron", "fn:new-data"]
+    assert sorted(c.args[0] for c in schedules_api.delete.call_args_list) == [2, 3, 4]
@@ -0,0 +1,69 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from timing import HTTP_REQUEST_LOG_FORMAT, PhaseRecorder, _CountingFilter, summarize, write_report
+
+
+def test_spans_nest_per_thread():
+    recorder = PhaseRecorder()
+
+    def deploy(name):
+        with recorder.span(f"deploy:{name}"):
+            with recorder.span("upload") as upload_span:
+                upload_span.bytes = 42
+                recorder.count(api_calls=2)
+            recorder.count(retries=1)
+
+    threads = [threading.Thread(target=deploy, args=(name,)) for name in "ab"]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    recorder.count(api_calls=1)  # Outside of any span
+
+    report = recorder.report()
+    spans = {s["name"]: s for s in report["spans"]}
+    assert set(spans) == {"deploy:a", "deploy:a/upload", "deploy:b", "deploy:b/upload"}
+    assert spans["deploy:a/upload"]["bytes"] == 42
+    assert spans["deploy:a/upload"]["api_calls"] == 2
+    assert spans["deploy:a"]["api_calls"] == 2
+    assert spans["deploy:a"]["retries"] == 1
+    assert report["total_api_calls"] == 5
+    assert report["total_retries"] == 2
+    assert report["unattributed_api_calls"] == 1
+
+
+def test_failed_span_is_recorded():
+    recorder = PhaseRecorder()
+    with pytest.raises(ValueError):
+        with recorder.span("checks"):
+            raise ValueError("bad")
+    (span,) = recorder.report()["spans"]
+    assert span["error"] == "ValueError('bad')"
+    assert span["duration"] is not None
+
+
+def test_counting_filter():
+    recorder = PhaseRecorder()
+    counting_filter = _CountingFilter(recorder)
+    request = logging.LogRecord("urllib3", logging.DEBUG, "", 0, HTTP_REQUEST_LOG_FORMAT, (), None)
+    retry = logging.LogRecord("urllib3", logging.WARNING, "", 0, "Retrying (%r) after connection broken", (), None)
+    with recorder.span("upload"):
+        assert counting_filter.filter(request) is False  # Dropped, only enabled for counting
+        assert counting_filter.filter(retry) is True
+
+    (span,) = recorder.report()["spans"]
+    assert (span["api_calls"], span["retries"]) == (1, 1)
+
+
+def test_write_report(tmp_path):
+    recorder = PhaseRecorder()
+    for _ in range(2):  # E.g. retried
+        with recorder.span("zip"):
+            pass
+    report = write_report(tmp_path / "report.json", recorder)
+    assert json.loads((tmp_path / "report.json").read_text()) == report
+    assert set(summarize(report)) == {"zip"}
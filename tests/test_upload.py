@@ -0,0 +1,140 @@
+import io
+from unittest.mock import MagicMock, patch
+
+import pytest
+from cognite.client.data_classes import FileMetadata
+from cognite.client.exceptions import CogniteAPIError
+
+import upload
+from retries import retry_phase
+from upload import (
+    CHUNK_ALIGNMENT,
+    READ_BLOCK_SIZE,
+    ResumableUpload,
+    UploadSessionExpired,
+    _ThrottledReader,
+    upload_file,
+    upload_file_in_chunks,
+)
+
+
+class FakeStorage:
+    """Fake session for an upload URL, keeping the bytes received. 'failures' are raised (or returned) in turn"""
+
+    def __init__(self, failures=()):
+        self.received = bytearray()
+        self.failures = list(failures)
+        self.content_ranges = []
+
+    def put(self, url, data=None, headers=None, timeout=None):
+        self.content_ranges.append(headers["Content-Range"])
+        res = MagicMock(headers={}, text="")
+        if self.failures and (failure := self.failures.pop(0)) is not None:
+            if isinstance(failure, Exception):
+                if data is not None:
+                    self.received += data.read(len(data) // 3)  # Connection dropped part-way
+                raise failure
+            res.status_code = failure
+            return res
+        total = int(headers["Content-Range"].rsplit("/", 1)[1])
+        if data is not None:
+            while block := data.read():
+                self.received += block
+        if len(self.received) == total:
+            res.status_code = 200
+        else:
+            res.status_code = 308
+            res.headers = {"Range": f"bytes=0-{len(self.received) - 1}"} if self.received else {}
+        return res
+
+
+@pytest.fixture
+def content():
+    return io.BytesIO(bytes(range(256)) * (CHUNK_ALIGNMENT * 5 // 256 + 3))  # 5 chunks and a bit
+
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    with patch("upload.time.sleep") as sleep_mock:
+        yield sleep_mock
+
+
+def test_upload_in_chunks(content):
+    storage = FakeStorage()
+    total = len(content.getvalue())
+    ResumableUpload("url", total, 2 * CHUNK_ALIGNMENT, session=storage).upload(content)
+    assert storage.received == content.getvalue()
+    assert storage.content_ranges == [
+        f"bytes 0-{2 * CHUNK_ALIGNMENT - 1}/{total}",
+        f"bytes {2 * CHUNK_ALIGNMENT}-{4 * CHUNK_ALIGNMENT - 1}/{total}",
+        f"bytes {4 * CHUNK_ALIGNMENT}-{total - 1}/{total}",
+    ]
+
+
+def test_upload_retries_chunk_from_received_offset(content):
+    storage = FakeStorage(failures=[None, ConnectionError("reset"), 503])
+    total = len(content.getvalue())
+    ResumableUpload("url", total, 2 * CHUNK_ALIGNMENT, session=storage).upload(content)
+    assert storage.received == content.getvalue()
+    # After the failures, the server is asked how much it got, and the upload continues from there:
+    assert storage.content_ranges[2:4] == [f"bytes */{total}", f"bytes */{total}"]
+    resumed_at = 2 * CHUNK_ALIGNMENT + min(2 * CHUNK_ALIGNMENT // 3, READ_BLOCK_SIZE)
+    assert storage.content_ranges[4] == f"bytes {resumed_at}-{resumed_at + 2 * CHUNK_ALIGNMENT - 1}/{total}"
+
+
+def test_upload_fails_on_expired_session_or_client_error(content):
+    total = len(content.getvalue())
+    with pytest.raises(UploadSessionExpired):
+        ResumableUpload("url", total, CHUNK_ALIGNMENT, session=FakeStorage(failures=[410])).upload(content)
+    with pytest.raises(CogniteAPIError):
+        ResumableUpload("url", total, CHUNK_ALIGNMENT, session=FakeStorage(failures=[403])).upload(content)
+
+    with pytest.raises(ValueError):
+        ResumableUpload("url", total, CHUNK_ALIGNMENT + 1)
+
+
+def test_throttled_reader(no_sleep):
+    reader = _ThrottledReader(io.BytesIO(b"x" * 1000), 800, max_bytes_per_sec=100)
+    assert len(reader) == 800
+    assert len(reader.read(500)) == 500 and len(reader.read()) == 300 and reader.read() == b""
+    # Reading 800 bytes at 100 bytes/s takes about 8 seconds:
+    assert 7.9 < no_sleep.call_args.args[0] <= 8
+
+
+def test_upload_file_in_chunks_resumes_on_next_call(content, monkeypatch):
+    storage = FakeStorage(failures=[None] + [ConnectionError("reset")] * 5)
+    monkeypatch.setattr(upload.requests, "Session", lambda: storage)
+    client = MagicMock()
+    client.files.create.return_value = FileMetadata(id=42, external_id="fn.zip"), "url"
+    file_meta = FileMetadata(external_id="fn.zip", name="fn.zip")
+
+    with pytest.raises(ConnectionError):
+        upload_file_in_chunks(client, content, file_meta, 2 * CHUNK_ALIGNMENT)
+    assert upload_file_in_chunks(client, content, file_meta, 2 * CHUNK_ALIGNMENT).id == 42
+    assert storage.received == content.getvalue()
+    client.files.create.assert_called_once_with(file_meta, overwrite=True)
+    assert upload._sessions == {}
+
+
+def test_upload_file_is_retried_from_the_start(content, monkeypatch):
+    stored, attempts = {}, []
+
+    def put(url, data=None, timeout=None):
+        attempts.append(len(data))
+        body = data.read(len(data) // 3)
+        if len(attempts) == 1:
+            return MagicMock(status_code=503, text="Unavailable", headers={})  # Body is not stored
+        while block := data.read():
+            body += block
+        stored[url] = body
+        return MagicMock(status_code=200)
+
+    monkeypatch.setattr(upload.requests, "put", put)
+    monkeypatch.setattr("retries.time.sleep", lambda _: None)
+    client = MagicMock()
+    client.files.create.return_value = FileMetadata(id=42, external_id="fn.zip"), "url"
+    file_meta = FileMetadata(external_id="fn.zip", name="fn.zip")
+
+    assert retry_phase("upload", upload_file, client, content, file_meta).id == 42
+    assert attempts == [len(content.getvalue())] * 2
+    assert stored["url"] == content.getvalue()
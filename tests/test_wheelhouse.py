@@ -0,0 +1,81 @@
+from zipfile import ZipFile
+
+import pytest
+
+from requirements import read_requirement_lines
+from wheelhouse import index_wheelhouse, plan_vendoring, satisfies, vendor_requirements
+
+
+def make_wheel(wheelhouse, name, version, requires=(), tag="py3-none-any", files=None):
+    path = wheelhouse / f"{name}-{version}-{tag}.whl"
+    metadata = "".join(
+        [f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n"] + [f"Requires-Dist: {r}\n" for r in requires]
+    )
+    with ZipFile(path, "w") as zf:
+        for arcname, content in (files or {f"{name}/__init__.py": f"VERSION = '{version}'\n"}).items():
+            zf.writestr(arcname, content)
+        zf.writestr(f"{name}-{version}.dist-info/METADATA", metadata)
+        zf.writestr(f"{name}-{version}.dist-info/WHEEL", f"Wheel-Version: 1.0\nTag: {tag}\n")
+    return path
+
+
+@pytest.mark.parametrize(
+    "version, specifiers, expected",
+    [
+        ("1.2.3", [], True),
+        ("1.2.3", [(">=", "1.2"), ("<", "2")], True),
+        ("2.0", [(">=", "1.2"), ("<", "2")], False),
+        ("1.4.2", [("~=", "1.4")], True),
+        ("2.0", [("~=", "1.4")], False),
+        ("1.4.2", [("==", "1.4.*")], True),
+        ("1.0", [("==", "1.0.0")], True),
+        ("2.0rc1", [(">=", "2.0")], False),
+        ("2.0.post1", [(">", "2.0")], True),
+        ("not-a-version", [], False),
+    ],
+)
+def test_satisfies(version, specifiers, expected):
+    assert satisfies(version, specifiers) is expected
+
+
+def test_plan_vendoring(tmp_path):
+    make_wheel(tmp_path, "alpha", "1.0", requires=["beta (>=2)", "gamma; python_version<'3'", "delta; extra == 'all'"])
+    make_wheel(tmp_path, "alpha", "2.0")
+    make_wheel(tmp_path, "beta", "2.1")
+    make_wheel(tmp_path, "native", "1.0", tag="cp38-cp38-manylinux2014_x86_64")
+    make_wheel(tmp_path, "extras", "1.0")
+
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text(
+        "--extra-index-url https://example.com  # Kept\n\nAlpha<2 \\\n  # Continued\nnative\nextras[all]\n"
+        "missing==1\ngit+https://example.com/beta.git\n"
+    )
+    lines = [line for _, line in read_requirement_lines(requirements)]
+    plan = plan_vendoring(lines, index_wheelhouse(tmp_path))
+    assert {name: wheel.version for name, wheel in plan.vendored.items()} == {"alpha": "1.0", "beta": "2.1"}
+    # Platform wheels, extras and marker dependencies are left for the server:
+    assert plan.requirements == [
+        "--extra-index-url https://example.com",
+        "git+https://example.com/beta.git",
+        "native",
+        "extras[all]",
+        "missing==1",
+        "gamma; python_version<'3'",
+    ]
+
+
+def test_vendor_requirements(tmp_path):
+    wheelhouse, target = tmp_path / "wheelhouse", tmp_path / "target"
+    wheelhouse.mkdir(), target.mkdir()
+    make_wheel(wheelhouse, "alpha", "1.0", requires=["beta"])
+    make_wheel(wheelhouse, "beta", "1.0", files={"handler.py": "# Collides with the function\n"})
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("alpha\n")
+
+    plan = vendor_requirements(requirements, wheelhouse, target, taken={"handler.py"})
+    assert list(plan.vendored) == ["alpha"]
+    assert (target / "alpha" / "__init__.py").is_file() and not (target / "handler.py").exists()
+    assert (target / "requirements.txt").read_text().splitlines()[1:] == ["beta"]
+
+    requirements.write_text("beta\n")
+    assert vendor_requirements(requirements, wheelhouse, tmp_path / "unused", taken={"handler.py"}) is None